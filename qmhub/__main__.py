@@ -5,6 +5,17 @@ import configparser
 from qmhub import QMMM
 
 
+def get_simulation_options(config):
+    """Return the arguments of `Simulation` set in the [simulation] section of `config`."""
+
+    return {
+        'protocol': config.get('simulation', 'protocol', fallback='md'),
+        'nrespa': config.getint('simulation', 'nrespa', fallback=None),
+        'scaling_factor': config.getfloat('simulation', 'scaling_factor', fallback=None),
+        'max_workers': config.getint('simulation', 'max_workers', fallback=None),
+    }
+
+
 def main():
     parser = argparse.ArgumentParser(description='QMHub: A QM/MM interface.')
     parser.add_argument("config", help="QMHub config file")
@@ -13,6 +24,7 @@ def main():
     group.add_argument("-t", "--text", help="Path to text exchange file")
     group.add_argument("-b", "--bin", help="Path to binary exchange file")
     group.add_argument("-f", "--fifo", help="Path to FIFO exchange file")
+    group.add_argument("-s", "--shm", help="Path to shared-memory exchange file")
 
     parser.add_argument("-d", "--driver", help="Driver")
     parser.add_argument("-c", "--cwd", help="Working directory for engine calculations")
@@ -22,7 +34,10 @@ def main():
     config = configparser.ConfigParser(allow_no_value=True)
     config.read(args.config)
 
-    if args.fifo is not None:
+    if args.shm is not None:
+        mode = "shm"
+        input = Path(args.shm)
+    elif args.fifo is not None:
         mode = "fifo"
         input = Path(args.fifo)
     elif args.bin is not None:
@@ -34,11 +49,8 @@ def main():
 
     qmmm = QMMM(mode, args.driver, args.cwd)
 
-    protocol = config.get('simulation', 'protocol', fallback='md')
-    nrespa = config.getint('simulation', 'nrespa', fallback=None)
-    scaling_factor = config.getfloat('simulation', 'scaling_factor', fallback=None)
     save_input = config.getboolean('simulation', 'save_input', fallback=False)
-    qmmm.setup_simulation(protocol, nrespa=nrespa, scaling_factor=scaling_factor)
+    qmmm.setup_simulation(**get_simulation_options(config))
 
     qmmm.load_system(input, save_input=save_input)
 
@@ -46,7 +58,9 @@ def main():
         switching_type=config.get('model', 'switching_function', fallback='lrec'),
         cutoff=config.getfloat('model', 'cutoff', fallback=10.),
         swdist=config.getfloat('model', 'swdist', fallback=None),
+        skin=config.getfloat('model', 'skin', fallback=None),
         pbc=config.getboolean('model', 'pbc', fallback=True),
+        pme_tol=config.getfloat('model', 'pme_tol', fallback=None),
     )
 
     for name, engine in config['engine'].items():
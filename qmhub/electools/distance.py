@@ -1,4 +1,5 @@
 import numpy as np
+from scipy.spatial import cKDTree
 
 
 __all__ = [
@@ -8,8 +9,7 @@ __all__ = [
     "get_dij_inverse",
     "get_dij_inverse_gradient",
     "get_dij_min",
-    "get_dij_min_gradient",
-    "get_mm2_index",
+    "get_mm2_pairs",
 ]
 
 
@@ -21,28 +21,32 @@ def get_dij(rij):
     return np.linalg.norm(rij, axis=0)
 
 
-def get_dij_gradient(rij, dij=None):
+def get_dij_gradient(rij, dij=None, *, out=None):
     if dij is None:
         dij = get_dij(rij=rij)
 
-    return np.nan_to_num(rij / dij)
+    out = np.divide(rij, dij, out=out)
 
+    return np.nan_to_num(out, copy=False)
 
-def get_dij_inverse(dij=None, *, rij=None):
+
+def get_dij_inverse(dij=None, *, rij=None, out=None):
     if dij is None:
         dij = get_dij(rij=rij)
 
-    return 1 / dij
+    return np.divide(1., dij, out=out)
 
 
-def get_dij_inverse_gradient(dij_inverse=None, dij_gradient=None, *, rij=None):
+def get_dij_inverse_gradient(dij_inverse=None, dij_gradient=None, *, rij=None, out=None):
     if dij_inverse is None:
         dij_inverse = get_dij_inverse(rij=rij)
 
     if dij_gradient is None:
         dij_gradient = get_dij_gradient(rij=rij)
 
-    return np.nan_to_num(-1 * dij_inverse**2 * dij_gradient)
+    out = np.multiply(dij_gradient, -1 * dij_inverse**2, out=out)
+
+    return np.nan_to_num(out, copy=False)
 
 
 def get_dij_min(dij_inverse=None, *, rij=None, beta=500.):
@@ -58,31 +62,32 @@ def get_dij_min(dij_inverse=None, *, rij=None, beta=500.):
     return np.nan_to_num(dij_min)
 
 
-def get_dij_min_gradient(dij_min=None, dij_inverse=None, dij_inverse_gradient=None, *, rij=None, beta=500.):
-    if dij_min is None:
-        dij_min = get_dij_min(rij=rij)
-
-    if dij_inverse is None:
-        dij_inverse = get_dij_inverse(rij=rij)
-
-    if dij_inverse_gradient is None:
-        dij_inverse_gradient = get_dij_inverse_gradient(rij=rij)
+def get_mm2_pairs(positions, mm1_index, neighbor_index, n_qm, cutoff=1.8):
+    """Return the MM atoms within `cutoff` of each MM1 atom, as (position in `mm1_index`, MM2 atom) pairs of shape (2, n_pairs).
 
-    dij_min_gradient = -1 * dij_min**2 * np.exp(beta * dij_inverse - beta / dij_min) * dij_inverse_gradient
+    The candidates are the MM atoms of the neighbor list, searched with a KD-tree. The pairs are
+    sorted by MM1 atom, then by MM2 atom.
+    """
 
-    return np.nan_to_num(dij_min_gradient)
+    positions = np.asarray(positions)
+    mm1_index = np.asarray(mm1_index)
+    neighbor_index = np.asarray(neighbor_index)
 
+    mm_index = neighbor_index[neighbor_index >= n_qm]
+    if len(mm1_index) == 0 or len(mm_index) == 0:
+        return np.zeros((2, 0), dtype=int)
 
-def get_mm2_index(positions, mm1_index, dij):
-    link_atom_index = dij[:, np.asarray(mm1_index)].argmin(axis=0)
-    index = (np.argsort((dij[link_atom_index, len(dij):])) + len(dij))[:, 1:6]
+    pairs = cKDTree(positions[:, mm1_index].T).sparse_distance_matrix(
+        cKDTree(positions[:, mm_index].T),
+        cutoff,
+        output_type='ndarray',
+    )
 
-    mm_rij = positions[:, mm1_index, np.newaxis] - positions[:, index]
-    mm_dij = np.linalg.norm(mm_rij, axis=0)
-    mask = mm_dij < 1.8
+    i = pairs['i']
+    j = mm_index[pairs['j']]
+    mask = (j != mm1_index[i])
+    i, j = i[mask], j[mask]
 
-    mm2_index = []
-    for i , m in zip(index, mask):
-        mm2_index.append(i[m])
+    order = np.lexsort((j, i))
 
-    return mm2_index
+    return np.stack((i[order], j[order]))
@@ -4,14 +4,11 @@ import numpy as np
 from ..utils.darray import DependArray
 from .distance import *
 from .elec_near import ElecNear
+from .neighbor import NeighborList
 
-try:
-    from .pme import Ewald
-except ImportError:
-    print("helPME library is not imported correctly!")
-    from .ewald import Ewald
-
-from .ewald import Ewald as EwaldQMQM
+# The PME does not need helPME, and stays within its tolerance of the exact Ewald summation
+from .pme import Ewald
+from .ewald import EwaldQMQM
 
 
 class Elec(object):
@@ -27,63 +24,82 @@ class Elec(object):
         switching_type=None,
         cutoff=None,
         swdist=None,
+        skin=None,
         pbc=False,
+        pme_tol=None,
+        pme_tune_file=None,
         ):
 
+        self.neighbor_list = NeighborList(
+            qm_positions,
+            positions,
+            cell_basis if pbc else None,
+            cutoff=(cutoff + 1.),
+            skin=skin,
+        )
+        self.neighbor_index = DependArray(
+            name="neighbor_index",
+            func=(lambda x: x.index),
+            dependencies=[self.neighbor_list],
+        )
         self.rij = DependArray(
             name="rij",
-            func=get_rij,
-            dependencies=[qm_positions, positions],
+            func=(lambda x: x.rij),
+            dependencies=[self.neighbor_list],
         )
         self.dij = DependArray(
             name="dij",
-            func=get_dij,
-            dependencies=[self.rij],
+            func=(lambda x: x.dij),
+            dependencies=[self.neighbor_list],
         )
-        self.dij_gradient = DependArray(
-            name="dij_gradient",
-            func=get_dij_gradient,
-            dependencies=[self.rij, self.dij],
-        )
-        self.dij_inverse = DependArray(
-            name="dij_inverse",
-            func=get_dij_inverse,
+
+        # MM1 atoms and Coulomb exclusions are only looked for among the atoms within 2 Angstrom of the QM atoms
+        self.short_range_mask = DependArray(
+            name="short_range_mask",
+            func=(lambda x: x.min(axis=0, initial=np.inf) < 2.),
             dependencies=[self.dij],
         )
-        self.dij_inverse_gradient = DependArray(
-            name="dij_inverse_gradient",
-            func=get_dij_inverse_gradient,
-            dependencies=[self.dij_inverse, self.dij_gradient],
+        self.short_range_index = DependArray(
+            name="short_range_index",
+            func=(lambda x, y: x[y]),
+            dependencies=[self.neighbor_index, self.short_range_mask],
         )
         self.dij_min = DependArray(
             name="dij_min",
-            func=get_dij_min,
-            dependencies=[self.dij_inverse],
-        )
-        self.dij_min_gradient = DependArray(
-            name="dij_min_gradient",
-            func=get_dij_min_gradient,
-            dependencies=[self.dij_min, self.dij_inverse, self.dij_inverse_gradient],
+            func=(lambda x, y: get_dij_min(get_dij_inverse(x[:, y]))),
+            dependencies=[self.dij, self.short_range_mask],
         )
         self.coulomb_exclusion = DependArray(
             name="coulomb_exclusion",
-            func=(lambda x: np.nonzero(x.min(axis=0) < .8)[0]),
-            dependencies=[self.dij],
+            func=(lambda x, y, z: z[np.nonzero(x[:, y].min(axis=0, initial=np.inf) < .8)[0]]),
+            dependencies=[self.dij, self.short_range_mask, self.short_range_index],
         )
         self.mm1_index = DependArray(
             name="mm1_index",
-            func=(lambda x: np.nonzero(np.logical_and(x > 0., x < .8))[0]),
-            dependencies=[self.dij_min],
+            func=(lambda x, y: y[np.nonzero(np.logical_and(x > 0., x < .8))[0]]),
+            dependencies=[self.dij_min, self.short_range_index],
         )
-        self.mm2_index = DependArray(
-            name="mm2_index",
-            func=get_mm2_index,
+        self.mm2_pairs = DependArray(
+            name="mm2_pairs",
+            func=get_mm2_pairs,
+            kwargs={'n_qm': len(qm_charges)},
             dependencies=[
                 positions,
                 self.mm1_index,
-                self.dij,
+                self.neighbor_index,
             ]
         )
+        # MM2 atoms of MM1 atom i: mm2_index[mm2_indptr[i]:mm2_indptr[i + 1]]
+        self.mm2_index = DependArray(
+            name="mm2_index",
+            func=(lambda x: x[1]),
+            dependencies=[self.mm2_pairs],
+        )
+        self.mm2_indptr = DependArray(
+            name="mm2_indptr",
+            func=(lambda x, y: np.concatenate(([0], np.cumsum(np.bincount(x[0], minlength=len(y)))))),
+            dependencies=[self.mm2_pairs, self.mm1_index],
+        )
     
         if pbc:
             self.full = Ewald(
@@ -93,24 +109,23 @@ class Elec(object):
                 cell_basis=cell_basis,
                 exclusion=self.coulomb_exclusion,
                 cutoff=cutoff,
+                tune=pme_tol,
+                tune_file=pme_tune_file,
             )
             self.qmqm = EwaldQMQM(
                 qm_positions=qm_positions,
-                positions=qm_positions,
                 charges=qm_charges,
                 cell_basis=cell_basis,
-                exclusion=np.arange(len(qm_charges)),
             )
         else:
             import importlib
             NonPBC = importlib.import_module(".nonpbc", package='qmhub.electools').__getattribute__('NonPBC')
 
             self.full = NonPBC(
-                rij=self.rij,
+                qm_positions=qm_positions,
+                positions=positions,
                 charges=charges,
                 cell_basis=cell_basis,
-                dij_inverse=self.dij_inverse,
-                dij_inverse_gradient=self.dij_inverse_gradient,
                 exclusion=self.coulomb_exclusion,
             )
             self.qmqm = None
@@ -118,6 +133,7 @@ class Elec(object):
         self.near_field = ElecNear(
             rij=self.rij,
             dij=self.dij,
+            index=self.neighbor_index,
             charges=charges,
             switching_type=switching_type,
             cutoff=cutoff,
@@ -144,7 +160,7 @@ class Elec(object):
             name="projected_mm_charges",
             func=Elec._get_projected_mm_charges,
             dependencies=[
-                self.near_field.weighted_qmmm_coulomb_tensor_inv,
+                self.near_field.weighted_qmmm_coulomb_tensor_solver,
                 self.qm_residual_esp,
                 self.near_field.scaling_factor,
             ],
@@ -154,7 +170,7 @@ class Elec(object):
             func=Elec._get_embedding_mm_charges,
             dependencies=[
                 self.near_field.scaling_factor,
-                self.near_field.weighted_qmmm_coulomb_tensor_inv,
+                self.near_field.weighted_qmmm_coulomb_tensor_solver,
                 self.qm_residual_esp,
                 self.near_field.charges,
             ],
@@ -177,12 +193,12 @@ class Elec(object):
         return charges * scaling_factor
 
     @staticmethod
-    def _get_projected_mm_charges(wt_inv, qm_esp, w):
-        return (wt_inv @ qm_esp[0]) * w
+    def _get_projected_mm_charges(wt_solver, qm_esp, w):
+        return wt_solver.solve(qm_esp[0]) * w
 
     @staticmethod
-    def _get_embedding_mm_charges(w, wt_inv, qm_esp, charges):
-        return (wt_inv @ qm_esp[0] + charges) * w
+    def _get_embedding_mm_charges(w, wt_solver, qm_esp, charges):
+        return (wt_solver.solve(qm_esp[0]) + charges) * w
 
     @staticmethod
     def _get_embedding_mm_positions(positions, near_field_mask):
@@ -1,12 +1,14 @@
 import numpy as np
 
+from ..utils.buffer import Buffer
 from ..utils.darray import DependArray
+from ..utils.dsolver import DependSolver
 from .distance import *
-from .switching import get_scaling_factor, get_scaling_factor_gradient
+from .switching import Switching
 
 
 class ElecNear(object):
-    def __init__(self, rij, dij,
+    def __init__(self, rij, dij, index,
                  charges, switching_type=None,
                  cutoff=None, swdist=None):
 
@@ -26,11 +28,17 @@ class ElecNear(object):
             func=ElecNear._get_dij_min_buffered,
             dependencies=[dij, self.near_field_buffered_mask],
         )
+        self.near_field_neighbor_mask = DependArray(
+            name="near_field_neighbor_mask",
+            func=ElecNear._get_near_field_neighbor_mask,
+            kwargs={'cutoff': self.cutoff},
+            dependencies=[self.dij_min_buffered, self.near_field_buffered_mask],
+        )
         self.near_field_mask = DependArray(
             name="near_field_mask",
             func=ElecNear._get_near_field_mask,
-            kwargs={'cutoff': self.cutoff},
-            dependencies=[self.dij_min_buffered, self.near_field_buffered_mask],
+            kwargs={'n_atoms': len(charges)},
+            dependencies=[index, self.near_field_neighbor_mask],
         )
         self.dij_min = DependArray(
             name="dij_min",
@@ -38,68 +46,75 @@ class ElecNear(object):
             kwargs={'cutoff': self.cutoff},
             dependencies=[self.dij_min_buffered],
         )
+
+        # The near-field tensors are written into buffers reused from step to step
         self.rij = DependArray(
             name="rij",
             func=ElecNear._get_masked_array,
-            dependencies=[rij, self.near_field_mask],
+            kwargs={'buffer': Buffer()},
+            dependencies=[rij, self.near_field_neighbor_mask],
         )
         self.dij = DependArray(
             name="dij",
             func=ElecNear._get_masked_array,
-            dependencies=[dij, self.near_field_mask],
+            kwargs={'buffer': Buffer()},
+            dependencies=[dij, self.near_field_neighbor_mask],
         )
         self.dij_gradient = DependArray(
             name="dij_gradient",
-            func=get_dij_gradient,
+            func=(lambda x, y, buffer: get_dij_gradient(x, y, out=buffer.get(x.shape))),
+            kwargs={'buffer': Buffer()},
             dependencies=[self.rij, self.dij],
         )
         self.qmmm_coulomb_tensor = DependArray(
             name="qmmm_coulomb_tensor",
-            func=get_dij_inverse,
+            func=(lambda x, buffer: get_dij_inverse(x, out=buffer.get(x.shape))),
+            kwargs={'buffer': Buffer()},
             dependencies=[self.dij],
         )
         self.qmmm_coulomb_tensor_gradient = DependArray(
             name="qmmm_coulomb_tensor_gradient",
-            func=get_dij_inverse_gradient,
+            func=(lambda x, y, buffer: get_dij_inverse_gradient(x, y, out=buffer.get(y.shape))),
+            kwargs={'buffer': Buffer()},
             dependencies=[self.qmmm_coulomb_tensor, self.dij_gradient],
         )
-        self.dij_min_gradient = DependArray(
-            name="dij_min_gradient",
-            func=get_dij_min_gradient,
-            dependencies=[self.dij_min, self.qmmm_coulomb_tensor, self.qmmm_coulomb_tensor_gradient],
-        )
         self.charges = DependArray(
             name="charges",
             func=ElecNear._get_masked_array,
+            kwargs={'buffer': Buffer()},
             dependencies=[charges, self.near_field_mask],
         )
+        self.switching = Switching(
+            self.dij_min,
+            self.qmmm_coulomb_tensor,
+            self.qmmm_coulomb_tensor_gradient,
+            switching_type=self.switching_type,
+            cutoff=self.cutoff,
+            swdist=self.swdist,
+        )
         self.scaling_factor = DependArray(
             name="scaling_factor",
-            func=get_scaling_factor(self.switching_type),
-            kwargs={'cutoff': self.cutoff, 'swdist': self.swdist},
-            dependencies=[self.dij_min],
+            func=(lambda x: x.scaling_factor),
+            dependencies=[self.switching],
         )
         self.scaling_factor_gradient = DependArray(
             name="scaling_factor_gradient",
-            func=get_scaling_factor_gradient(self.switching_type),
-            kwargs={'cutoff': self.cutoff, 'swdist': self.swdist},
-            dependencies=[self.dij_min, self.dij_min_gradient],
+            func=(lambda x: x.scaling_factor_gradient),
+            dependencies=[self.switching],
         )
         self.weighted_qmmm_coulomb_tensor = DependArray(
             name="weighted_qmmm_coulomb_tensor",
-            func=(lambda x, y: x * y),
+            func=(lambda x, y, buffer: np.multiply(x, y, out=buffer.get(y.shape))),
+            kwargs={'buffer': Buffer()},
             dependencies=[
                 self.scaling_factor,
                 self.qmmm_coulomb_tensor,
             ],
         )
-        self.weighted_qmmm_coulomb_tensor_inv = DependArray(
-            name="weighted_qmmm_coulomb_tensor_inv",
-            func=np.linalg.pinv,
-            kwargs={"rcond": 1e-8},
-            dependencies=[
-                self.weighted_qmmm_coulomb_tensor,
-            ],
+        self.weighted_qmmm_coulomb_tensor_solver = DependSolver(
+            self.weighted_qmmm_coulomb_tensor,
+            rcond=1e-8,
+            name="weighted_qmmm_coulomb_tensor_solver",
         )
         self.qm_scaled_esp = DependArray(
             name="qm_scaled_esp",
@@ -125,18 +140,28 @@ class ElecNear(object):
         return dij_min
 
     @staticmethod
-    def _get_near_field_mask(dij_min, mask, cutoff=None):
+    def _get_near_field_neighbor_mask(dij_min, mask, cutoff=None):
         _mask = np.copy(mask)
         _mask[mask] = (dij_min < (cutoff - 1e-5)) # Add a small buffer to avoid numerical instability
         return _mask
 
+    @staticmethod
+    def _get_near_field_mask(index, mask, n_atoms):
+        _mask = np.zeros(n_atoms, dtype=bool)
+        _mask[index[mask]] = True
+        return _mask
+
     @staticmethod
     def _get_dij_min(dij_min, cutoff):
         return dij_min[dij_min < (cutoff - 1e-5)] # Add a small buffer to avoid numerical instability
 
     @staticmethod
-    def _get_masked_array(array, mask):
-        return array[..., mask]
+    def _get_masked_array(array, mask, buffer=None):
+        if buffer is None:
+            return array[..., mask]
+
+        out = buffer.get(array.shape[:-1] + (np.count_nonzero(mask),))
+        return np.compress(mask, array, axis=-1, out=out)
 
     @staticmethod
     def _get_tensor_inverse_gradient(t, t_grad, t_inv):
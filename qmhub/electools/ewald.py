@@ -1,13 +1,22 @@
 import math
 import numpy as np
 from scipy.special import erfc
+from scipy.ndimage import spline_filter
 
 from ..utils.darray import DependArray
+from ..utils.dobject import DependObject, cache_update
+from ..utils.pbc import get_cell_widths, get_min_image
 
 
 PI = math.pi
 SQRTPI = math.sqrt(math.pi)
 
+# Number of structure factors (k vectors times atoms) held at once in the reciprocal sum
+BLOCK_SIZE = 2**20
+
+# Grid points per reciprocal lattice vector of the tabulated QM-QM reciprocal sum
+TABLE_OVERSAMPLING = 4
+
 
 class Ewald(object):
     def __init__(
@@ -150,15 +159,15 @@ class Ewald(object):
 
     @staticmethod
     def _get_alpha(cell_basis):
-        return SQRTPI / np.diag(cell_basis).max()
+        return SQRTPI / get_cell_widths(cell_basis).max()
 
     @staticmethod
     def _get_nmax(threshold, alpha, cell_basis):
-        return np.ceil(threshold / alpha / np.diag(cell_basis)).astype(int)
+        return np.ceil(threshold / alpha / get_cell_widths(cell_basis)).astype(int)
 
     @staticmethod
     def _get_kmax(threshold, alpha, recip_basis):
-        return np.ceil(2 * threshold * alpha / np.diag(recip_basis)).astype(int)
+        return np.ceil(2 * threshold * alpha / get_cell_widths(recip_basis)).astype(int)
 
     @staticmethod
     def _get_recip_basis(cell_basis):
@@ -178,7 +187,7 @@ class Ewald(object):
     def _get_lattice(cell_basis, vectors, maxes, order):
         lattice = np.dot(cell_basis, vectors)
         if order.lower() == 'spherical':
-            mask = np.linalg.norm(lattice, axis=0) <= np.max(maxes * np.diag(cell_basis))
+            mask = np.linalg.norm(lattice, axis=0) <= np.max(maxes * np.linalg.norm(cell_basis, axis=0))
             return lattice[:, mask]
         elif order.lower() == 'rectangular':
             return lattice
@@ -204,18 +213,56 @@ class Ewald(object):
 
         return t
 
+    @staticmethod
+    def _get_structure_factors(positions, recip_basis, maxes):
+        """Return exp(i n b.r) for each basis vector b of `recip_basis` and n from -maxes to maxes, of shape (n_atoms, 2 * max + 1)."""
+
+        factors = []
+        for basis_vector, nmax in zip(recip_basis.T, maxes):
+            factor = np.empty((positions.shape[1], 2 * nmax + 1), dtype=complex)
+            factor[:, nmax] = 1.
+            if nmax > 0:
+                factor[:, nmax + 1] = np.exp(1j * (basis_vector @ positions))
+            for n in range(2, nmax + 1):
+                factor[:, nmax + n] = factor[:, nmax + n - 1] * factor[:, nmax + 1]
+            factor[:, :nmax] = factor[:, :nmax:-1].conj()
+            factors.append(factor)
+
+        return factors
+
     @staticmethod
     def _get_ewald_recip_tensor(ri, rj, lattice, cell_basis, alpha, exclusion=None):
         t = np.zeros((4, ri.shape[1], rj.shape[1]))
 
         rij = rj[:, np.newaxis, :] - ri[:, :, np.newaxis]
         volume = np.linalg.det(cell_basis)
-        k2 = np.linalg.norm(lattice, axis=0)**2
-        prefac = (4 * PI / volume) * np.exp(-1 * k2 / (4 * alpha**2)) / k2
 
-        kr = (rij.T @ lattice)
-        t[0] = (np.cos(kr) @ prefac).T
-        t[1:] = (np.sin(kr) @ (prefac * lattice).T).T
+        # Only one k of each +/-k pair, whose terms are the same
+        vectors = np.rint(cell_basis.T @ lattice / (2 * PI)).astype(int)
+        half = (vectors[0] > 0) | (vectors[0] == 0) & ((vectors[1] > 0) | (vectors[1] == 0) & (vectors[2] > 0))
+        vectors, lattice = vectors[:, half], lattice[:, half]
+
+        k2 = np.linalg.norm(lattice, axis=0)**2
+        prefac = 2 * (4 * PI / volume) * np.exp(-1 * k2 / (4 * alpha**2)) / k2
+        weights = np.concatenate((prefac[np.newaxis], prefac * lattice))
+
+        # exp(i k.r) from integer powers of exp(i b.r) along each reciprocal basis vector b
+        maxes = np.abs(vectors).max(axis=1, initial=0)
+        recip_basis = Ewald._get_recip_basis(cell_basis)
+        factors_i = Ewald._get_structure_factors(ri, recip_basis, maxes)
+        factors_j = Ewald._get_structure_factors(rj, recip_basis, maxes)
+
+        # cos(k.rij) and sin(k.rij) as the real and imaginary parts of exp(-i k.ri) exp(i k.rj)
+        block_size = max(1, BLOCK_SIZE // rj.shape[1])
+        for start in range(0, lattice.shape[1], block_size):
+            n = vectors[:, start:start + block_size] + maxes[:, np.newaxis]
+            eikri = factors_i[0][:, n[0]] * factors_i[1][:, n[1]] * factors_i[2][:, n[2]]
+            eikrj = factors_j[0][:, n[0]] * factors_j[1][:, n[1]] * factors_j[2][:, n[2]]
+
+            a = eikri.conj()[np.newaxis] * weights[:, np.newaxis, start:start + block_size]
+            prod = (a.reshape(-1, a.shape[-1]) @ eikrj.T).reshape(t.shape)
+            t[0] += prod[0].real
+            t[1:] += prod[1:].imag
 
         if exclusion is not None:
             r = rij[:, :, np.asarray(exclusion)]
@@ -243,3 +290,154 @@ class Ewald(object):
 
     def _get_total_espc_gradient(self, qm_esp_charges):
         return qm_esp_charges @ -(self.ewald_real_tensor[1:] + self.ewald_recip_tensor[1:]) * self.charges
+
+
+class EwaldQMQM(object):
+    """Ewald sum between the QM atoms, excluding all their interactions in the central cell.
+
+    The splitting is chosen so that the real-space sum only needs the minimum image of each
+    pair. The reciprocal-space sum only depends on the displacement of a pair, and is tabulated
+    over the cell in `EwaldRecipTable`, which is only computed again when the cell changes.
+    """
+
+    def __init__(self, qm_positions, charges, cell_basis, tol=1e-6):
+
+        self.charges = charges
+        self.cell_basis = cell_basis
+        self.tol = tol
+
+        self.recip_table = EwaldRecipTable(cell_basis, tol=self.tol)
+        self.qm_total_esp = DependArray(
+            name="qm_total_esp",
+            func=EwaldQMQM._get_qm_total_esp,
+            dependencies=[
+                qm_positions,
+                charges,
+                cell_basis,
+                self.recip_table,
+            ],
+        )
+
+    @staticmethod
+    def _get_qm_total_esp(qm_positions, charges, cell_basis, recip_table):
+        qm_positions = np.asarray(qm_positions)
+        n_qm = qm_positions.shape[1]
+
+        # Each pair once, as the potential is even and the field odd in the displacement
+        i, j = np.triu_indices(n_qm, 1)
+        rij = qm_positions[:, j] - qm_positions[:, i]
+        t_pairs = recip_table.interpolate(rij)
+
+        # Real space: the minimum image screened by erfc, without the bare interaction in the central cell
+        alpha = recip_table.alpha
+        r = get_min_image(rij, cell_basis)
+        d = np.linalg.norm(r, axis=0)
+        d0 = np.linalg.norm(rij, axis=0)
+        prod = erfc(alpha * d) / d
+        prod2 = prod / d**2 + 2 * alpha * np.exp(-1 * alpha**2 * d**2) / SQRTPI / d**2
+
+        t_pairs[0] += prod - 1 / d0
+        t_pairs[1:] += prod2 * r - rij / d0**3
+
+        t = np.zeros((4, n_qm, n_qm))
+        t[:, i, j] = t_pairs
+        t[0, j, i] = t_pairs[0]
+        t[1:, j, i] = -t_pairs[1:]
+
+        # Self energy correction
+        t[0, np.arange(n_qm), np.arange(n_qm)] = recip_table.interpolate(np.zeros((3, 1)))[0] - 2 * alpha / SQRTPI
+
+        return t @ charges
+
+
+class EwaldRecipTable(DependObject):
+    """Reciprocal-space Ewald potential of a unit charge, tabulated over the cell.
+
+    The values on a grid of the fractional coordinates are obtained by an inverse FFT, and are
+    interpolated with periodic cubic B-splines, whose gradient gives the field. The net charge
+    correction is included.
+    """
+
+    def __init__(self, cell_basis, *, tol=1e-6):
+        super().__init__(
+            name="ewald_recip_table",
+            func=EwaldRecipTable._get_recip_table,
+            kwargs={'tol': tol},
+            dependencies=[cell_basis],
+        )
+
+        self._alpha = None
+        self._frac_basis = None
+        self._coefficients = None
+
+    @property
+    @cache_update
+    def alpha(self):
+        return self._alpha
+
+    @cache_update
+    def interpolate(self, rij):
+        """Return the potential and field at the displacements `rij` (3, n), of shape (4, n).
+
+        The field is the gradient of the interpolated potential, so that both stay consistent.
+        """
+
+        nfft = np.array(self._coefficients.shape)[:, np.newaxis]
+        nx, ny, nz = self._coefficients.shape
+
+        grid = (self._frac_basis @ rij) * nfft
+        base = np.floor(grid)
+        w = grid - base
+
+        # Cubic B-spline weights of the grid points base - 1 to base + 2 along each axis, and their derivatives
+        weights = np.stack(((1 - w)**3, 3 * w**3 - 6 * w**2 + 4, -3 * w**3 + 3 * w**2 + 3 * w + 1, w**3), axis=-1) / 6
+        dweights = np.stack((-(1 - w)**2, 3 * w**2 - 4 * w, -3 * w**2 + 2 * w + 1, w**2), axis=-1) / 2
+        index = (base.astype(int)[:, :, np.newaxis] + np.arange(-1, 3)) % nfft[:, :, np.newaxis]
+        index = (index[0][:, :, np.newaxis, np.newaxis] * ny + index[1][:, np.newaxis, :, np.newaxis]) * nz + index[2][:, np.newaxis, np.newaxis, :]
+
+        values = np.take(self._coefficients.ravel(), index)
+
+        t = np.empty((4, rij.shape[1]))
+        t[0] = np.einsum('nabc,na,nb,nc->n', values, *weights, optimize=True)
+        t[1] = np.einsum('nabc,na,nb,nc->n', values, dweights[0], weights[1], weights[2], optimize=True)
+        t[2] = np.einsum('nabc,na,nb,nc->n', values, weights[0], dweights[1], weights[2], optimize=True)
+        t[3] = np.einsum('nabc,na,nb,nc->n', values, weights[0], weights[1], dweights[2], optimize=True)
+
+        # The field, from the gradient along the grid axes
+        t[1:] = -(nfft * self._frac_basis).T @ t[1:]
+
+        return t
+
+    def _evaluate(self):
+        self._alpha, self._frac_basis, self._coefficients = self._func(*self._dependencies, **self._kwargs)
+        return True
+
+    @staticmethod
+    def _get_recip_table(cell_basis, tol):
+        cell_basis = np.asarray(cell_basis)
+        volume = np.linalg.det(cell_basis)
+
+        # erfc(alpha * r) / r is below `tol` beyond half of the cell width
+        threshold = Ewald._get_threshold(tol)
+        alpha = 2 * threshold / get_cell_widths(cell_basis).min()
+
+        recip_basis = Ewald._get_recip_basis(cell_basis)
+        kmax = Ewald._get_kmax(threshold, alpha, recip_basis)
+        nfft = TABLE_OVERSAMPLING * (2 * kmax + 1)
+
+        vectors = np.stack(np.meshgrid(*[np.fft.fftfreq(n) * n for n in nfft], indexing='ij'))
+        k = np.tensordot(recip_basis, vectors, axes=1)
+        k2 = (k**2).sum(axis=0)
+        k2.flat[0] = 1.
+        prefac = (4 * PI / volume) * np.exp(-1 * k2 / (4 * alpha**2)) / k2
+        prefac.flat[0] = 0.
+
+        # cos(k.r) summed over k, at r = cell_basis @ (index / nfft)
+        table = np.fft.ifftn(prefac).real * np.prod(nfft)
+
+        # Net charge correction
+        table -= PI / volume / alpha**2
+
+        coefficients = spline_filter(table, order=3, mode='grid-wrap')
+
+        return alpha, np.linalg.inv(cell_basis), coefficients
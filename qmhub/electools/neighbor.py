@@ -0,0 +1,101 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+from ..utils.dobject import DependObject, cache_update
+from ..utils.pbc import get_min_image
+from .distance import get_rij, get_dij
+
+
+class NeighborList(DependObject):
+    """Verlet-style neighbor list of the atoms within `cutoff` of the QM atoms.
+
+    The candidate atoms within `cutoff + skin` of any QM atom (`index`) are only searched again
+    when some atom has moved more than half of the skin since the last search. On the other steps,
+    `rij` and `dij` are evaluated over the candidates only.
+
+    Periodic images are not searched: the positions are taken as wrapped around the QM atoms
+    (see `System.wrap_positions`), with `cutoff + skin` within half of the cell widths. Atoms
+    wrapped to the other side of the cell between two steps are then far from the QM atoms, and
+    their move is only taken modulo the lattice in the displacement check.
+    """
+
+    def __init__(self, qm_positions, positions, cell_basis=None, *, cutoff=None, skin=0.):
+        if skin is None:
+            skin = 0.
+
+        dependencies = [qm_positions, positions]
+        if cell_basis is not None:
+            dependencies.append(cell_basis)
+
+        super().__init__(
+            name="neighbor_list",
+            func=NeighborList._get_candidates,
+            kwargs={'cutoff': cutoff + skin},
+            dependencies=dependencies,
+        )
+
+        self.cutoff = cutoff
+        self.skin = skin
+        self.n_builds = 0
+
+        self._reference_positions = None
+        self._index = None
+        self._rij = None
+        self._dij = None
+
+    @property
+    @cache_update
+    def index(self):
+        return self._index
+
+    @property
+    @cache_update
+    def rij(self):
+        return self._rij
+
+    @property
+    @cache_update
+    def dij(self):
+        return self._dij
+
+    @staticmethod
+    def _get_candidates(qm_positions, positions, cell_basis=None, cutoff=None):
+        dij_min, _ = cKDTree(np.asarray(qm_positions).T).query(np.asarray(positions).T, distance_upper_bound=cutoff)
+        return np.nonzero(dij_min < cutoff)[0]
+
+    @staticmethod
+    def _get_max_displacement(positions, reference_positions, cell_basis=None, threshold=0.):
+        """Return the largest displacement of the atoms since the reference positions.
+
+        Only the displacements longer than `threshold` are reduced to their shortest periodic image.
+        """
+
+        displacement = positions - reference_positions
+        distance2 = (displacement**2).sum(axis=0)
+
+        if cell_basis is not None and not np.all(cell_basis == 0.):
+            moved = np.nonzero(distance2 > threshold**2)[0]
+            if len(moved) > 0:
+                distance2[moved] = (get_min_image(displacement[:, moved], cell_basis)**2).sum(axis=0)
+
+        return np.sqrt(distance2.max(initial=0.))
+
+    def _need_rebuild(self, positions, cell_basis=None):
+        if self._reference_positions is None:
+            return True
+        return self._get_max_displacement(positions, self._reference_positions, cell_basis, threshold=.5 * self.skin) > .5 * self.skin
+
+    def _evaluate(self):
+        qm_positions = np.asarray(self._dependencies[0])
+        positions = np.asarray(self._dependencies[1])
+        cell_basis = np.asarray(self._dependencies[2]) if len(self._dependencies) > 2 else None
+
+        if self._need_rebuild(positions, cell_basis):
+            self._index = self._func(*self._dependencies, **self._kwargs)
+            self._reference_positions = np.copy(positions)
+            self.n_builds += 1
+
+        self._rij = get_rij(qm_positions, positions[:, self._index])
+        self._dij = get_dij(self._rij)
+
+        return True
@@ -1,22 +1,49 @@
 import numpy as np
 
 from ..utils.darray import DependArray
+from .distance import *
 
 
 class NonPBC(object):
-    def __init__(self, rij, charges, cell_basis=None, exclusion=None, *, dij_inverse=None, dij_inverse_gradient=None):
+    def __init__(self, qm_positions, positions, charges, cell_basis=None, exclusion=None):
 
         self.charges = charges
 
+        # The Coulomb sum without PBC runs over all atoms, so it keeps its own full-size tensors
+        self.rij = DependArray(
+            name="rij",
+            func=get_rij,
+            dependencies=[qm_positions, positions],
+        )
+        self.dij = DependArray(
+            name="dij",
+            func=get_dij,
+            dependencies=[self.rij],
+        )
+        self.dij_inverse = DependArray(
+            name="dij_inverse",
+            func=get_dij_inverse,
+            dependencies=[self.dij],
+        )
+        self.dij_gradient = DependArray(
+            name="dij_gradient",
+            func=get_dij_gradient,
+            dependencies=[self.rij, self.dij],
+        )
+        self.dij_inverse_gradient = DependArray(
+            name="dij_inverse_gradient",
+            func=get_dij_inverse_gradient,
+            dependencies=[self.dij_inverse, self.dij_gradient],
+        )
         self.qmmm_coulomb_tensor = DependArray(
             name="qmmm_coulomb_tensor",
             func=NonPBC._get_qmmm_coulomb_tensor,
-            dependencies=[dij_inverse, exclusion],
+            dependencies=[self.dij_inverse, exclusion],
         )
         self.qmmm_coulomb_tensor_gradient = DependArray(
             name="qmmm_coulomb_tensor_gradient",
             func=NonPBC._get_qmmm_coulomb_tensor_gradient,
-            dependencies=[dij_inverse_gradient, exclusion],
+            dependencies=[self.dij_inverse_gradient, exclusion],
         )
         self.qm_total_esp = DependArray(
             name="qm_total_esp",
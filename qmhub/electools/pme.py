@@ -1,11 +1,24 @@
+import itertools
+import json
 import math
+import time
+from pathlib import Path
+
 import numpy as np
 from scipy.special import erfc
+from scipy.sparse import csr_matrix
 
 from ..utils.darray import DependArray
-from ..utils.dpme import DependPME
+from ..utils.dobject import DependObject, cache_update
+from ..utils.dpme_numpy import DependNumpyPME
+from ..utils.pbc import get_cell_widths
 from ..utils.sys import get_nproc
 
+try:
+    from ..utils.dpme import DependPME
+except ImportError:
+    DependPME = None
+
 
 PI = math.pi
 SQRTPI = math.sqrt(math.pi)
@@ -23,9 +36,20 @@ class Ewald(object):
         *,
         cutoff=None,
         order=6,
+        grid_spacing=1.,
+        tune=None,
+        tune_file=None,
+        backend=None,
         **kwargs
         ):
 
+        if tune is not None:
+            parameters = PMETuner(tune, tune_file).get_parameters(qm_positions, positions, charges, cell_basis, exclusion)
+            tol = parameters['tol']
+            cutoff = parameters['cutoff']
+            order = parameters['order']
+            grid_spacing = parameters['grid_spacing']
+
         self.qm_positions = qm_positions
         self.positions = positions
         self.charges = charges
@@ -34,6 +58,7 @@ class Ewald(object):
         self.tol = tol
         self.cutoff = cutoff
         self.order = order
+        self.grid_spacing = grid_spacing
 
         self.alpha = DependArray(
             name="alpha",
@@ -46,27 +71,22 @@ class Ewald(object):
         self.nfft = DependArray(
             name="nfft",
             func=Ewald._get_nfft,
-            kwargs={'cell_basis': cell_basis},
+            kwargs={'grid_spacing': grid_spacing},
+            dependencies=[cell_basis],
         )
 
-        self.pme = DependPME(self.cell_basis, self.alpha, self.order, self.nfft, get_nproc())
+        self.pme = Ewald._get_pme_class(backend)(self.cell_basis, self.alpha, self.order, self.nfft, get_nproc())
 
-        self.ewald_real_tensor = DependArray(
-            name="ewald_real_tensor",
-            func=Ewald._get_ewald_real_tensor,
-            kwargs={
-                'cutoff': cutoff,
-                'alpha': self.alpha,
-                'exclusion': exclusion,
-            },
-            dependencies=[
-                qm_positions,
-                positions,
-            ],
+        self.ewald_real_tensor = EwaldRealTensor(
+            qm_positions,
+            positions,
+            cutoff=cutoff,
+            alpha=self.alpha,
+            exclusion=exclusion,
         )
         self.ewald_real = DependArray(
             name="ewald_real",
-            func=(lambda x, y: x @ y),
+            func=(lambda x, y: x.matvec(y)),
             dependencies=[
                 self.ewald_real_tensor,
                 charges,
@@ -110,6 +130,23 @@ class Ewald(object):
     def volume(self):
         return np.linalg.det(self.cell_basis)
 
+    @staticmethod
+    def _get_pme_class(backend=None):
+        """Return the reciprocal-space engine for `backend`, "numpy" (default) or "helpme".
+
+        The NumPy PME computes the B-splines of each set of positions once per step for both
+        `compute_recip_esp` calls. helPME only takes coordinates, so it computes them on every call.
+        """
+
+        if backend is None or backend == "numpy":
+            return DependNumpyPME
+        elif backend == "helpme":
+            if DependPME is None:
+                raise ImportError("helPME library is not imported correctly!")
+            return DependPME
+        else:
+            raise ValueError(f"Unknown PME backend {backend!r}.")
+
     @staticmethod
     def _get_alpha(cutoff, tol):
         alpha = 1.
@@ -126,8 +163,8 @@ class Ewald(object):
         return alpha
 
     @staticmethod
-    def _get_nfft(cell_basis):
-        minimum = np.floor(np.diag(cell_basis)).astype(int)
+    def _get_nfft(cell_basis, grid_spacing=1.):
+        minimum = np.floor(np.linalg.norm(cell_basis, axis=0) / grid_spacing).astype(int)
 
         return [Ewald._find_fft_dimension(m) for m in minimum]
 
@@ -145,35 +182,6 @@ class Ewald(object):
                 return minimum
             minimum += 1
 
-    @staticmethod
-    def _get_ewald_real_tensor(
-        qm_positions,
-        positions,
-        cutoff,
-        alpha,
-        exclusion=None
-        ):
-
-        t = np.zeros((4, qm_positions.shape[1], positions.shape[1]))
-
-        rij = positions[:, np.newaxis, :] - qm_positions[:, :, np.newaxis]
-        d = np.linalg.norm(rij, axis=0)
-        d2 = np.power(d, 2)
-        mask = (d < cutoff)
-        mask[:, np.asarray(exclusion)] = False
-        d = d[mask]
-        d2 = d2[mask]
-
-        prod = np.zeros((rij.shape[1], rij.shape[2]))
-        prod[mask] = erfc(alpha * d) / d
-        t[0] = prod
-
-        prod2 = np.zeros((rij.shape[1], rij.shape[2]))
-        prod2[mask] = prod[mask] / d2 + 2 * alpha * np.exp(-1 * alpha**2 * d2) / SQRTPI / d2
-        t[1:] = (prod2 * rij)
-
-        return t
-
     @staticmethod
     def _get_ewald_recip_exclusion_tensor(
         qm_positions,
@@ -222,6 +230,257 @@ class Ewald(object):
         recip_grad = self.pme.compute_recip_esp(self.positions, self.qm_positions, qm_esp_charges)[1:]
         recip_grad[:, np.asarray(self.exclusion)] += qm_esp_charges @ self.ewald_recip_exclusion_tensor[1:]
 
-        real_grad = qm_esp_charges @ -self.ewald_real_tensor[1:]
+        real_grad = -self.ewald_real_tensor.rmatvec(qm_esp_charges)
 
         return (real_grad + recip_grad) * self.charges
+
+
+class PMETuner(object):
+    """Choose the Ewald splitting and PME grid parameters for a requested accuracy.
+
+    The candidate parameters are compared against the most accurate candidate, on the potential
+    and field at the QM atoms. For each cutoff and spline order, the loosest real-space tolerance
+    and then the coarsest grid spacing within `tol` are searched for, as the tighter and finer
+    ones are slower, and the fastest of these candidates is kept. The choice is stored in
+    `tune_file` (JSON) for each box shape and number of atoms, so the calibration only runs once.
+    """
+
+    cutoffs = (6., 8., 10., 12.)
+    # Real-space tolerances, relative to `tol`: the ESP error sums over all the atoms near the cutoff
+    real_space_tols = (.1, .01, .001)
+    orders = (4, 6, 8)
+    grid_spacings = (1.6, 1.2, 1., .8, .6)
+
+    def __init__(self, tol, tune_file=None, *, repeats=3):
+        self.tol = tol
+        self.tune_file = tune_file
+        self.repeats = repeats
+
+    def get_parameters(self, qm_positions, positions, charges, cell_basis, exclusion=None):
+        """Return the tuned 'tol' (real-space), 'cutoff', 'order' and 'grid_spacing' for pme.Ewald."""
+
+        key = self._get_key(cell_basis, len(np.asarray(charges)))
+        saved = self._load()
+
+        if key not in saved:
+            saved[key] = self._tune(
+                np.array(qm_positions),
+                np.array(positions),
+                np.array(charges),
+                np.array(cell_basis),
+                np.array(exclusion) if exclusion is not None else None,
+            )
+            self._save(saved)
+
+        return saved[key]
+
+    def _get_key(self, cell_basis, n_atoms):
+        cell_basis = np.asarray(cell_basis)
+        lengths = np.linalg.norm(cell_basis, axis=0)
+        cosines = [cell_basis[:, i] @ cell_basis[:, j] / lengths[i] / lengths[j] for i, j in ((1, 2), (0, 2), (0, 1))]
+
+        return "{:.1f} {:.1f} {:.1f} {:.3f} {:.3f} {:.3f} {} {:g}".format(*lengths, *cosines, n_atoms, self.tol)
+
+    def _load(self):
+        if self.tune_file is not None and Path(self.tune_file).exists():
+            return json.loads(Path(self.tune_file).read_text())
+        return {}
+
+    def _save(self, saved):
+        if self.tune_file is not None:
+            Path(self.tune_file).write_text(json.dumps(saved, indent=2))
+
+    def _tune(self, qm_positions, positions, charges, cell_basis, exclusion):
+        args = (qm_positions, positions, charges, cell_basis, exclusion)
+
+        max_cutoff = .5 * get_cell_widths(cell_basis).min()
+        cutoffs = [cutoff for cutoff in self.cutoffs if cutoff <= max_cutoff] or [max_cutoff]
+
+        reference = self._evaluate(
+            *args,
+            tol=self.real_space_tols[-1] * self.tol,
+            cutoff=cutoffs[-1],
+            order=self.orders[-1],
+            grid_spacing=self.grid_spacings[-1],
+        )[0]
+
+        def is_accurate(parameters):
+            return np.abs(self._evaluate(*args, **parameters)[0] - reference).max() <= self.tol
+
+        best = None
+        for cutoff, order in itertools.product(cutoffs, self.orders):
+            parameters = self._search(is_accurate, cutoff, order)
+            if parameters is not None:
+                elapsed = self._evaluate(*args, repeats=self.repeats, **parameters)[1]
+                if best is None or elapsed < best[0]:
+                    best = (elapsed, parameters)
+
+        if best is None:
+            raise ValueError(f"Can not reach a PME accuracy of {self.tol}.")
+
+        return best[1]
+
+    def _search(self, is_accurate, cutoff, order):
+        """Return the parameters with the loosest real-space tolerance and then the coarsest grid spacing that are accurate."""
+
+        for real_space_tol in self.real_space_tols:
+            candidates = [
+                {'tol': real_space_tol * self.tol, 'cutoff': cutoff, 'order': order, 'grid_spacing': grid_spacing}
+                for grid_spacing in self.grid_spacings
+            ]
+
+            # Even the finest grid fails when the real-space sum is not accurate enough
+            if not is_accurate(candidates[-1]):
+                continue
+
+            # The error decreases with the grid spacing, so the coarsest accurate one is bisected for
+            lo, hi = 0, len(candidates) - 1
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if is_accurate(candidates[mid]):
+                    hi = mid
+                else:
+                    lo = mid + 1
+
+            return candidates[hi]
+
+        return None
+
+    @staticmethod
+    def _evaluate(qm_positions, positions, charges, cell_basis, exclusion, repeats=0, **parameters):
+        """Return the potential and field at the QM atoms, and the shortest time of `repeats` steps with new positions."""
+
+        qm_positions = DependArray(np.array(qm_positions))
+        positions = DependArray(np.array(positions))
+        charges = DependArray(np.array(charges))
+
+        ewald = Ewald(qm_positions, positions, charges, DependArray(cell_basis), exclusion, **parameters)
+        qm_total_esp = np.array(ewald.qm_total_esp)
+
+        if not repeats:
+            return qm_total_esp, None
+
+        ewald._get_total_espc_gradient(qm_total_esp[0])
+
+        # Time steps after the setup, with slightly moved atoms
+        elapsed = []
+        for _ in range(repeats):
+            qm_positions[:] = qm_positions + 1e-4
+            positions[:] = positions + 1e-4
+
+            start = time.perf_counter()
+            ewald._get_total_espc_gradient(np.asarray(ewald.qm_total_esp)[0])
+            elapsed.append(time.perf_counter() - start)
+
+        return qm_total_esp, min(elapsed)
+
+
+class EwaldRealTensor(DependObject):
+    """Real-space Ewald tensor, with only the pairs within `cutoff` stored.
+
+    The pairs are found with a cell list of the atoms, and the four components (potential and
+    field) are stored as the row blocks of a `(4 * n_qm, n_atoms)` sparse matrix.
+    """
+
+    def __init__(self, qm_positions, positions, *, cutoff=None, alpha=None, exclusion=None):
+        super().__init__(
+            name="ewald_real_tensor",
+            func=EwaldRealTensor._get_ewald_real_tensor,
+            kwargs={
+                'cutoff': cutoff,
+                'alpha': alpha,
+                'exclusion': exclusion,
+            },
+            dependencies=[qm_positions, positions],
+        )
+
+        self._tensor = None
+
+    @property
+    @cache_update
+    def tensor(self):
+        return self._tensor
+
+    @cache_update
+    def matvec(self, charges):
+        """Return the potential and field at the QM atoms, `tensor @ charges`, of shape (4, n_qm)."""
+
+        return (self._tensor @ np.asarray(charges)).reshape(4, -1)
+
+    @cache_update
+    def rmatvec(self, qm_charges):
+        """Return `qm_charges @ tensor[1:]`, of shape (3, n_atoms)."""
+
+        qm_charges = np.asarray(qm_charges)
+        n_qm = len(qm_charges)
+
+        return np.stack([
+            self._tensor[(i * n_qm):((i + 1) * n_qm)].T @ qm_charges
+            for i in range(1, 4)
+        ])
+
+    def _evaluate(self):
+        self._tensor = self._func(*self._dependencies, **self._kwargs)
+        return True
+
+    @staticmethod
+    def _get_pairs(qm_positions, positions, cutoff):
+        """Return the (QM atom, atom) pairs closer than `cutoff`, searched in neighboring cells only."""
+
+        origin = positions.min(axis=1, keepdims=True)
+        n_cells = np.floor((positions.max(axis=1) - origin[:, 0]) / cutoff).astype(int) + 1
+
+        cell_index = np.ravel_multi_index(np.floor((positions - origin) / cutoff).astype(int), n_cells)
+        atoms = np.argsort(cell_index, kind='stable')
+        cell_start = np.searchsorted(cell_index[atoms], np.arange(n_cells.prod() + 1))
+
+        # The 27 cells around the cell of each QM atom
+        offsets = np.stack(np.meshgrid(*[np.arange(-1, 2)] * 3, indexing='ij')).reshape(3, 1, -1)
+        qm_cells = np.floor((qm_positions - origin) / cutoff).astype(int)[:, :, np.newaxis] + offsets
+        valid = np.all((qm_cells >= 0) & (qm_cells < n_cells[:, np.newaxis, np.newaxis]), axis=0)
+
+        qm_index = np.nonzero(valid)[0]
+        cells = np.ravel_multi_index(qm_cells[:, valid], n_cells)
+        counts = cell_start[cells + 1] - cell_start[cells]
+
+        ends = np.cumsum(counts)
+        i = np.repeat(qm_index, counts)
+        j = atoms[np.arange(ends[-1] if len(ends) else 0) + np.repeat(cell_start[cells] - ends + counts, counts)]
+
+        rij = positions[:, j] - qm_positions[:, i]
+        d = np.linalg.norm(rij, axis=0)
+        mask = (d < cutoff)
+
+        return i[mask], j[mask], rij[:, mask], d[mask]
+
+    @staticmethod
+    def _get_ewald_real_tensor(
+        qm_positions,
+        positions,
+        cutoff,
+        alpha,
+        exclusion=None
+        ):
+
+        qm_positions = np.asarray(qm_positions)
+        positions = np.asarray(positions)
+        n_qm = qm_positions.shape[1]
+        n_atoms = positions.shape[1]
+
+        i, j, rij, d = EwaldRealTensor._get_pairs(qm_positions, positions, cutoff)
+
+        if exclusion is not None:
+            mask = np.ones(n_atoms, dtype=bool)
+            mask[np.asarray(exclusion)] = False
+            mask = mask[j]
+            i, j, rij, d = i[mask], j[mask], rij[:, mask], d[mask]
+
+        d2 = np.power(d, 2)
+        prod = erfc(alpha * d) / d
+        prod2 = prod / d2 + 2 * alpha * np.exp(-1 * alpha**2 * d2) / SQRTPI / d2
+
+        data = np.concatenate((prod, (prod2 * rij).ravel()))
+        rows = np.concatenate([i + k * n_qm for k in range(4)])
+        cols = np.tile(j, 4)
+
+        return csr_matrix((data, (rows, cols)), shape=(4 * n_qm, n_atoms))
@@ -19,7 +19,7 @@ class Result(object):
         qmmm_coulomb_tensor,
         qmmm_coulomb_tensor_gradient,
         weighted_qmmm_coulomb_tensor,
-        weighted_qmmm_coulomb_tensor_inv,
+        weighted_qmmm_coulomb_tensor_solver,
         elec,
         ):
 
@@ -40,7 +40,7 @@ class Result(object):
             func=Result._get_qm_esp_charges,
             dependencies=[
                 scaling_factor,
-                weighted_qmmm_coulomb_tensor_inv,
+                weighted_qmmm_coulomb_tensor_solver,
                 self.mm_esp,
             ],
         )
@@ -52,22 +52,80 @@ class Result(object):
             ],
         )
 
+        # Intermediates shared by the QM and MM energy gradients
+        self._mm_usp_charges = DependArray(
+            name="mm_usp_charges", # Unscaled projected MM charges
+            func=(lambda x, y: x.solve(y[0])),
+            dependencies=[
+                weighted_qmmm_coulomb_tensor_solver,
+                elec.qm_residual_esp,
+            ],
+        )
+        self._qm_esp_charges_inv = DependArray(
+            name="qm_esp_charges_inv", # pinv(wt) @ qm_esp_charges
+            func=(lambda x, y: x.solve(y)),
+            dependencies=[
+                weighted_qmmm_coulomb_tensor_solver,
+                self.qm_esp_charges,
+            ],
+        )
+        self._mm_usp_charges_inv = DependArray(
+            name="mm_usp_charges_inv", # mm_usp_charges @ pinv(wt)
+            func=(lambda x, y: x.solve_T(y)),
+            dependencies=[
+                weighted_qmmm_coulomb_tensor_solver,
+                self._mm_usp_charges,
+            ],
+        )
+        self._qm_esp_residual = DependArray(
+            name="qm_esp_residual", # QM ESP not reproduced by the projected MM charges
+            func=(lambda x, y, z: x[0] - y @ z),
+            dependencies=[
+                elec.qm_residual_esp,
+                weighted_qmmm_coulomb_tensor,
+                self._mm_usp_charges,
+            ],
+        )
+        self._mm_esp_residual = DependArray(
+            name="mm_esp_residual", # MM ESP not reproduced by the QM ESP charges
+            func=(lambda w, x, y, z: w * x[0] - y @ z),
+            dependencies=[
+                scaling_factor,
+                self.mm_esp,
+                self.qm_esp_charges,
+                weighted_qmmm_coulomb_tensor,
+            ],
+        )
+        self._qmmm_coulomb_tensor_products = DependArray(
+            name="qmmm_coulomb_tensor_products",
+            func=(lambda t, *x: np.stack(x) @ t),
+            dependencies=[
+                qmmm_coulomb_tensor,
+                self.qm_esp_charges,
+                self._qm_esp_residual,
+                self._mm_usp_charges_inv,
+            ],
+        )
+
         # QM energy gradient
         self._energy_gradient_qm = DependArray(
             name="energy_gradient_qm",
             func=Result._get_energy_gradient_qm,
             dependencies=[
-                qmmm_coulomb_tensor,
                 qmmm_coulomb_tensor_gradient,
                 scaling_factor,
                 scaling_factor_gradient,
-                weighted_qmmm_coulomb_tensor,
-                weighted_qmmm_coulomb_tensor_inv,
-                elec.qm_residual_esp,
                 elec.full.qm_total_esp,
                 self._qm_energy_gradient,
                 self.mm_esp,
                 mm_charges,
+                self.qm_esp_charges,
+                self._mm_usp_charges,
+                self._qm_esp_charges_inv,
+                self._mm_usp_charges_inv,
+                self._qm_esp_residual,
+                self._mm_esp_residual,
+                self._qmmm_coulomb_tensor_products,
             ],
         )
 
@@ -76,15 +134,18 @@ class Result(object):
             name="energy_gradient_mm",
             func=Result._get_energy_gradient_mm,
             dependencies=[
-                qmmm_coulomb_tensor,
                 qmmm_coulomb_tensor_gradient,
                 scaling_factor,
                 scaling_factor_gradient,
-                weighted_qmmm_coulomb_tensor,
-                weighted_qmmm_coulomb_tensor_inv,
-                elec.qm_residual_esp,
                 self.mm_esp,
                 mm_charges,
+                self.qm_esp_charges,
+                self._mm_usp_charges,
+                self._qm_esp_charges_inv,
+                self._mm_usp_charges_inv,
+                self._qm_esp_residual,
+                self._mm_esp_residual,
+                self._qmmm_coulomb_tensor_products,
             ],
         )
 
@@ -138,46 +199,82 @@ class Result(object):
         )
 
     @staticmethod
-    def _get_qm_esp_charges(w, wt_inv, mm_esp):
-        return w * mm_esp[0] @ wt_inv
+    def _get_qm_esp_charges(w, wt_solver, mm_esp):
+        return wt_solver.solve_T(w * mm_esp[0])
 
     @staticmethod
-    def _get_energy_gradient_qm(t, t_grad, w, w_grad, wt, wt_inv, qm_esp, qm_total_esp, qm_grad, mm_esp, mm_charges):
+    def _get_energy_gradient_qm(
+        t_grad,
+        w,
+        w_grad,
+        qm_total_esp,
+        qm_grad,
+        mm_esp,
+        mm_charges,
+        qm_esp_charges,
+        mm_usp_charges,
+        qm_esp_charges_inv,
+        mm_usp_charges_inv,
+        qm_esp_residual,
+        mm_esp_residual,
+        t_products,
+        ):
+        """The products of `t` with (qm_esp_charges, qm_esp_residual, mm_usp_charges_inv) are `t_products`."""
 
-        qm_esp_charges =  w * mm_esp[0] @ wt_inv
-        mm_usp_charges = wt_inv @ qm_esp[0] # Unscaled projected MM charges
+        # The three products with t_grad are summed in a single contraction
+        t_grad_terms = np.einsum(
+            'cqn,kn,kq->cq',
+            t_grad,
+            np.stack((mm_usp_charges + mm_charges, -qm_esp_charges_inv, -mm_esp_residual)) * w,
+            np.stack((qm_esp_charges, qm_esp_residual, mm_usp_charges_inv)),
+            optimize=True,
+        )
 
         return (
-            qm_grad + 
+            qm_grad +
             w_grad @ (
-                (mm_usp_charges + mm_charges) * (qm_esp_charges @ t - mm_esp[0]) -
-                (qm_esp[0] - wt @ mm_usp_charges) @ t * (qm_esp_charges @ wt_inv.T) -
-                (wt_inv.T @ mm_usp_charges) @ t * (w * mm_esp[0] - qm_esp_charges @ wt)
+                (mm_usp_charges + mm_charges) * (t_products[0] - mm_esp[0]) -
+                t_products[1] * qm_esp_charges_inv -
+                t_products[2] * mm_esp_residual
             ) +
-            (t_grad @ ((mm_usp_charges + mm_charges) * w) + qm_total_esp[1:]) * qm_esp_charges -
-            t_grad @ (qm_esp_charges @ wt_inv.T * w) * (qm_esp[0] - wt @ mm_usp_charges) -
-            t_grad @ ((w * mm_esp[0] - qm_esp_charges @ wt) * w) * (wt_inv.T @ mm_usp_charges)
+            qm_total_esp[1:] * qm_esp_charges +
+            t_grad_terms
         )
 
     @staticmethod
-    def _get_energy_gradient_mm(t, t_grad, w, w_grad, wt, wt_inv, qm_esp, mm_esp, mm_charges):
+    def _get_energy_gradient_mm(
+        t_grad,
+        w,
+        w_grad,
+        mm_esp,
+        mm_charges,
+        qm_esp_charges,
+        mm_usp_charges,
+        qm_esp_charges_inv,
+        mm_usp_charges_inv,
+        qm_esp_residual,
+        mm_esp_residual,
+        t_products,
+        ):
+        """The products of `t` with (qm_esp_charges, qm_esp_residual, mm_usp_charges_inv) are `t_products`."""
 
-        qm_esp_charges =  w * mm_esp[0] @ wt_inv
-        mm_usp_charges = wt_inv @ qm_esp[0] # Unscaled projected MM charges
+        # The three products with t_grad are summed in a single contraction
+        t_grad_terms = np.einsum(
+            'cqn,kq,kn->cn',
+            t_grad,
+            np.stack((qm_esp_charges, qm_esp_residual, mm_usp_charges_inv)),
+            np.stack((-(mm_usp_charges + mm_charges), qm_esp_charges_inv, mm_esp_residual)),
+            optimize=True,
+        )
 
         return (
-            (mm_usp_charges + mm_charges) * (
-                (mm_esp[1:] - qm_esp_charges @ t_grad) * w + 
-                (mm_esp[0] - qm_esp_charges @ t) * w_grad.sum(axis=1)
+            (mm_usp_charges + mm_charges) * mm_esp[1:] * w +
+            w_grad.sum(axis=1) * (
+                (mm_usp_charges + mm_charges) * (mm_esp[0] - t_products[0]) +
+                qm_esp_charges_inv * t_products[1] +
+                mm_esp_residual * t_products[2]
             ) +
-            (qm_esp_charges @ wt_inv.T) * (
-                (qm_esp[0] - wt @ mm_usp_charges) @ t * w_grad.sum(axis=1) +
-                (qm_esp[0] - wt @ mm_usp_charges) @ t_grad * w
-            ) + 
-            (w * mm_esp[0] - qm_esp_charges @ wt) * (
-                (wt_inv.T @ mm_usp_charges @ t) * w_grad.sum(axis=1) +
-                (wt_inv.T @ mm_usp_charges @ t_grad) * w
-            )
+            t_grad_terms * w
         )
 
     @staticmethod
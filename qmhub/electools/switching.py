@@ -1,144 +1,137 @@
 import warnings
 import numpy as np
 
-from .distance import get_dij_min, get_dij_min_gradient
+from ..utils.buffer import Buffer
+from ..utils.dobject import DependObject, cache_update
 
 
-__all__ = ["get_scaling_factor", "get_scaling_factor_gradient"]
+__all__ = ["Switching", "register_switching_function"]
 
 
-def get_scaling_factor(switching_type):
-    if switching_type.lower() == "shift":
-        return get_scaling_factor_shift
-    elif switching_type.lower() == "switch":
-        return get_scaling_factor_switch
-    elif switching_type.lower() == "lrec":
-        return get_scaling_factor_lrec
-    else:
-        raise ValueError("Switching function" +  switching_type + "not supported.")
+SWITCHING_FUNCTIONS = {}
 
 
-def get_scaling_factor_gradient(switching_type):
-    if switching_type.lower() == "shift":
-        return get_scaling_factor_gradient_shift
-    elif switching_type.lower() == "switch":
-        return get_scaling_factor_gradient_switch
-    elif switching_type.lower() == "lrec":
-        return get_scaling_factor_gradient_lrec
-    else:
-        raise ValueError("Switching function" +  switching_type + "not supported.")
+def register_switching_function(name):
+    """Register a switching function as the switching type `name`.
 
+    The function is called as `func(dij_min, cutoff, swdist)` and returns the scaling factors
+    and their derivatives with respect to `dij_min`. The MM1 atoms are handled by `Switching`.
+    """
 
-def get_scaling_factor_shift(dij_min=None, cutoff=None, swdist=None, *, rij=None):
-    if dij_min is None:
-        dij_min = get_dij_min(rij=rij)
+    def decorator(func):
+        SWITCHING_FUNCTIONS[name.lower()] = func
+        return func
 
-    ratio = dij_min / cutoff
-    scaling_factor = (1 - ratio**2)**2
-    scaling_factor *= (ratio < 1.)
+    return decorator
 
-    # MM1
-    scaling_factor[np.where(dij_min < .8)] = 1.0
 
-    return scaling_factor
+class Switching(DependObject):
+    """Scaling factors of the near-field MM charges and their gradients, from one evaluation of the switching function.
 
+    The gradients are formed in a single pass over the `(3, n_qm, n_near)` gradient of the inverse
+    distances, scaled by the derivatives of the soft-min distance and of the switching function,
+    and written into a buffer reused from step to step.
+    """
 
-def get_scaling_factor_gradient_shift(dij_min=None, dij_min_gradient=None, cutoff=None, swdist=None, *, rij=None):
-    if dij_min is None:
-        dij_min = get_dij_min(rij=rij)
+    def __init__(self, dij_min, dij_inverse, dij_inverse_gradient, *, switching_type='shift', cutoff=None, swdist=None, beta=500.):
+        try:
+            func = SWITCHING_FUNCTIONS[switching_type.lower()]
+        except KeyError:
+            raise ValueError(f"Switching function {switching_type} not supported.") from None
 
-    if dij_min_gradient is None:
-        dij_min_gradient = get_dij_min_gradient(rij=rij)
-
-    ratio = dij_min / cutoff
-    scaling_factor_gradient = -4 * (1 - ratio**2) * ratio / cutoff * dij_min_gradient
-    scaling_factor_gradient *= (ratio < 1.)
+        super().__init__(
+            name="switching",
+            func=func,
+            kwargs={'cutoff': cutoff, 'swdist': swdist},
+            dependencies=[dij_min, dij_inverse, dij_inverse_gradient],
+        )
 
-    # MM1
-    scaling_factor_gradient[:, :, np.where(dij_min < .8)] = 0.0
+        self.beta = beta
 
-    return scaling_factor_gradient
+        self._buffer = Buffer()
+        self._scaling_factor = None
+        self._scaling_factor_gradient = None
 
+    @property
+    @cache_update
+    def scaling_factor(self):
+        return self._scaling_factor
 
-def get_scaling_factor_switch(dij_min=None, cutoff=None, swdist=None, *, rij=None):
-    if dij_min is None:
-        dij_min = get_dij_min(rij=rij)
-
-    if swdist is None:
-        swdist = 0.75 * cutoff
-    if cutoff < swdist:
-        raise ValueError("Cutoff should be greater than Swdist.")
+    @property
+    @cache_update
+    def scaling_factor_gradient(self):
+        return self._scaling_factor_gradient
 
-    dratio2 = (dij_min / cutoff)**2
-    sratio2 = (swdist / cutoff)**2
+    def _evaluate(self):
+        dij_min, dij_inverse, dij_inverse_gradient = (np.asarray(item) for item in self._dependencies)
 
-    if sratio2 < 1.:
-        scaling_factor = ((1 - dratio2)**2
-                        * (1 + 2 * dratio2 - 3 * sratio2)
-                        / (1 - sratio2)**3
-                        * (dratio2 >= sratio2)
-                        * (dratio2 < 1.)
-                        + (dratio2 < sratio2))
-    elif sratio2 == 1.:
-        warnings.warn("Not switching MM charges might cause discontinuity at the cutoff.")
-        scaling_factor = (dratio2 < sratio2).astype(float)
+        scaling_factor, derivative = self._func(dij_min, **self._kwargs)
 
-    # MM1
-    scaling_factor[np.where(dij_min < .8)] = 1.0
+        # MM1
+        mm1 = (dij_min < .8)
+        scaling_factor[mm1] = 1.0
+        derivative[mm1] = 0.0
 
-    return scaling_factor
+        # Derivatives of the soft-min distance dij_min with respect to the inverse distances
+        factor = np.nan_to_num(-1 * dij_min**2 * np.exp(self.beta * dij_inverse - self.beta / dij_min)) * derivative
 
+        self._scaling_factor = scaling_factor
+        self._scaling_factor_gradient = np.multiply(
+            dij_inverse_gradient,
+            factor,
+            out=self._buffer.get(dij_inverse_gradient.shape),
+        )
 
-def get_scaling_factor_gradient_switch(dij_min=None, dij_min_gradient=None, cutoff=None, swdist=None, *, rij=None):
-    if dij_min is None:
-        dij_min = get_dij_min(rij=rij)
+        return True
 
-    if dij_min_gradient is None:
-        dij_min_gradient = get_dij_min_gradient(rij=rij)
 
-    dratio2 = (dij_min / cutoff)**2
-    sratio2 = (swdist / cutoff)**2
-
-    if sratio2 < 1.:
-        scaling_factor_gradient = (-12 * (dratio2 - sratio2)
-                                * (1 - dratio2)
-                                / (1 - sratio2)**3 * dij_min / cutoff**2 * dij_min_gradient)
-        scaling_factor_gradient *= (dratio2 >= sratio2) * (dratio2 < 1.)
-    elif sratio2 == 1.:
-        scaling_factor_gradient = np.zeros_like(dij_min_gradient)
-
-    # MM1
-    scaling_factor_gradient[:, :, np.where(dij_min < .8)] = 0.0
+@register_switching_function("shift")
+def shift(dij_min, cutoff, swdist=None):
+    ratio = dij_min / cutoff
+    inside = (ratio < 1.)
 
-    return scaling_factor_gradient
+    scaling_factor = (1 - ratio**2)**2 * inside
+    derivative = -4 * (1 - ratio**2) * ratio / cutoff * inside
 
+    return scaling_factor, derivative
 
-def get_scaling_factor_lrec(dij_min=None, cutoff=None, swdist=None, *, rij=None):
-    if dij_min is None:
-        dij_min = get_dij_min(rij=rij)
 
-    ratio = 1 - dij_min / cutoff
-    scaling_factor = 1 - (2 * ratio**3 - 3* ratio**2 + 1)**2
-    scaling_factor *= (ratio < 1.)
-
-    # MM1
-    scaling_factor[np.where(dij_min < .8)] = 1.0
+@register_switching_function("switch")
+def switch(dij_min, cutoff, swdist=None):
+    if swdist is None:
+        swdist = 0.75 * cutoff
+    if cutoff < swdist:
+        raise ValueError("Cutoff should be greater than Swdist.")
 
-    return scaling_factor
+    dratio2 = (dij_min / cutoff)**2
+    sratio2 = (swdist / cutoff)**2
 
+    if sratio2 < 1.:
+        switching = (dratio2 >= sratio2) * (dratio2 < 1.)
+        scaling_factor = ((1 - dratio2)**2
+                          * (1 + 2 * dratio2 - 3 * sratio2)
+                          / (1 - sratio2)**3
+                          * switching
+                          + (dratio2 < sratio2))
+        derivative = (-12 * (dratio2 - sratio2)
+                      * (1 - dratio2)
+                      / (1 - sratio2)**3 * dij_min / cutoff**2
+                      * switching)
+    else:
+        warnings.warn("Not switching MM charges might cause discontinuity at the cutoff.")
+        scaling_factor = (dratio2 < sratio2).astype(float)
+        derivative = np.zeros_like(scaling_factor)
 
-def get_scaling_factor_gradient_lrec(dij_min=None, dij_min_gradient=None, cutoff=None, swdist=None, *, rij=None):
-    if dij_min is None:
-        dij_min = get_dij_min(rij=rij)
+    return scaling_factor, derivative
 
-    if dij_min_gradient is None:
-        dij_min_gradient = get_dij_min_gradient(rij=rij)
 
+@register_switching_function("lrec")
+def lrec(dij_min, cutoff, swdist=None):
     ratio = 1 - dij_min / cutoff
-    scaling_factor_gradient = -12 * ratio * (2 * ratio**3 - 3 * ratio**2 + 1) * dij_min / cutoff**2 * dij_min_gradient
-    scaling_factor_gradient *= (ratio < 1.)
+    inside = (ratio < 1.)
+    polynomial = 2 * ratio**3 - 3 * ratio**2 + 1
 
-    # MM1
-    scaling_factor_gradient[:, :, np.where(dij_min < .8)] = 0.0
+    scaling_factor = (1 - polynomial**2) * inside
+    derivative = -12 * ratio * polynomial * dij_min / cutoff**2 * inside
 
-    return scaling_factor_gradient
+    return scaling_factor, derivative
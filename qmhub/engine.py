@@ -1,9 +1,26 @@
 import os
 import subprocess as sp
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
 from .qmtools import QM
 from .utils.darray import DependArray
+from .utils.dobject import update_caches_concurrently
+
+
+def check_shared_files(engines):
+    """Raise a ValueError if any two of `engines` (name: QM object) would use the same files in the same directory."""
+
+    items = list(engines.items())
+    for i, (name, engine) in enumerate(items):
+        for other_name, other in items[(i + 1):]:
+            shared = set(engine.FILES) & set(other.FILES)
+            if shared and Path(engine.cwd).resolve() == Path(other.cwd).resolve():
+                raise ValueError(
+                    f"Engines '{name}' and '{other_name}' would both use {', '.join(sorted(shared))} in {engine.cwd}. "
+                    "Please give them different working directories."
+                )
 
 
 class Engine(object):
@@ -37,21 +54,25 @@ class Engine(object):
             self.mult = 1
 
         self.engines = {}
+        self._executor = None
 
         self.qm_energy = DependArray(
             name="qm_energy",
-            func=(lambda *args: sum(args)),
+            func=self._get_sum,
             dependencies=[],
+            lazy=True,
         )
         self.qm_energy_gradient = DependArray(
             name="qm_energy_gradient",
-            func=(lambda *args: sum(args)),
+            func=self._get_sum,
             dependencies=[],
+            lazy=True,
         )
         self.mm_esp = DependArray(
             name="mm_esp",
-            func=(lambda *args: sum(args)),
+            func=self._get_sum,
             dependencies=[],
+            lazy=True,
         )
 
     def add_engine(self, engine, name=None, cwd=None, options=None):
@@ -69,9 +90,23 @@ class Engine(object):
             options = options,
         )
 
+        # The engines of a group run at the same time and must not share files
+        check_shared_files({name: engine_obj, **self.engines})
+
         setattr(self, name, engine_obj)
         self.engines[name] = engine_obj
 
+        if len(self.engines) > 1:
+            if self._executor is not None:
+                self._executor.shutdown()
+            self._executor = ThreadPoolExecutor(max_workers=len(self.engines))
+
         self.qm_energy.add_dependency(engine_obj.qm_energy)
         self.qm_energy_gradient.add_dependency(engine_obj.qm_energy_gradient)
         self.mm_esp.add_dependency(engine_obj.mm_esp)
+
+    def _get_sum(self, *args):
+        # Run all engines of the group at the same time before pulling their results
+        update_caches_concurrently([engine._qm_cache for engine in self.engines.values()], self._executor)
+
+        return sum(args)
@@ -35,8 +35,8 @@ class IOBin(object):
             dtype = [('pos_x', "f8"), ('pos_y', "f8"), ('pos_z', "f8"), ('charge', "f8")]
             mm_atoms = np.fromfile(f, dtype=dtype, count=n_mm_atoms)
 
-        # Load unit cell information
-        cell_basis = np.fromfile(f, dtype="f8", count=9).reshape(3, 3)
+        # Load unit cell information (one lattice vector after another, stored as columns)
+        cell_basis = np.fromfile(f, dtype="f8", count=9).reshape(3, 3).T
         cell_basis[np.isclose(cell_basis, 0.0)] = 0.0
 
         f.close()
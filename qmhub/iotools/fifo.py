@@ -11,6 +11,18 @@ def read_fifo(fin, dtype, count):
     return np.frombuffer(buffer, dtype=dtype, count=count)
 
 
+def readinto_fifo(fin, buffer):
+    """Fill a writable byte memoryview in place, raising EOFError if the FIFO is closed first."""
+    n_bytes = fin.readinto(buffer)
+
+    # A pipe may return fewer bytes than requested
+    while n_bytes < len(buffer):
+        n = fin.readinto(buffer[n_bytes:])
+        if not n:
+            raise EOFError
+        n_bytes += n
+
+
 class IOFifo(object):
     def __init__(self, cwd=None):
         self.mode = "fifo"
@@ -52,41 +64,53 @@ class IOFifo(object):
             cell_basis[np.isclose(cell_basis, 0.0)] = 0.0
             self._system.cell_basis[:] = cell_basis
 
-        # First cycle
-        self._step[()] = read_fifo(self._fin, dtype="i4", count=1)
-
-        if self._pbc == 2 :
-            cell_basis = read_fifo(self._fin, dtype="f8", count=9).reshape(3, 3).copy()
-            cell_basis[np.isclose(cell_basis, 0.0)] = 0.0
-            self._system.cell_basis[:] = cell_basis
-
-        self._system.atoms.positions[:] = read_fifo(self._fin, dtype="f8", count=self._n_atoms * 3).reshape(3, self._n_atoms)
+        # Buffers reused every step, read into and written from in place
+        positions = self._system.atoms.positions
+        step = np.zeros(1, dtype="i4")
+        cell_basis = np.zeros((3, 3))
+        cell_scratch = np.zeros((3, 3))
+        cell_mask = np.zeros((3, 3), dtype=bool)
+        results = np.zeros(1 + self._n_atoms * 3)
+        energy_buffer = results[:1]
+        forces_buffer = results[1:].reshape(self._n_atoms, 3).T
 
-        self._system.wrap_positions()
+        step_view = memoryview(step).cast("B")
+        cell_basis_view = memoryview(cell_basis).cast("B")
+        positions_view = memoryview(positions.array).cast("B")
 
-        self._fout = open(output, "wb")
-        self._fout.write(energy.tobytes())
-        self._fout.write(forces.tobytes(order="F"))
+        # Opened after the first step is read, as the driver opens its end only then
+        self._fout = None
 
         while True:
 
             try:
-                _step = read_fifo(self._fin, dtype="i4", count=1)
-                self._step[()] = _step
-            except:
+                readinto_fifo(self._fin, step_view)
+            except EOFError:
                 break
 
+            self._step[()] = step[0]
+
             if self._pbc == 2 :
-                cell_basis = read_fifo(self._fin, dtype="f8", count=9).reshape(3, 3).copy()
-                cell_basis[np.isclose(cell_basis, 0.0)] = 0.0
+                readinto_fifo(self._fin, cell_basis_view)
+
+                # Same as cell_basis[np.isclose(cell_basis, 0.0)] = 0.0, without temporaries
+                np.abs(cell_basis, out=cell_scratch)
+                np.less_equal(cell_scratch, 1e-8, out=cell_mask)
+                np.copyto(cell_basis, 0.0, where=cell_mask)
                 self._system.cell_basis[:] = cell_basis
 
-            self._system.atoms.positions[:] = read_fifo(self._fin, dtype="f8", count=self._n_atoms * 3).reshape(3, self._n_atoms)
+            readinto_fifo(self._fin, positions_view)
+            positions._set_modified()
 
             self._system.wrap_positions()
 
-            self._fout.write(energy.tobytes())
-            self._fout.write(forces.tobytes(order="F"))
+            np.copyto(energy_buffer, np.asarray(energy).reshape(-1))
+            np.copyto(forces_buffer, np.asarray(forces))
+
+            if self._fout is None:
+                self._fout = open(output, "wb", buffering=0)
+
+            self._fout.write(results)
 
     @staticmethod
     def save_input(input):
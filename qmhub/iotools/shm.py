@@ -0,0 +1,164 @@
+import os, stat, mmap
+from pathlib import Path
+
+import numpy as np
+
+from ..atoms import Atoms
+from ..system import System
+from ..utils.darray import DependArray
+
+
+HEADER_SIZE = 8
+
+
+class IOShm(object):
+    """Exchange data with the driver through a shared-memory segment.
+
+    The segment is a file, normally under /dev/shm, laid out as an int32
+    header (n_atoms, n_qm_atoms, qm_charge, qm_mult, pbc, step and two
+    padding words) followed by the float64 arrays positions (3, n_atoms),
+    cell_basis (3, 3), charges (n_atoms), energy (1) and forces (n_atoms, 3),
+    and the int32 elements (n_qm_atoms). The driver rings the doorbell FIFO
+    `<input>.req` with one byte once the coordinates of a step are in place
+    and qmhub answers with one byte on `<input>.ack` once the results are
+    written back. Closing the request FIFO ends the simulation.
+
+    The positions and charges of the system are the arrays in the segment,
+    so the positions are wrapped in place there.
+    """
+    def __init__(self, cwd=None):
+        self.mode = "shm"
+        self.cwd = cwd
+
+    @staticmethod
+    def get_layout(n_atoms, n_qm_atoms):
+        layout = {}
+        offset = HEADER_SIZE * 4
+
+        for name, dtype, shape in [
+            ('positions', "f8", (3, n_atoms)),
+            ('cell_basis', "f8", (3, 3)),
+            ('charges', "f8", (n_atoms,)),
+            ('energy', "f8", (1,)),
+            ('forces', "f8", (n_atoms, 3)),
+            ('elements', "i4", (n_qm_atoms,)),
+        ]:
+            layout[name] = (dtype, shape, offset)
+            offset += np.dtype(dtype).itemsize * int(np.prod(shape))
+
+        return layout, offset
+
+    def load_system(self, input, system=None, step=None):
+
+        self.input = Path(input)
+        self.cwd = self.cwd or self.input.parent
+
+        if step is None:
+            step = 0
+
+        self._step = np.asarray(step)
+
+        with open(self.input, "r+b") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0)
+
+        self._header = np.frombuffer(self._buffer, dtype="i4", count=HEADER_SIZE)
+        self._n_atoms, self._n_qm_atoms, qm_charge, qm_mult, self._pbc = self._header[:5]
+
+        layout, size = self.get_layout(self._n_atoms, self._n_qm_atoms)
+        if len(self._buffer) < size:
+            raise ValueError(f"The shared-memory segment is {len(self._buffer)} bytes, expected {size} bytes.")
+
+        for name, (dtype, shape, offset) in layout.items():
+            array = np.frombuffer(self._buffer, dtype=dtype, count=int(np.prod(shape)), offset=offset)
+            setattr(self, "_" + name, array.reshape(shape))
+
+        req = self.input.with_name(self.input.name + ".req")
+        assert stat.S_ISFIFO(os.stat(req).st_mode)
+
+        # Create the reply FIFO before the driver can ring for the first time
+        self._make_fifo(self.input.with_name(self.input.name + ".ack"))
+
+        self._fin = open(req, "rb", buffering=0)
+
+        if system is None:
+            atoms = Atoms(
+                positions=DependArray(self._positions),
+                charges=DependArray(self._charges),
+                elements=DependArray(np.zeros(self._n_atoms, dtype=int)),
+            )
+            system = System(self._n_atoms, self._n_qm_atoms, qm_charge=qm_charge, qm_mult=qm_mult, atoms=atoms)
+
+        self._system = system
+
+        # Scratch arrays reused every step
+        self._cell_buffer = np.zeros((3, 3))
+        self._cell_scratch = np.zeros((3, 3))
+        self._cell_mask = np.zeros((3, 3), dtype=bool)
+
+        return self._system
+
+    @staticmethod
+    def _make_fifo(path):
+        try:
+            os.mkfifo(path)
+        except FileExistsError:
+            pass
+
+    def _read_cell_basis(self):
+        cell_basis = self._cell_buffer
+        np.copyto(cell_basis, self._cell_basis)
+
+        # Same as cell_basis[np.isclose(cell_basis, 0.0)] = 0.0, without temporaries
+        np.abs(cell_basis, out=self._cell_scratch)
+        np.less_equal(self._cell_scratch, 1e-8, out=self._cell_mask)
+        np.copyto(cell_basis, 0.0, where=self._cell_mask)
+        self._system.cell_basis[:] = cell_basis
+
+    def return_results(self, energy, forces, output=None):
+        assert self._system is not None
+
+        output = output or self.input.with_name(self.input.name + ".ack")
+
+        self._make_fifo(output)
+
+        positions = self._system.atoms.positions
+        shared = np.shares_memory(positions.array, self._positions)
+
+        if not shared:
+            self._system.atoms.charges[:] = self._charges
+        self._system.qm.atoms.elements[:] = self._elements
+
+        if self._pbc > 0:
+            self._read_cell_basis()
+
+        self._fout = None
+
+        while self._fin.read(1):
+            self._step[()] = self._header[5]
+
+            if self._pbc == 2:
+                self._read_cell_basis()
+
+            if shared:
+                positions._set_modified()
+            else:
+                positions[:] = self._positions
+
+            self._system.wrap_positions()
+
+            np.copyto(self._energy, np.asarray(energy).reshape(-1))
+            np.copyto(self._forces, np.asarray(forces).T)
+
+            if self._fout is None:
+                self._fout = open(output, "wb", buffering=0)
+
+            self._fout.write(b"\0")
+
+        self._fin.close()
+        if self._fout is not None:
+            self._fout.close()
+
+    @staticmethod
+    def save_input(input):
+        """Preserve the input file passed from the driver."""
+        pass
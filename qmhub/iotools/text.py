@@ -35,8 +35,8 @@ class IOText(object):
             dtype = [('pos_x', "f8"), ('pos_y', "f8"), ('pos_z', "f8"), ('charge', "f8")]
             mm_atoms = np.loadtxt(f, dtype=dtype, max_rows=n_mm_atoms)
 
-        # Load unit cell information
-        cell_basis = np.loadtxt(f, max_rows=3)
+        # Load unit cell information (one lattice vector per line, stored as columns)
+        cell_basis = np.loadtxt(f, max_rows=3).T
         cell_basis[np.isclose(cell_basis, 0.0)] = 0.0
 
         f.close()
@@ -17,7 +17,10 @@ class Model(object):
         switching_type=None,
         cutoff=None,
         swdist=None,
+        skin=None,
         pbc=None,
+        pme_tol=None,
+        pme_tune_file=None,
         ):
         """
         Creat a Model object.
@@ -42,6 +45,11 @@ class Model(object):
         else:
             self.swdist = swdist
 
+        if skin is None:
+            self.skin = 1.
+        else:
+            self.skin = skin
+
         if pbc is not None:
             self.pbc = pbc
         elif np.any(self.cell_basis != 0.0):
@@ -59,7 +67,10 @@ class Model(object):
             switching_type=self.switching_type,
             cutoff=self.cutoff,
             swdist=self.swdist,
+            skin=self.skin,
             pbc=self.pbc,
+            pme_tol=pme_tol,
+            pme_tune_file=pme_tune_file,
         )
 
     def get_result(
@@ -82,7 +93,7 @@ class Model(object):
             qmmm_coulomb_tensor=self.elec.near_field.qmmm_coulomb_tensor,
             qmmm_coulomb_tensor_gradient=self.elec.near_field.qmmm_coulomb_tensor_gradient,
             weighted_qmmm_coulomb_tensor=self.elec.near_field.weighted_qmmm_coulomb_tensor,
-            weighted_qmmm_coulomb_tensor_inv=self.elec.near_field.weighted_qmmm_coulomb_tensor_inv,
+            weighted_qmmm_coulomb_tensor_solver=self.elec.near_field.weighted_qmmm_coulomb_tensor_solver,
             elec=self.elec,
         )
 
@@ -3,6 +3,8 @@ QMHub
 A universal QM/MM interface.
 """
 
+import os
+
 from .simulation import Simulation
 from .model import Model
 from .engine import Engine
@@ -23,7 +25,7 @@ class QMMM(object):
         if save_input:
             self.io.save_input(input)
 
-    def build_model(self, switching_type=None, cutoff=None, swdist=None, pbc=None):
+    def build_model(self, switching_type=None, cutoff=None, swdist=None, skin=None, pbc=None, pme_tol=None):
         if not hasattr(self, 'system'):
             raise AttributeError("Please load system first.")
 
@@ -37,7 +39,10 @@ class QMMM(object):
             switching_type=switching_type,
             cutoff=cutoff,
             swdist=swdist,
-            pbc=pbc
+            skin=skin,
+            pbc=pbc,
+            pme_tol=pme_tol,
+            pme_tune_file=os.path.join(self.io.cwd, "pme_tuning.json"),
         )
 
     def add_engine(self, engine, name=None, group_name=None, cwd=None, options=None):
@@ -65,7 +70,7 @@ class QMMM(object):
             )
 
             result_obj = getattr(self.model, group_name)
-            self.simulation.add_engine(group_name, result_obj)
+            self.simulation.add_engine(group_name, result_obj, group=group_obj)
 
         group_obj = self.engine_groups[group_name]
         group_obj.add_engine(engine, name=name, cwd=cwd, options=options)
@@ -8,6 +8,9 @@ class Dummy(QMBase):
     OUTPUT = None
     default_options = None
 
+    def _get_qm_cache(self, *args, output=None):
+        return []
+
     def _get_qm_energy(self, qm_cache=None):
         """Get QM energy from output of QM calculation."""
         return 0.
@@ -7,7 +7,7 @@ from qchem.miniqc import run_job
 from qchem.ctx import KeyType, QCStorage
 
 from .templates.miniqc import get_qm_template, default_options
-from .qmbase import QMBase
+from .qmbase import QMBase, format_columns
 
 
 class MiniQC(QMBase):
@@ -40,13 +40,13 @@ class MiniQC(QMBase):
 
         input_str += "$external_charges\n"
         if self.mm_charges is not None:
-            for x, y, z, c in zip(
+            input_str += format_columns(
+                "%21.14e %21.14e %21.14e %21.14e\n",
                 self.mm_positions[0],
                 self.mm_positions[1],
                 self.mm_positions[2],
                 self.mm_charges,
-            ):
-                input_str += f"{x:21.14e} {y:21.14e} {z:21.14e} {c:21.14e}\n"
+            )
         input_str += "$end\n"
 
         return input_str
@@ -3,14 +3,98 @@ import numpy as np
 
 from ..units import ORCA_BOHR_TO_A
 from .templates.orca import get_qm_template, default_options
-from .qmbase import QMBase
+from ..utils.sys import Worker
+from .qmbase import QMBase, format_columns, get_section
 
 
 class ORCA(QMBase):
+    """ORCA engine.
+
+    With the `server` option set to a command, the command is started once with the keyword
+    input "orca.inp" and kept running. At every step the geometry and point charges are sent
+    to its stdin as
+
+        step <n_qm> <n_mm> <charge> <mult>
+        <symbol> <x> <y> <z>        (n_qm lines, Angstrom)
+        <charge> <x> <y> <z>        (n_mm lines, Angstrom)
+
+    and the worker replies "done" once orca.out, orca.engrad, orca.vpot.out and orca.pcgrad
+    are written, keeping the density of the previous step as the guess. The worker shipped
+    with qmhub runs orca and orca_vpot from PATH:
+
+        server = python -m qmhub.qmtools.orca_server
+
+    A worker that does not reply within the `server_timeout` option (seconds) is stopped.
+    """
 
     OUTPUT = "orca.out"
     default_options = default_options
 
+    FILES = ("orca.inp", "orca.out", "orca.pc", "orca.gbw", "orca.guess.gbw", "orca.scfp", "orca.engrad", "orca.pcgrad", "orca.vpot.xyz", "orca.vpot.out")
+
+    SECTIONS = {
+        "energy": "FINAL SINGLE POINT ENERGY",
+        "mulliken": "MULLIKEN ATOMIC CHARGES",
+    }
+
+    server = None
+    server_timeout = None
+    _worker = None
+
+    def update_options(self, options=None):
+        if options is not None and "server" in options:
+            options = dict(options)
+            self.server = options.pop("server") or None
+
+        if options is not None and "server_timeout" in options:
+            options = dict(options)
+            timeout = options.pop("server_timeout")
+            self.server_timeout = float(timeout) if timeout else None
+
+        if self._worker is not None:
+            self._worker.close()
+            self._worker = None
+
+        super().update_options(options)
+
+    def run_qm(self):
+        """Run QM calculation."""
+
+        if self.server is None:
+            return super().run_qm()
+
+        if self._worker is None:
+            with open(Path(self.cwd).joinpath("orca.inp"), 'w') as f:
+                f.write(get_qm_template(self.options, nproc=self.nproc, pointcharges="orca.pc"))
+            self._worker = Worker(f"{self.server} orca.inp", cwd=self.cwd, timeout=self.server_timeout)
+
+        self._worker.request(self.gen_request())
+
+    def gen_request(self):
+        """Generate the lines sent to the worker in server mode."""
+
+        n_mm = len(self.mm_charges) if self.mm_charges is not None else 0
+
+        lines = [f"step {len(self.qm_elements)} {n_mm} {self.charge} {self.mult}\n"]
+        for s, x, y, z, in zip(
+            self.qm_element_symbols,
+            self.qm_positions[0],
+            self.qm_positions[1],
+            self.qm_positions[2],
+        ):
+            lines.append(f"{s:2} {x:21.14e} {y:21.14e} {z:21.14e}\n")
+
+        if n_mm > 0:
+            lines.append(format_columns(
+                "%21.14e %21.14e %21.14e %21.14e\n",
+                self.mm_charges,
+                self.mm_positions[0],
+                self.mm_positions[1],
+                self.mm_positions[2],
+            ))
+
+        return lines
+
     def gen_input(self):
         """Generate input file for QM software."""
 
@@ -38,22 +122,22 @@ class ORCA(QMBase):
         if self.mm_charges is not None:
             with open(Path(self.cwd).joinpath("orca.pc"), 'w') as f:
                 f.write(f"{len(self.mm_charges)}\n")
-                for c, x, y, z in zip(
+                f.write(format_columns(
+                    "%21.14e %21.14e %21.14e %21.14e\n",
                     self.mm_charges,
                     self.mm_positions[0],
                     self.mm_positions[1],
                     self.mm_positions[2],
-                ):
-                    f.write(f"{c:21.14e} {x:21.14e} {y:21.14e} {z:21.14e}\n")
+                ))
 
             with open(Path(self.cwd).joinpath("orca.vpot.xyz"), 'w') as f:
                 f.write(f"{len(self.mm_charges)}\n")
-                for x, y, z in zip(
+                f.write(format_columns(
+                    "%21.14e %21.14e %21.14e\n",
                     self.mm_positions[0] / ORCA_BOHR_TO_A,
                     self.mm_positions[1] / ORCA_BOHR_TO_A,
                     self.mm_positions[2] / ORCA_BOHR_TO_A,
-                ):
-                    f.write(f"{x:21.14e} {y:21.14e} {z:21.14e}\n")
+                ))
 
     def gen_cmdline(self):
         """Generate commandline for QM calculation."""
@@ -67,19 +151,10 @@ class ORCA(QMBase):
     def _get_qm_energy(self, qm_cache=None, output=None):
         """Get QM energy from output of QM calculation."""
 
-        if qm_cache is not None:
-            output = qm_cache
-        else:
-            try:
-                output = Path(output).read_text().split("\n")
-            except:
-                output = Path(self.cwd).joinpath(self.OUTPUT).read_text().split("\n")
-            else:
-                raise ValueError("Can not open output.")
-
-        for line in output:
-            if "FINAL SINGLE POINT ENERGY" in line:
-                return float(line.split()[-1])
+        output, sections = self._get_sections(qm_cache, output)
+
+        if "energy" in sections:
+            return float(output[sections["energy"]].split()[-1])
 
     def _get_qm_energy_gradient(self, qm_cache=None, output=None):
         """Get QM energy gradient from output of QM calculation."""
@@ -109,21 +184,7 @@ class ORCA(QMBase):
     def _get_mulliken_charges(self, qm_cache=None, output=None):
         """Get Mulliken charges from output of QM calculation."""
 
-        if qm_cache is not None:
-            output = qm_cache
-        else:
-            try:
-                output = Path(output).read_text().split("\n")
-            except:
-                output = Path(self.cwd).joinpath(self.OUTPUT).read_text().split("\n")
-            else:
-                raise ValueError("Can not open output.")
-
-        for i in range(len(output)):
-            if "MULLIKEN ATOMIC CHARGES" in output[i]:
-                charges = []
-                for line in output[(i + 2):(i + 2 + len(self.qm_elements))]:
-                    charges.append(float(line.split()[3]))
-                break
-
-        return np.array(charges)
+        output, sections = self._get_sections(qm_cache, output)
+
+        lines = get_section(output, sections, "mulliken", len(self.qm_elements), skip=2)
+        return np.array([float(line.split()[3]) for line in lines])
@@ -0,0 +1,106 @@
+"""
+Worker for the server mode of the ORCA engine.
+
+    python -m qmhub.qmtools.orca_server orca.inp
+
+reads the keyword input from orca.inp once and then serves the steps sent to its stdin (see
+`ORCA`) by running orca and orca_vpot from PATH in the current directory. The orbitals of each
+step are kept as orca.guess.gbw and read as the guess of the next step.
+"""
+
+import shutil
+import subprocess as sp
+import sys
+from pathlib import Path
+
+from ..units import ORCA_BOHR_TO_A
+
+
+GUESS = "orca.guess.gbw"
+
+
+def gen_input(template, qm_lines, charge, mult, guess=False):
+    """Return the ORCA input of a step from the keyword input and the lines of the QM atoms."""
+
+    lines = [template]
+
+    if guess:
+        lines.append("! MORead\n")
+        lines.append(f'%moinp "{GUESS}"\n')
+
+    lines.append("%coords\n")
+    lines.append("  CTyp xyz\n")
+    lines.append(f"  Charge {charge}\n")
+    lines.append(f"  Mult {mult}\n")
+    lines.append("  Units Angs\n")
+    lines.append("  coords\n")
+    lines.extend(f"    {line.strip()}\n" for line in qm_lines)
+    lines.append("  end\n")
+    lines.append("end\n")
+
+    return "".join(lines)
+
+
+def run_step(template, qm_lines, mm_lines, charge, mult):
+    """Run orca and orca_vpot for one step in the current directory."""
+
+    orca, orca_vpot = shutil.which("orca"), shutil.which("orca_vpot")
+    if orca is None or orca_vpot is None:
+        raise RuntimeError("orca and orca_vpot are not found in PATH")
+
+    Path("orca.inp").write_text(gen_input(template, qm_lines, charge, mult, guess=Path(GUESS).exists()))
+
+    with open("orca.pc", "w") as f:
+        f.write(f"{len(mm_lines)}\n")
+        f.writelines(mm_lines)
+
+    with open("orca.vpot.xyz", "w") as f:
+        f.write(f"{len(mm_lines)}\n")
+        for line in mm_lines:
+            f.write(" ".join(f"{float(x) / ORCA_BOHR_TO_A:21.14e}" for x in line.split()[1:]) + "\n")
+
+    with open("orca.out", "w") as out:
+        # ORCA has to be called with its full path to run in parallel
+        if sp.run([orca, "orca.inp"], stdout=out).returncode != 0:
+            raise RuntimeError("orca failed, see orca.out")
+        out.flush()
+        if sp.run([orca_vpot, "orca.gbw", "orca.scfp", "orca.vpot.xyz", "orca.vpot.out"], stdout=out).returncode != 0:
+            raise RuntimeError("orca_vpot failed, see orca.out")
+
+    shutil.copyfile("orca.gbw", GUESS)
+
+
+def serve(template, fin, fout):
+    """Serve the steps read from `fin` until it is closed or an "exit" line is read."""
+
+    for line in fin:
+        words = line.split()
+        if not words or words[0] == "exit":
+            break
+
+        n_qm, n_mm, charge, mult = (int(word) for word in words[1:5])
+        qm_lines = [fin.readline() for i in range(n_qm)]
+        mm_lines = [fin.readline() for i in range(n_mm)]
+
+        try:
+            run_step(template, qm_lines, mm_lines, charge, mult)
+        except (OSError, RuntimeError) as e:
+            print(f"error {e}", file=fout, flush=True)
+        else:
+            print("done", file=fout, flush=True)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    if len(argv) != 1:
+        sys.exit("usage: python -m qmhub.qmtools.orca_server orca.inp")
+
+    # Stale orbitals from an earlier run are not a guess for this one
+    Path(GUESS).unlink(missing_ok=True)
+
+    serve(Path(argv[0]).read_text(), sys.stdin, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ from pathlib import Path
 import numpy as np
 
 from .templates.qchem import get_qm_template, default_options
-from .qmbase import QMBase
+from .qmbase import QMBase, format_columns
 
 
 class QChem(QMBase):
@@ -12,6 +12,9 @@ class QChem(QMBase):
     OUTPUT = None
     default_options = default_options
 
+    # The working directory is also the scratch directory
+    FILES = ("qchem.inp", "qchem.out", "qchem_run.log", "save")
+
     def gen_input(self):
         """Generate input file for QM software."""
 
@@ -31,13 +34,13 @@ class QChem(QMBase):
 
             f.write("$external_charges\n")
             if self.mm_charges is not None:
-                for x, y, z, c in zip(
+                f.write(format_columns(
+                    "%21.14e %21.14e %21.14e %21.14e\n",
                     self.mm_positions[0],
                     self.mm_positions[1],
                     self.mm_positions[2],
                     self.mm_charges,
-                ):
-                    f.write(f"{x:21.14e} {y:21.14e} {z:21.14e} {c:21.14e}\n")
+                ))
             f.write("$end" + "\n")
 
     def gen_cmdline(self):
@@ -11,11 +11,70 @@ from ..utils.elements import get_element_symbols
 from ..utils.sys import run_cmdline, get_nproc
 
 
+def format_columns(fmt, *columns):
+    """Format the rows of `columns` with the line format `fmt` (%-style) in a single call."""
+
+    values = np.column_stack([np.asarray(c, dtype=float) for c in columns]).ravel().tolist()
+
+    return (fmt * (len(values) // len(columns))) % tuple(values)
+
+
+def find_sections(output, markers):
+    """Return the index of the first line of `output` containing each of `markers` (name: text) in a single pass."""
+
+    sections = {}
+    remaining = dict(markers)
+
+    for i, line in enumerate(output):
+        for name, text in remaining.items():
+            if text in line:
+                sections[name] = i
+        if len(sections) == len(markers):
+            break
+        remaining = {name: text for name, text in remaining.items() if name not in sections}
+
+    return sections
+
+
+def get_section(output, sections, name, n_rows, skip=1):
+    """Return the `n_rows` lines of section `name` of `output`, after its first `skip` lines.
+
+    A section that ends, with the output or a blank line, before `n_rows` raises a ValueError.
+    """
+
+    i = sections[name] + skip
+    lines = output[i:(i + n_rows)]
+
+    n_found = next((k for k, line in enumerate(lines) if not line.strip()), len(lines))
+    if n_found < n_rows:
+        raise ValueError(f"The section '{name}' of the output is truncated: {n_found} of {n_rows} rows.")
+
+    return lines
+
+
+def decode_fixed_width(lines, columns):
+    """Decode the fixed-width `columns` (pairs of start and stop) of `lines` as floats."""
+
+    chars = np.array(lines, dtype=f"S{max(stop for _, stop in columns)}")
+    chars = chars.view("S1").reshape(len(lines), -1)
+
+    return np.array([
+        np.ascontiguousarray(chars[:, start:stop]).view(f"S{stop - start}").ravel().astype(float)
+        for start, stop in columns
+    ])
+
+
 class QMBase(object):
 
     OUTPUT = None
     default_options = None
 
+    # Files written or read in `cwd` during a calculation
+    FILES = ()
+
+    # Markers (name: text) of the sections of OUTPUT, located once per calculation
+    SECTIONS = {}
+
     def __init__(
         self,
         qm_positions,
@@ -71,6 +130,8 @@ class QMBase(object):
             dependencies=[
                 self.qm_positions,
                 self.qm_elements,
+                self.qm_element_symbols,
+                self.qm_element_ids,
                 self.mm_positions,
                 self.mm_charges,
             ]
@@ -101,8 +162,9 @@ class QMBase(object):
         )
 
     def _get_qm_cache(self, *args, output=None):
-        self.gen_input()
-        run_cmdline(self.cmdline)
+        """Run QM calculation and return the lines of OUTPUT with the line index of each of SECTIONS found in it."""
+
+        self.run_qm()
         if output is not None:
             output_path = Path(self.cwd).joinpath(output)
             try:
@@ -111,7 +173,26 @@ class QMBase(object):
                 raise
             else:
                 os.remove(output_path)
-        return output or []
+            return output, find_sections(output, self.SECTIONS)
+        return []
+
+    def _get_output(self, output=None):
+        """Get the lines of the output of QM calculation."""
+
+        try:
+            return Path(output or Path(self.cwd).joinpath(self.OUTPUT)).read_text().split("\n")
+        except OSError:
+            raise ValueError("Can not open output.")
+
+    def _get_sections(self, qm_cache=None, output=None):
+        """Get the lines of the output and the line index of each of SECTIONS found in it."""
+
+        if qm_cache is not None:
+            output, sections = qm_cache
+            return output, sections
+
+        output = self._get_output(output=output)
+        return output, find_sections(output, self.SECTIONS)
 
     def update_options(self, options=None):
         if options is not None:
@@ -123,6 +204,12 @@ class QMBase(object):
 
         invalidate_cache(self._qm_cache)
 
+    def run_qm(self):
+        """Run QM calculation."""
+
+        self.gen_input()
+        run_cmdline(self.cmdline)
+
     def gen_input(self):
         """Generate input file for QM software."""
 
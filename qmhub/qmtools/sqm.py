@@ -3,7 +3,7 @@ import numpy as np
 
 from ..units import AMBER_HARTREE_TO_KCAL, AMBER_BOHR_TO_A
 from .templates.sqm import get_qm_template, default_options
-from .qmbase import QMBase
+from .qmbase import QMBase, format_columns, decode_fixed_width, get_section
 
 
 class SQM(QMBase):
@@ -11,6 +11,15 @@ class SQM(QMBase):
     OUTPUT = "sqm.out"
     default_options = default_options
 
+    FILES = ("sqm.inp", "sqm.out")
+
+    SECTIONS = {
+        "energy": "QMMM: SCF Energy",
+        "gradient": "Forces on QM atoms from SCF calculation",
+        "mm_esp": "Electrostatic potential and field on MM atoms from QM Atoms",
+        "mulliken": "Atomic Charges",
+    }
+
     def gen_input(self):
         """Generate input file for QM software."""
 
@@ -34,13 +43,13 @@ class SQM(QMBase):
 
             if self.mm_charges is not None:
                 f.write("#EXCHARGES\n")
-                for x, y, z, c in zip(
+                f.write(format_columns(
+                    "  1  H %21.14e %21.14e %21.14e %21.14e\n",
                     self.mm_positions[0],
                     self.mm_positions[1],
                     self.mm_positions[2],
                     self.mm_charges,
-                ):
-                    f.write(f"  1  H {x:21.14e} {y:21.14e} {z:21.14e} {c:21.14e}\n")
+                ))
                 f.write("#END\n")
 
     def gen_cmdline(self):
@@ -54,92 +63,41 @@ class SQM(QMBase):
     def _get_qm_energy(self, qm_cache=None, output=None):
         """Get QM energy from output of QM calculation."""
 
-        if qm_cache is not None:
-            output = qm_cache
-        else:
-            try:
-                output = Path(output).read_text().split("\n")
-            except:
-                output = Path(self.cwd).joinpath(self.OUTPUT).read_text().split("\n")
-            else:
-                raise ValueError("Can not open output.")
+        output, sections = self._get_sections(qm_cache, output)
 
-        for line in output:
-            if "QMMM: SCF Energy" in line:
-                return float(line.split()[4]) / AMBER_HARTREE_TO_KCAL
+        if "energy" in sections:
+            return float(output[sections["energy"]].split()[4]) / AMBER_HARTREE_TO_KCAL
 
     def _get_qm_energy_gradient(self, qm_cache=None, output=None):
         """Get QM energy gradient from output of QM calculation."""
 
-        if qm_cache is not None:
-            output = qm_cache
-        else:
-            try:
-                output = Path(output).read_text().split("\n")
-            except:
-                output = Path(self.cwd).joinpath(self.OUTPUT).read_text().split("\n")
-            else:
-                raise ValueError("Can not open output.")
-
-        for i in range(len(output)):
-            if "Forces on QM atoms from SCF calculation" in output[i]:
-                gradient = np.empty((3, len(self.qm_elements)), dtype=float)
-                for j in range(len(self.qm_elements)):
-                    line = output[i + j + 1]
-                    gradient[0, j] = float(line[18:38])
-                    gradient[1, j] = float(line[38:58])
-                    gradient[2, j] = float(line[58:78])
-                return gradient / (AMBER_HARTREE_TO_KCAL / AMBER_BOHR_TO_A)
+        output, sections = self._get_sections(qm_cache, output)
+
+        if "gradient" in sections:
+            lines = get_section(output, sections, "gradient", len(self.qm_elements))
+            gradient = decode_fixed_width(lines, [(18, 38), (38, 58), (58, 78)])
+            return gradient / (AMBER_HARTREE_TO_KCAL / AMBER_BOHR_TO_A)
 
     def _get_mm_esp(self, qm_cache=None, output=None):
         """Get electrostatic potential at MM atoms in the near field from QM density."""
 
-        if qm_cache is not None:
-            output = qm_cache
-        else:
-            try:
-                output = Path(output).read_text().split("\n")
-            except:
-                output = Path(self.cwd).joinpath(self.OUTPUT).read_text().split("\n")
-            else:
-                raise ValueError("Can not open output.")
-
-        mm_esp = np.zeros((4, len(self.mm_charges)))
-
-        for i in range(len(output)):
-            if "Electrostatic potential and field on MM atoms from QM Atoms" in output[i]:
-                for j in range(len(self.mm_charges)):
-                    line = output[i + j + 1]
-                    mm_esp[0, j] = float(line[18:38])
-                    mm_esp[1, j] = -float(line[38:58])
-                    mm_esp[2, j] = -float(line[58:78])
-                    mm_esp[3, j] = -float(line[78:98])
-                break
-
-            if i == len(output) - 1:
-                raise ValueError("Can not find MM electrostatic potential and field.")
+        output, sections = self._get_sections(qm_cache, output)
+
+        if "mm_esp" not in sections:
+            raise ValueError("Can not find MM electrostatic potential and field.")
+
+        lines = get_section(output, sections, "mm_esp", len(self.mm_charges))
+        mm_esp = decode_fixed_width(lines, [(18, 38), (38, 58), (58, 78), (78, 98)])
 
         mm_esp[0] /= AMBER_HARTREE_TO_KCAL
-        mm_esp[1:] /= (AMBER_HARTREE_TO_KCAL / AMBER_BOHR_TO_A)
+        mm_esp[1:] /= -(AMBER_HARTREE_TO_KCAL / AMBER_BOHR_TO_A)
         return mm_esp
 
     def _get_mulliken_charges(self, qm_cache=None, output=None):
         """Get Mulliken charges from output of QM calculation."""
 
-        if qm_cache is not None:
-            output = qm_cache
-        else:
-            try:
-                output = Path(output).read_text().split("\n")
-            except:
-                output = Path(self.cwd).joinpath(self.OUTPUT).read_text().split("\n")
-            else:
-                raise ValueError("Can not open output.")
-
-        for i in range(len(output)):
-            if "Atomic Charges" in output[i]:
-                mulliken_charges = np.empty(len(self.qm_elements), dtype=float)
-                for j in range(len(self.qm_elements)):
-                    line = output[i + j + 2]
-                    mulliken_charges[j] = float(line.split()[-1])
-                return mulliken_charges
+        output, sections = self._get_sections(qm_cache, output)
+
+        if "mulliken" in sections:
+            lines = get_section(output, sections, "mulliken", len(self.qm_elements), skip=2)
+            return np.array([float(line.split()[-1]) for line in lines])
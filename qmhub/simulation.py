@@ -1,11 +1,16 @@
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
 
+from .engine import check_shared_files
 from .utils.darray import DependArray
+from .utils.dobject import set_max_workers, update_caches_concurrently
 
 
 class Simulation(object):
-    def __init__(self, protocol=None, engine_name=None, engine2_name=None, *, nrespa=None, scaling_factor=None):
+    def __init__(self, protocol=None, engine_name=None, engine2_name=None, *, nrespa=None, scaling_factor=None, max_workers=None):
 
         self.protocol = protocol or "md"
 
@@ -18,8 +23,17 @@ class Simulation(object):
         self.nrespa = nrespa or 1
         self.scaling_factor = scaling_factor
 
+        # Evaluate independent parts of the dependency graph in a thread pool
+        self.max_workers = max_workers
+        set_max_workers(self.max_workers)
+
         self.step = DependArray(np.array(0), name="step")
 
+        # Engine groups whose QM calculations are run concurrently when they are needed at the same step
+        self.engine_groups = {}
+        self._executor = None
+        self._finalizer = None
+
         self.energy = DependArray(
             name="energy",
             func=Simulation._get_energy,
@@ -27,8 +41,10 @@ class Simulation(object):
                 'protocol': self.protocol,
                 'nrespa': self.nrespa,
                 'scaling_factor': self.scaling_factor,
+                'update_engines': self._update_engines,
             },
             dependencies=[self.step],
+            lazy=True,
         )
 
         self.energy_gradient = DependArray(
@@ -38,11 +54,13 @@ class Simulation(object):
                 'protocol': self.protocol,
                 'nrespa': self.nrespa,
                 'scaling_factor': self.scaling_factor,
+                'update_engines': self._update_engines,
             },
             dependencies=[self.step],
+            lazy=True,
         )
 
-    def add_engine(self, name, engine):
+    def add_engine(self, name, engine, group=None):
         if name == self.engine2_name and not hasattr(self, self.engine_name):
             raise ValueError("Please add engine before adding engine2.")
 
@@ -51,39 +69,97 @@ class Simulation(object):
         else:
             raise ValueError(f"Please add {self.engine_name} or {self.engine2_name}.")
 
+        if group is not None:
+            self.engine_groups[name] = group
+
         self.energy.add_dependency(engine.energy)
         self.energy_gradient.add_dependency(engine.energy_gradient)
 
+    def _update_engines(self, engine=True, engine2=False):
+        """Run the QM calculations of the engine groups needed at this step concurrently."""
+
+        names = [name for name, active in [(self.engine_name, engine), (self.engine2_name, engine2)] if active]
+        qm_caches = [
+            obj._qm_cache
+            for name in names if name in self.engine_groups
+            for obj in self.engine_groups[name].engines.values()
+        ]
+
+        update_caches_concurrently(qm_caches, self._get_executor())
+
+    def _get_executor(self):
+        """Return the thread pool running the QM calculations of all engine groups, created at the first step."""
+
+        if self._executor is None:
+            engines = {
+                f"{group_name}.{name}": obj
+                for group_name, group in self.engine_groups.items()
+                for name, obj in group.engines.items()
+            }
+
+            # In MTS, the engine groups run at the same time too
+            check_shared_files(engines)
+
+            if len(engines) > 1:
+                self._executor = ThreadPoolExecutor(max_workers=len(engines), thread_name_prefix="qmhub-engine")
+                self._finalizer = weakref.finalize(self, self._executor.shutdown, wait=False)
+
+        return self._executor
+
+    def close(self):
+        """Shut down the thread pool running the QM calculations."""
+
+        if self._finalizer is not None:
+            self._finalizer()
+            self._finalizer = None
+        self._executor = None
+
     @staticmethod
-    def _get_energy(step, energy, energy2=None, protocol=None, nrespa=None, scaling_factor=None):
-        if scaling_factor is not None:
-            energy = energy * scaling_factor
+    def _get_active_engines(step, protocol=None, nrespa=None):
+        """Return whether engine and engine2 are needed at `step`."""
+
         if protocol.lower() == "md":
-            return energy
+            return True, False
         elif protocol.lower() == "mts":
             if (step < nrespa):
-                return energy
+                return True, False
             elif ((step + 1) % nrespa) == 0:
-                return energy
+                return True, True
             else:
-                return 0.
+                return False, True
         else:
             raise ValueError("Only 'md' and 'mts' are supported.")
 
     @staticmethod
-    def _get_energy_gradient(step, gradient, gradient2=None, protocol=None, nrespa=None, scaling_factor=None):
+    def _get_energy(step, energy, energy2=None, protocol=None, nrespa=None, scaling_factor=None, update_engines=None):
+        # Only the values needed at this step are touched, so that on the inner MTS steps
+        # the expensive engine group is neither evaluated nor kept up to date.
+        active, active2 = Simulation._get_active_engines(step, protocol, nrespa)
+
+        if update_engines is not None:
+            update_engines(active, active2)
+
+        if not active:
+            return 0.
+
+        if scaling_factor is not None:
+            energy = energy * scaling_factor
+
+        return energy
+
+    @staticmethod
+    def _get_energy_gradient(step, gradient, gradient2=None, protocol=None, nrespa=None, scaling_factor=None, update_engines=None):
+        active, active2 = Simulation._get_active_engines(step, protocol, nrespa)
+
+        if update_engines is not None:
+            update_engines(active, active2)
+
+        if active and active2:
+            gradient = gradient2 + nrespa * (gradient - gradient2)
+        elif active2:
+            gradient = gradient2
+
         if scaling_factor is not None:
             gradient = gradient * scaling_factor
-            if gradient2 is not None:
-                gradient2 = gradient2 * scaling_factor
-        if protocol.lower() == "md":
-            return gradient
-        elif protocol.lower() == "mts":
-            if (step < nrespa):
-                return gradient
-            elif ((step + 1) % nrespa) == 0:
-                return gradient2 + nrespa * (gradient - gradient2)
-            else:
-                return gradient2
-        else:
-            raise ValueError("Only 'md' and 'mts' are supported.")
+
+        return gradient
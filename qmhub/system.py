@@ -1,15 +1,16 @@
 import numpy as np
 
 from .utils.darray import DependArray
+from .utils.pbc import get_min_image
 from .atoms import Atoms
 
 
 class System(object):
-    def __init__(self, n_atoms, n_qm_atoms, qm_charge, qm_mult):
+    def __init__(self, n_atoms, n_qm_atoms, qm_charge, qm_mult, atoms=None):
         self.qm_index = np.s_[:n_qm_atoms]
         self.mm_index = np.s_[n_qm_atoms:]
 
-        self.atoms = Atoms.new(n_atoms)
+        self.atoms = atoms if atoms is not None else Atoms.new(n_atoms)
 
         self.qm = System.__new__(System)
         self.qm.atoms = self.atoms[self.qm_index]
@@ -28,6 +29,7 @@ class System(object):
         self.qm_mult = qm_mult
 
     def wrap_positions(self):
-        self.atoms.positions -= self.qm.atoms.positions.mean(axis=1, keepdims=True)
+        positions = np.asarray(self.atoms.positions) - np.asarray(self.qm.atoms.positions).mean(axis=1, keepdims=True)
         if not np.all(self.cell_basis == 0):
-            self.atoms.positions -= np.around(self.atoms.positions / np.diagonal(self.cell_basis)[:, np.newaxis]) * np.diagonal(self.cell_basis)[:, np.newaxis]
+            positions = get_min_image(positions, self.cell_basis)
+        self.atoms.positions[:] = positions
@@ -0,0 +1,41 @@
+import numpy as np
+
+from qmhub.utils.buffer import Buffer
+from qmhub.utils.darray import DependArray
+
+
+def test_buffer():
+    buffer = Buffer()
+
+    a = buffer.get((3, 4))
+    assert a.flags.c_contiguous and buffer.n_allocations == 1
+
+    # Smaller and slightly larger shapes reuse the allocation
+    b = buffer.get((3, 5))
+    assert np.shares_memory(a, b) and buffer.n_allocations == 1
+
+    buffer.get((3, 10))
+    assert buffer.n_allocations == 2
+
+
+def test_buffer_node():
+    """Nodes downstream of a node writing into a buffer are computed again when only its contents change."""
+
+    positions = DependArray(np.arange(6.).reshape(3, 2))
+    doubled = DependArray(
+        name="doubled",
+        func=lambda x, buffer: np.multiply(x, 2., out=buffer.get(x.shape)),
+        kwargs={'buffer': Buffer()},
+        dependencies=[positions],
+    )
+    total = DependArray(name="total", func=lambda x: x.sum(), dependencies=[doubled])
+
+    assert total == 30.
+    value = np.asarray(doubled)
+
+    positions[:] = positions + 1.
+    assert total == 42.
+
+    # The same memory holds the new value
+    assert np.shares_memory(value, np.asarray(doubled))
+    np.testing.assert_array_equal(value, np.arange(2., 14., 2.).reshape(3, 2))
@@ -0,0 +1,22 @@
+"""
+Tests for the distance helpers.
+"""
+
+import numpy as np
+
+from qmhub.electools.distance import get_mm2_pairs
+
+
+def test_mm2_pairs():
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(0., 10., size=(3, 300))
+    mm1_index = np.array([40, 7, 120])
+    neighbor_index = np.arange(300)
+
+    pairs = get_mm2_pairs(positions, mm1_index, neighbor_index, n_qm=5)
+
+    d = np.linalg.norm(positions[:, mm1_index, np.newaxis] - positions[:, np.newaxis, 5:], axis=0)
+    i, j = np.nonzero((d < 1.8) & (d > 0.))
+    np.testing.assert_array_equal(pairs, [i, j + 5])
+
+    assert get_mm2_pairs(positions, np.array([], dtype=int), neighbor_index, n_qm=5).shape == (2, 0)
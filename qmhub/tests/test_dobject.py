@@ -0,0 +1,277 @@
+"""
+Tests for the evaluation of the dependency graph.
+"""
+
+import configparser
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from qmhub.__main__ import get_simulation_options
+from qmhub.simulation import Simulation
+from qmhub.utils import dobject
+from qmhub.utils.darray import DependArray
+from qmhub.utils.dobject import get_topological_order, set_max_workers, update_caches, update_caches_concurrently
+
+
+@pytest.fixture(params=[None, 4], ids=["sequential", "parallel"])
+def max_workers(request):
+    set_max_workers(request.param)
+    yield request.param
+    set_max_workers(None)
+
+
+class Recorder(object):
+    """Record the evaluations of the nodes, and how many of them are running."""
+
+    def __init__(self):
+        self.evaluated = []
+        self.running = 0
+        self._lock = threading.Lock()
+
+    def wrap(self, name, func):
+        def wrapper(*args):
+            with self._lock:
+                self.running += 1
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.evaluated.append(name)
+        return wrapper
+
+
+def test_diamond(max_workers):
+    recorder = Recorder()
+
+    a = DependArray(np.array(1.))
+    b = DependArray(name="b", func=recorder.wrap("b", lambda x: x + 1), dependencies=[a])
+    c = DependArray(name="c", func=recorder.wrap("c", lambda x: x * 2), dependencies=[a])
+    d = DependArray(name="d", func=recorder.wrap("d", lambda x, y: x * y), dependencies=[b, c])
+
+    assert d == 4.
+    assert sorted(recorder.evaluated[:2]) == ["b", "c"] and recorder.evaluated[2:] == ["d"]
+
+    # Only the outdated branch and what depends on it are evaluated again
+    a[()] = 2.
+    assert d == 12.
+    assert len(recorder.evaluated) == 6
+
+    recorder.evaluated.clear()
+    a[()] = 2.
+    assert d == 12.
+    assert recorder.evaluated == []
+
+
+def test_version():
+    recorder = Recorder()
+
+    a = DependArray(np.array([1., 2.]))
+    b = DependArray(name="b", func=recorder.wrap("b", lambda x: x.sum()), dependencies=[a])
+    assert b == 3.
+
+    # Setting equal values neither bumps the version nor outdates the dependants
+    a[:] = [1., 2.]
+    assert a._version == 0 and b._cache_valid
+
+    a[:] = [2., 1.]
+    assert a._version == 1 and not b._cache_valid
+    assert b == 3.
+
+    # b has the same value, so it keeps its version
+    assert b._version == 1
+    assert recorder.evaluated == ["b", "b"]
+
+
+def test_version_short_circuit(max_workers):
+    """A node whose dependencies re-evaluate to the same values is not evaluated again."""
+
+    recorder = Recorder()
+
+    a = DependArray(np.array([1., 2.]))
+    b = DependArray(name="b", func=recorder.wrap("b", lambda x: x.sum()), dependencies=[a])
+    c = DependArray(name="c", func=recorder.wrap("c", lambda x: x * 2), dependencies=[b])
+    assert c == 6.
+
+    a[:] = [2., 1.]
+    assert c == 6.
+    assert recorder.evaluated == ["b", "c", "b"]
+    assert c._version == 1
+
+    a[:] = [2., 2.]
+    assert c == 8.
+    assert recorder.evaluated == ["b", "c", "b", "b", "c"]
+    assert b._version == 2 and c._version == 2
+
+
+def test_view_of_func(max_workers):
+    """A view of a node with a function follows its new values."""
+
+    recorder = Recorder()
+
+    a = DependArray(np.arange(4.))
+    b = DependArray(name="b", func=lambda x: x * 2, dependencies=[a])
+    view = DependArray.from_darray(b, np.s_[1:3])
+    c = DependArray(name="c", func=recorder.wrap("c", lambda x: x + 1), dependencies=[view])
+    np.testing.assert_array_equal(c, [3., 5.])
+
+    a[:] = a + 1
+    np.testing.assert_array_equal(view, [4., 6.])
+    np.testing.assert_array_equal(c, [5., 7.])
+    assert view._version == 2
+
+    # Outside of the view
+    a[0] = 10.
+    np.testing.assert_array_equal(c, [5., 7.])
+    assert view._version == 2
+    assert recorder.evaluated == ["c", "c"]
+
+
+def test_lazy(max_workers):
+    recorder = Recorder()
+    threads = []
+
+    def get_lazy(x):
+        threads.append(threading.current_thread())
+        assert recorder.running == 1
+        return x + 1
+
+    a = DependArray(np.array(1.))
+    b = DependArray(name="b", func=recorder.wrap("b", lambda x: x + 1), dependencies=[a])
+    lazy = DependArray(name="lazy", func=recorder.wrap("lazy", get_lazy), dependencies=[b], lazy=True)
+    c = DependArray(name="c", func=recorder.wrap("c", lambda x: x * 2), dependencies=[a])
+    d = DependArray(name="d", func=recorder.wrap("d", lambda x, y: x + y), dependencies=[lazy, c])
+
+    assert d == 5.
+
+    # The lazy node pulls its dependency itself, in the scheduling thread and alone
+    assert recorder.evaluated.index("b") < recorder.evaluated.index("lazy") < recorder.evaluated.index("d")
+    assert threads == [threading.main_thread()]
+
+    a[()] = 2.
+    assert d == 8.
+
+
+def test_lazy_invalidation(max_workers):
+    a = DependArray(np.array(1.))
+    b = DependArray(name="b", func=lambda x: x + 1, dependencies=[a])
+    lazy = DependArray(name="lazy", func=lambda x: x * 2, dependencies=[b], lazy=True)
+    c = DependArray(name="c", func=lambda x: x + 1, dependencies=[lazy])
+
+    # The dependencies of the lazy node are left to its function
+    assert get_topological_order(c) == [lazy, c]
+    assert c == 5.
+
+    # A change behind the lazy node still outdates what depends on it
+    a[()] = 2.
+    assert not b._cache_valid and not lazy._cache_valid and not c._cache_valid
+    assert c == 7.
+
+
+def test_topological_order():
+    a = DependArray(np.array(1.))
+    b = DependArray(name="b", func=lambda *args: sum(args), dependencies=[a])
+
+    order = get_topological_order(b)
+    assert order == [a, b]
+    assert get_topological_order(b) is order
+
+    # A new edge outdates the cached order
+    c = DependArray(np.array(2.))
+    b.add_dependency(c)
+    assert get_topological_order(b) == [a, c, b]
+    assert b == 3.
+
+
+def test_raise(max_workers):
+    fail = [True]
+
+    def get_b(x):
+        if fail[0]:
+            raise ValueError("b failed")
+        return x + 1
+
+    a = DependArray(np.array(1.))
+    b = DependArray(name="b", func=get_b, dependencies=[a])
+    c = DependArray(name="c", func=lambda x: x * 2, dependencies=[a])
+    d = DependArray(name="d", func=lambda x, y: x + y, dependencies=[b, c])
+
+    with pytest.raises(ValueError, match="b failed"):
+        np.asarray(d)
+
+    # The failed node and its dependants stay outdated
+    assert not b._cache_valid and not d._cache_valid
+
+    fail[0] = False
+    assert d == 4.
+
+
+def test_concurrently(max_workers):
+    """Nodes run concurrently may pull nodes they do not depend on while the caller waits for them."""
+
+    barrier = threading.Barrier(2, timeout=10)
+
+    a = DependArray(np.array(1.))
+    hidden = DependArray(name="hidden", func=lambda x: x + 1, dependencies=[a])
+
+    def get_member(x):
+        barrier.wait()
+        return x + np.asarray(hidden)
+
+    members = [DependArray(name=f"member{i}", func=get_member, dependencies=[a]) for i in range(2)]
+
+    executor = ThreadPoolExecutor(max_workers=2)
+
+    def get_sum(*args):
+        update_caches_concurrently(members, executor)
+        return sum(args)
+
+    total = DependArray(name="total", func=get_sum, dependencies=members, lazy=True)
+
+    # In another thread, so that a deadlock fails the test
+    result = []
+    thread = threading.Thread(target=lambda: result.append(np.asarray(total).item()), daemon=True)
+    thread.start()
+    thread.join(timeout=20)
+    executor.shutdown(wait=False)
+
+    assert not thread.is_alive()
+    assert result == [6.]
+
+
+def test_update_caches_shared(max_workers):
+    """Nodes shared by several threads are evaluated once."""
+
+    recorder = Recorder()
+
+    a = DependArray(np.array(1.))
+    b = DependArray(name="b", func=recorder.wrap("b", lambda x: x + 1), dependencies=[a])
+    members = [DependArray(name=f"member{i}", func=(lambda x: x * 2), dependencies=[b]) for i in range(4)]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda item: update_caches([item]), members))
+
+    assert recorder.evaluated == ["b"]
+    assert [np.asarray(m).item() for m in members] == [4.] * 4
+
+
+def test_simulation_options():
+    config = configparser.ConfigParser(allow_no_value=True)
+    config.read_string("[simulation]\nprotocol = mts\nnrespa = 4\nmax_workers = 2\n")
+
+    options = get_simulation_options(config)
+    assert options == {'protocol': 'mts', 'nrespa': 4, 'scaling_factor': None, 'max_workers': 2}
+
+    simulation = Simulation(**options)
+    try:
+        assert dobject._executor is not None and dobject._executor._max_workers == 2
+        assert simulation.engine2_name == "engine2"
+    finally:
+        set_max_workers(None)
+
+    config = configparser.ConfigParser(allow_no_value=True)
+    Simulation(**get_simulation_options(config))
+    assert dobject._executor is None
@@ -0,0 +1,37 @@
+"""
+Tests for the pseudo-inverse solver node.
+"""
+
+import numpy as np
+import pytest
+
+from qmhub.utils.darray import DependArray
+from qmhub.utils.dsolver import DependSolver
+
+
+@pytest.mark.parametrize("shape", [(5, 40), (8, 3), (5, 0)])
+def test_solve(shape):
+    rng = np.random.default_rng(0)
+    matrix = DependArray(rng.normal(size=shape))
+    solver = DependSolver(matrix)
+
+    for _ in range(2):
+        pinv = np.linalg.pinv(matrix, rcond=1e-8)
+        b = rng.normal(size=shape[0])
+        c = rng.normal(size=shape[1])
+
+        np.testing.assert_allclose(solver.solve(b), pinv @ b, atol=1e-12)
+        np.testing.assert_allclose(solver.solve_T(c), c @ pinv, atol=1e-12)
+        np.testing.assert_allclose(solver.solve(np.eye(shape[0])), pinv, atol=1e-12)
+
+        matrix[:] = rng.normal(size=shape)
+
+
+def test_rank_deficient():
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(4, 30))
+    matrix[3] = 2 * matrix[2]
+    solver = DependSolver(DependArray(matrix))
+
+    b = rng.normal(size=4)
+    np.testing.assert_allclose(solver.solve(b), np.linalg.pinv(matrix, rcond=1e-8) @ b, atol=1e-12)
@@ -0,0 +1,51 @@
+"""
+Tests for the MM1 atoms, MM2 atoms and Coulomb exclusions of the electrostatics.
+"""
+
+import numpy as np
+
+from qmhub.electools.distance import get_dij_inverse, get_dij_min
+from qmhub.electools.elec import Elec
+from qmhub.utils.darray import DependArray
+
+
+def test_short_range():
+    rng = np.random.default_rng(0)
+
+    qm_positions = np.array([[0., .96, -.24], [0., 0., .93], [0., 0., 0.]])
+
+    # Atoms around the cutoffs of the MM1 atoms (.8), the short range (2.) and the MM2 atoms (1.8 from MM1)
+    distances = np.array([.5, .79, .81, 1.5, 1.99, 2.01, 5.])
+    directions = rng.normal(size=(3, len(distances)))
+    near = qm_positions[:, [0]] + directions / np.linalg.norm(directions, axis=0) * distances
+    mm1_neighbors = near[:, [1]] + np.array([[1.7, 0., 0.], [0., 1.9, 0.]]).T
+    far = rng.uniform(-10., 10., size=(3, 200))
+
+    positions = DependArray(np.concatenate((qm_positions, near, mm1_neighbors, far), axis=1))
+    elec = Elec(
+        DependArray.from_darray(positions, np.s_[:, :3]),
+        positions,
+        DependArray(np.zeros(3)),
+        DependArray(rng.normal(size=positions.shape[1])),
+        0,
+        DependArray(np.zeros((3, 3))),
+        switching_type="lrec",
+        cutoff=8.,
+    )
+
+    for _ in range(2):
+        # Brute force over all atoms
+        dij = np.linalg.norm(np.asarray(positions)[:, np.newaxis, :] - np.asarray(positions)[:, :3, np.newaxis], axis=0)
+        dij_min = get_dij_min(get_dij_inverse(dij))
+        mm1_index = np.nonzero((dij_min > 0.) & (dij_min < .8))[0]
+
+        np.testing.assert_array_equal(np.sort(elec.coulomb_exclusion), np.nonzero(dij.min(axis=0) < .8)[0])
+        np.testing.assert_array_equal(np.sort(elec.mm1_index), mm1_index)
+
+        mm1_positions = np.asarray(positions)[:, np.asarray(elec.mm1_index)]
+        dkl = np.linalg.norm(np.asarray(positions)[:, np.newaxis, 3:] - mm1_positions[:, :, np.newaxis], axis=0)
+        mm2_pairs = np.nonzero((dkl < 1.8) & (dkl > 0.))
+        np.testing.assert_array_equal(elec.mm2_index, mm2_pairs[1] + 3)
+        np.testing.assert_array_equal(elec.mm2_indptr, np.concatenate(([0], np.cumsum(np.bincount(mm2_pairs[0], minlength=len(mm1_positions.T))))))
+
+        positions[:, 3:] = positions[:, 3:] + rng.normal(scale=.05, size=(3, positions.shape[1] - 3))
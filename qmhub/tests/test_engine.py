@@ -0,0 +1,89 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from qmhub.engine import Engine
+from qmhub.units import AMBER_HARTREE_TO_KCAL
+from qmhub.utils.darray import DependArray
+
+
+@pytest.fixture
+def engine():
+    rng = np.random.default_rng(0)
+
+    return Engine(
+        DependArray(rng.normal(size=(3, 3))),
+        DependArray(np.array([8, 1, 1])),
+        DependArray(rng.normal(size=(3, 10))),
+        DependArray(rng.normal(size=10)),
+        charge=0,
+    )
+
+
+def test_shared_files(engine, tmp_path):
+    engine.add_engine("sqm", name="sqm", cwd=tmp_path)
+    engine.add_engine("dummy", name="dummy", cwd=tmp_path)
+
+    with pytest.raises(ValueError, match="sqm.inp"):
+        engine.add_engine("sqm", name="sqm2", cwd=tmp_path)
+
+    (tmp_path / "sqm2").mkdir()
+    engine.add_engine("sqm", name="sqm2", cwd=tmp_path / "sqm2")
+
+    assert list(engine.engines) == ["sqm", "dummy", "sqm2"]
+
+
+SQM_STUB = """#!/bin/sh
+cp {output} sqm.out
+"""
+
+
+@pytest.fixture
+def sqm_stub(tmp_path, monkeypatch):
+    """A `sqm` command that writes a fixed output, as for 3 QM atoms and 10 MM atoms."""
+
+    lines = ["", " QMMM: SCF Energy =      -12.34567890 KCal/mol", "", "QMMM: Forces on QM atoms from SCF calculation"]
+    lines += [f"{'QMMM: ' + str(i + 1):18}" + "".join(f"{x:20.12f}" for x in g) for i, g in enumerate(np.ones((3, 3)))]
+    lines += ["", "QMMM: Electrostatic potential and field on MM atoms from QM Atoms"]
+    lines += [f"{'QMMM: ' + str(i + 1):18}" + "".join(f"{x:20.12f}" for x in e) for i, e in enumerate(np.ones((10, 4)))]
+
+    output = tmp_path / "sqm.ref"
+    output.write_text("\n".join(lines + [""]))
+
+    bin = tmp_path / "bin"
+    bin.mkdir()
+    (bin / "sqm").write_text(SQM_STUB.format(output=output))
+    (bin / "sqm").chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin}{os.pathsep}{os.environ['PATH']}")
+
+    return -12.3456789 / AMBER_HARTREE_TO_KCAL
+
+
+def run_in_thread(func, timeout=20):
+    """Return the result of `func`, failing instead of hanging if it does not finish in time."""
+
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func()), daemon=True)
+    thread.start()
+    thread.join(timeout=timeout)
+
+    assert not thread.is_alive(), "Timed out"
+    assert result, "Raised"
+
+    return result[0]
+
+
+def test_group(engine, tmp_path, sqm_stub):
+    (tmp_path / "sqm").mkdir()
+    engine.add_engine("sqm", name="sqm", cwd=tmp_path / "sqm")
+    engine.add_engine("dummy", name="dummy", cwd=tmp_path)
+
+    for _ in range(2):
+        qm_energy = run_in_thread(lambda: np.asarray(engine.qm_energy).item())
+        assert qm_energy == pytest.approx(sqm_stub)
+        assert np.asarray(engine.qm_energy_gradient).shape == (3, 3)
+        assert np.asarray(engine.mm_esp).shape == (4, 10)
+
+        engine.qm_positions[:] = engine.qm_positions + .1
@@ -0,0 +1,84 @@
+"""
+Tests for the pure-NumPy Ewald summation.
+"""
+
+import numpy as np
+import pytest
+
+from qmhub.electools.ewald import Ewald, EwaldQMQM
+from qmhub.utils.darray import DependArray
+
+
+@pytest.mark.parametrize("cell_basis", [
+    np.diag([20., 22., 25.]),
+    np.array([[20., 5., 3.], [0., 19., -4.], [0., 0., 21.]]),
+])
+def test_recip_tensor(cell_basis):
+    rng = np.random.default_rng(0)
+    ri = cell_basis @ rng.uniform(size=(3, 4))
+    rj = cell_basis @ rng.uniform(size=(3, 50))
+
+    alpha = Ewald._get_alpha(cell_basis)
+    recip_basis = Ewald._get_recip_basis(cell_basis)
+    kmax = Ewald._get_kmax(Ewald._get_threshold(1e-6), alpha, recip_basis)
+    lattice = Ewald._get_lattice(recip_basis, Ewald._get_vectors(kmax, 'recip'), kmax, 'spherical')
+
+    tensor = Ewald._get_ewald_recip_tensor(ri, rj, lattice, cell_basis, alpha)
+
+    # Direct sum over all k vectors
+    rij = rj[:, np.newaxis, :] - ri[:, :, np.newaxis]
+    k2 = (lattice**2).sum(axis=0)
+    prefac = 4 * np.pi / np.linalg.det(cell_basis) * np.exp(-k2 / (4 * alpha**2)) / k2
+    kr = rij.T @ lattice
+    esp = (np.cos(kr) @ prefac).T - np.pi / np.linalg.det(cell_basis) / alpha**2
+    field = (np.sin(kr) @ (prefac * lattice).T).T
+
+    np.testing.assert_allclose(tensor[0], esp, atol=1e-12)
+    np.testing.assert_allclose(tensor[1:], field, atol=1e-12)
+
+
+@pytest.mark.parametrize("cell_basis", [
+    np.diag([30., 32., 35.]),
+    np.array([[30., 8., 5.], [0., 29., -6.], [0., 0., 31.]]),
+])
+def test_qmqm(cell_basis):
+    rng = np.random.default_rng(0)
+    qm_positions = DependArray(rng.normal(scale=3., size=(3, 20)))
+    charges = DependArray(rng.normal(scale=.3, size=20))
+    cell_basis = DependArray(cell_basis)
+
+    ewald = Ewald(qm_positions, qm_positions, charges, cell_basis, exclusion=np.arange(20))
+    qmqm = EwaldQMQM(qm_positions, charges, cell_basis)
+
+    np.testing.assert_allclose(qmqm.qm_total_esp, ewald.qm_total_esp, atol=1e-5)
+
+    # The reciprocal-space table is kept while the cell does not change
+    version = qmqm.recip_table._version
+    qm_positions[:] = qm_positions + .1
+    np.testing.assert_allclose(qmqm.qm_total_esp, ewald.qm_total_esp, atol=1e-5)
+    assert qmqm.recip_table._version == version
+
+
+def test_qmqm_gradient():
+    """The field is the gradient of the interpolated potential, so the energy and forces agree."""
+
+    rng = np.random.default_rng(0)
+    qm_positions = DependArray(rng.normal(scale=3., size=(3, 10)))
+    charges = DependArray(rng.normal(scale=.3, size=10))
+    qmqm = EwaldQMQM(qm_positions, charges, DependArray(np.array([[30., 8., 5.], [0., 29., -6.], [0., 0., 31.]])))
+
+    positions = np.array(qm_positions)
+    gradient = np.asarray(qmqm.qm_total_esp)[1:] * charges
+
+    def get_energy(displacement):
+        qm_positions[:] = positions + displacement
+        return .5 * charges @ np.asarray(qmqm.qm_total_esp)[0]
+
+    h = 1e-5
+    fd_gradient = np.zeros_like(positions)
+    for index in np.ndindex(*positions.shape):
+        displacement = np.zeros_like(positions)
+        displacement[index] = h
+        fd_gradient[index] = (get_energy(displacement) - get_energy(-displacement)) / (2 * h)
+
+    np.testing.assert_allclose(fd_gradient, gradient, atol=1e-9)
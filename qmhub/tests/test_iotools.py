@@ -0,0 +1,157 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from qmhub.iotools import IO
+from qmhub.utils.darray import DependArray
+from qmhub.iotools.shm import IOShm, HEADER_SIZE
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="requires FIFOs")
+def test_shm(tmp_path):
+    n_atoms, n_qm_atoms = 5, 2
+    rng = np.random.default_rng(0)
+
+    layout, size = IOShm.get_layout(n_atoms, n_qm_atoms)
+    input = tmp_path / "qmhub.shm"
+    with open(input, "wb") as f:
+        f.truncate(size)
+    buffer = np.memmap(input, dtype="u1", mode="r+")
+
+    def view(name):
+        dtype, shape, offset = layout[name]
+        return np.frombuffer(buffer, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+
+    np.frombuffer(buffer, dtype="i4", count=HEADER_SIZE)[:5] = [n_atoms, n_qm_atoms, 0, 1, 0]
+    view('charges')[:] = rng.random(n_atoms)
+    view('elements')[:] = [8, 1]
+
+    os.mkfifo(tmp_path / "qmhub.shm.req")
+
+    io = IO.create("shm", str(tmp_path))
+
+    steps = [rng.random((3, n_atoms)) for _ in range(3)]
+    results = []
+
+    def driver():
+        with open(tmp_path / "qmhub.shm.req", "wb", buffering=0) as req:
+            ack = None
+            for i, positions in enumerate(steps):
+                np.frombuffer(buffer, dtype="i4", count=HEADER_SIZE)[5] = i
+                view('positions')[:] = positions
+                req.write(b"\0")
+                if ack is None:
+                    ack = open(tmp_path / "qmhub.shm.ack", "rb", buffering=0)
+                assert ack.read(1) == b"\0"
+                results.append((view('energy').copy(), view('forces').copy()))
+            ack.close()
+
+    thread = threading.Thread(target=driver, daemon=True)
+    thread.start()
+
+    system = io.load_system(input)
+
+    energy = DependArray(name="energy", func=lambda x: x.sum(keepdims=True), dependencies=[system.atoms.positions])
+    forces = DependArray(name="forces", func=lambda x: x * 2, dependencies=[system.atoms.positions])
+    io.return_results(energy, forces)
+    thread.join(timeout=10)
+
+    assert len(results) == len(steps)
+    for positions, (e, f) in zip(steps, results):
+        positions = positions - positions[:, :n_qm_atoms].mean(axis=1, keepdims=True)
+        np.testing.assert_allclose(e, positions.sum(keepdims=True).ravel())
+        np.testing.assert_allclose(f, positions.T * 2)
+    np.testing.assert_array_equal(system.atoms.charges, view('charges'))
+    np.testing.assert_array_equal(system.qm.atoms.elements, [8, 1])
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="requires FIFOs")
+def test_shm_cwd(tmp_path):
+    n_atoms, n_qm_atoms = 5, 2
+
+    _, size = IOShm.get_layout(n_atoms, n_qm_atoms)
+    input = tmp_path / "qmhub.shm"
+    with open(input, "wb") as f:
+        f.truncate(size)
+    np.memmap(input, dtype="i4", mode="r+", shape=(HEADER_SIZE,))[:5] = [n_atoms, n_qm_atoms, 0, 1, 0]
+
+    os.mkfifo(tmp_path / "qmhub.shm.req")
+
+    # Stands for the driver end, so that opening the request FIFO does not block
+    fd = os.open(tmp_path / "qmhub.shm.req", os.O_RDWR)
+    try:
+        io = IOShm()
+        io.load_system(input)
+        io._fin.close()
+    finally:
+        os.close(fd)
+
+    # Same default as IOFifo
+    assert io.cwd == tmp_path
+
+
+@pytest.mark.skipif(not hasattr(os, "mkfifo"), reason="requires FIFOs")
+@pytest.mark.parametrize("pbc", [0, 2])
+def test_fifo(tmp_path, pbc):
+    n_atoms, n_qm_atoms = 5, 2
+    rng = np.random.default_rng(0)
+
+    input = tmp_path / "qmhub.in"
+    os.mkfifo(input)
+    os.mkfifo(input.with_suffix(".out"))
+
+    io = IO.create("fifo", str(tmp_path))
+
+    charges = rng.random(n_atoms)
+    steps = [rng.random((3, n_atoms)) for _ in range(3)]
+    # Cells sent with each step, with rounding noise to be cleaned up
+    cells = [np.diag([30., 31., 32.]) * (1. + .01 * i) + 1e-12 * (1 - np.eye(3)) for i in range(len(steps) + 1)]
+    results = []
+    cell_bases = []
+
+    def driver():
+        with open(input, "wb", buffering=0) as fin:
+            fin.write(np.array([n_atoms, n_qm_atoms, 0, 1, pbc], dtype="i4").tobytes())
+            fin.write(charges.tobytes())
+            fin.write(np.array([8, 1], dtype="i4").tobytes())
+            if pbc:
+                fin.write(cells[0].tobytes())
+            fout = None
+            for i, positions in enumerate(steps):
+                fin.write(np.array([i], dtype="i4").tobytes())
+                if pbc == 2:
+                    fin.write(cells[i + 1].tobytes())
+                fin.write(positions.tobytes())
+                if fout is None:
+                    fout = open(input.with_suffix(".out"), "rb")
+                results.append(np.frombuffer(fout.read(8 * (1 + 3 * n_atoms))))
+            fout.close()
+
+    thread = threading.Thread(target=driver, daemon=True)
+    thread.start()
+
+    system = io.load_system(input)
+
+    def get_energy(positions, cell_basis):
+        cell_bases.append(np.array(cell_basis))
+        return positions.sum(keepdims=True)
+
+    energy = DependArray(name="energy", func=get_energy, dependencies=[system.atoms.positions, system.cell_basis])
+    forces = DependArray(name="forces", func=lambda x: x * 2, dependencies=[system.atoms.positions])
+    io.return_results(energy, forces)
+    thread.join(timeout=10)
+
+    assert len(results) == len(steps)
+    for positions, result in zip(steps, results):
+        positions = positions - positions[:, :n_qm_atoms].mean(axis=1, keepdims=True)
+        np.testing.assert_allclose(result[0], positions.sum())
+        np.testing.assert_allclose(result[1:], (positions * 2).ravel(order="F"))
+    np.testing.assert_array_equal(system.atoms.charges, charges)
+    np.testing.assert_array_equal(system.qm.atoms.elements, [8, 1])
+
+    if pbc == 2:
+        assert len(cell_bases) == len(steps)
+        for cell, expected in zip(cell_bases, cells[1:]):
+            np.testing.assert_array_equal(cell, np.diag(np.diag(expected)))
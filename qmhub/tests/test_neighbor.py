@@ -0,0 +1,75 @@
+"""
+Tests for the neighbor list, against a brute-force search.
+"""
+
+import numpy as np
+import pytest
+
+from qmhub.electools.neighbor import NeighborList
+from qmhub.utils.darray import DependArray
+
+
+def get_neighbors(qm_positions, positions, cutoff):
+    dij = np.linalg.norm(positions[:, np.newaxis, :] - qm_positions[:, :, np.newaxis], axis=0)
+    return np.nonzero((dij < cutoff).any(axis=0))[0]
+
+
+@pytest.mark.parametrize("skin", [None, 1.])
+def test_neighbor_list(skin):
+    rng = np.random.default_rng(0)
+    cutoff = 6.
+
+    positions = DependArray(rng.uniform(-12., 12., size=(3, 2000)))
+    qm_positions = DependArray.from_darray(positions, np.s_[:, :5])
+    positions[:, :5] = rng.normal(size=(3, 5))
+
+    neighbor_list = NeighborList(qm_positions, positions, cutoff=cutoff, skin=skin)
+
+    for step in range(6):
+        if step > 0:
+            positions[:] = positions + rng.normal(scale=.1, size=positions.shape)
+
+        within = (neighbor_list.dij < cutoff).any(axis=0)
+        np.testing.assert_array_equal(neighbor_list.index[within], get_neighbors(np.asarray(qm_positions), np.asarray(positions), cutoff))
+        np.testing.assert_allclose(
+            neighbor_list.rij,
+            np.asarray(positions)[:, np.newaxis, neighbor_list.index] - np.asarray(qm_positions)[:, :, np.newaxis],
+        )
+
+    # Without a skin, the candidates are searched again every step
+    if skin is None:
+        assert neighbor_list.n_builds == 6
+    else:
+        assert neighbor_list.n_builds < 6
+
+
+@pytest.mark.parametrize("cell_basis", [
+    np.diag([30., 30., 30.]),
+    30. * np.array([[1., 1. / 3., -1. / 3.], [0., 2. * np.sqrt(2.) / 3., np.sqrt(2.) / 3.], [0., 0., np.sqrt(6.) / 3.]]),
+])
+def test_neighbor_list_rebuild(cell_basis):
+    rng = np.random.default_rng(0)
+
+    positions = DependArray(cell_basis @ rng.uniform(-.5, .5, size=(3, 500)))
+    qm_positions = DependArray.from_darray(positions, np.s_[:, :5])
+    positions[:, :5] = rng.normal(size=(3, 5))
+
+    neighbor_list = NeighborList(qm_positions, positions, DependArray(cell_basis), cutoff=6., skin=1.)
+    np.asarray(neighbor_list.index)
+    assert neighbor_list.n_builds == 1
+
+    # Moves within half of the skin reuse the candidates
+    positions[:] = positions + .4 * np.array([[1.], [0.], [0.]])
+    np.asarray(neighbor_list.index)
+    assert neighbor_list.n_builds == 1
+
+    # An atom wrapped to the other side of the cell has not moved
+    far = np.argmax(np.linalg.norm(np.asarray(positions), axis=0))
+    positions[:, far] = positions[:, far] - cell_basis[:, 0]
+    np.asarray(neighbor_list.index)
+    assert neighbor_list.n_builds == 1
+
+    # A move beyond half of the skin searches the candidates again
+    positions[:, 10] = positions[:, 10] + np.array([0., .6, 0.])
+    np.asarray(neighbor_list.index)
+    assert neighbor_list.n_builds == 2
@@ -0,0 +1,167 @@
+"""
+Tests for the persistent server mode of the ORCA engine.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import qmhub
+from qmhub.utils.darray import DependArray
+from qmhub.qmtools.orca import ORCA
+
+
+# Stand-in for an ORCA driver: answers every step with ORCA-formatted output files,
+# where the energy counts the steps served by this process.
+STUB = '''
+import sys
+
+n_steps = 0
+for line in sys.stdin:
+    words = line.split()
+    if not words or words[0] == "exit":
+        break
+    n_qm, n_mm = int(words[1]), int(words[2])
+    qm = [sys.stdin.readline().split() for i in range(n_qm)]
+    mm = [sys.stdin.readline().split() for i in range(n_mm)]
+    n_steps += 1
+
+    with open("orca.out", "w") as f:
+        f.write(f"FINAL SINGLE POINT ENERGY {-float(n_steps)}\\n")
+        f.write("MULLIKEN ATOMIC CHARGES\\n----\\n")
+        for i, atom in enumerate(qm):
+            f.write(f"{i} {atom[0]} : {.1 * i}\\n")
+    with open("orca.engrad", "w") as f:
+        f.write("#\\n" * 11)
+        for atom in qm:
+            for x in atom[1:]:
+                f.write(f"{x}\\n")
+    with open("orca.vpot.out", "w") as f:
+        f.write(f"{n_mm}\\n")
+        for c in mm:
+            f.write(f"{c[1]} {c[2]} {c[3]} {c[0]}\\n")
+    with open("orca.pcgrad", "w") as f:
+        f.write(f"{n_mm}\\n")
+        for c in mm:
+            f.write(f"{c[0]} {c[0]} {c[0]}\\n")
+
+    print("done", flush=True)
+'''
+
+
+def get_orca(cwd, options):
+    qm_positions = DependArray(np.array([[0., 1., 0.], [0., 0., 1.], [0., 0., 0.]]))
+    qm_elements = DependArray(np.array([8, 1, 1]))
+    mm_positions = DependArray(np.array([[3., 4.], [0., 0.], [0., 0.]]))
+    mm_charges = DependArray(np.array([.5, -.5]))
+
+    return ORCA(qm_positions, qm_elements, mm_positions, mm_charges, charge=0, cwd=str(cwd), options=options)
+
+
+@pytest.fixture
+def orca(tmp_path):
+    stub = tmp_path / "stub.py"
+    stub.write_text(STUB)
+
+    orca = get_orca(tmp_path, {"server": f"{sys.executable} {stub}"})
+    yield orca
+
+    # The worker is only started by the first step
+    if orca._worker is not None:
+        orca._worker.close()
+
+
+def test_orca_server(orca):
+    np.testing.assert_allclose(orca.qm_energy, -1.)
+    np.testing.assert_allclose(orca.qm_energy_gradient, orca.qm_positions)
+    np.testing.assert_allclose(orca.mm_esp[0], [.5, -.5])
+    np.testing.assert_allclose(orca.mulliken_charges, [0., .1, .2])
+
+    pid = orca._worker.proc.pid
+    orca.qm_positions[0, 0] = .5
+
+    np.testing.assert_allclose(orca.qm_energy, -2.)
+    np.testing.assert_allclose(orca.qm_energy_gradient, orca.qm_positions)
+    assert orca._worker.proc.pid == pid
+
+
+def test_orca_server_restart_on_options(orca):
+    np.testing.assert_allclose(orca.qm_energy, -1.)
+
+    orca.update_options({"method": "PBE"})
+
+    np.testing.assert_allclose(orca.qm_energy, -1.)
+    with open(f"{orca.cwd}/orca.inp") as f:
+        assert "PBE" in f.read()
+
+
+def test_orca_server_exit(tmp_path):
+    orca = get_orca(tmp_path, {"server": f"{sys.executable} -c 'import sys; sys.exit(3)'"})
+
+    with pytest.raises(RuntimeError, match="return code 3"):
+        np.asarray(orca.qm_energy)
+
+
+def test_orca_server_timeout(tmp_path):
+    orca = get_orca(tmp_path, {"server": f"{sys.executable} -c 'import time; time.sleep(60)'", "server_timeout": ".5"})
+
+    with pytest.raises(RuntimeError, match="did not reply within 0.5 s"):
+        np.asarray(orca.qm_energy)
+    assert orca._worker.proc is None
+
+
+# Stand-ins for orca and orca_vpot, where the energy tells whether the orbitals of the previous step are read
+ORCA_STUB = """#!{python}
+import sys
+from pathlib import Path
+
+inp = Path(sys.argv[1]).read_text()
+qm = inp.split("  coords\\n")[1].split("  end\\n")[0].splitlines()
+n_mm = int(Path("orca.pc").read_text().split()[0])
+
+print(f"FINAL SINGLE POINT ENERGY {{-2. if 'MORead' in inp else -1.}}")
+print("MULLIKEN ATOMIC CHARGES\\n----")
+for i, atom in enumerate(qm):
+    print(f"{{i}} {{atom.split()[0]}} : 0.0")
+
+Path("orca.engrad").write_text("#\\n" * 11 + "".join(f"{{x}}\\n" for atom in qm for x in atom.split()[1:]))
+Path("orca.pcgrad").write_text(f"{{n_mm}}\\n" + "0. 0. 0.\\n" * n_mm)
+Path("orca.gbw").write_text("")
+Path("orca.scfp").write_text("")
+"""
+
+ORCA_VPOT_STUB = """#!{python}
+import sys
+from pathlib import Path
+
+xyz = Path(sys.argv[3]).read_text().splitlines()
+Path(sys.argv[4]).write_text(xyz[0] + "\\n" + "".join(f"{{line}} 0.25\\n" for line in xyz[1:]))
+"""
+
+
+def test_orca_server_worker(tmp_path, monkeypatch):
+    bin = tmp_path / "bin"
+    bin.mkdir()
+    for name, stub in [("orca", ORCA_STUB), ("orca_vpot", ORCA_VPOT_STUB)]:
+        (bin / name).write_text(stub.format(python=sys.executable))
+        (bin / name).chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("PYTHONPATH", str(Path(qmhub.__file__).parents[1]))
+
+    orca = get_orca(tmp_path, {"server": f"{sys.executable} -m qmhub.qmtools.orca_server", "server_timeout": "20"})
+    try:
+        np.testing.assert_allclose(orca.qm_energy, -1.)
+        np.testing.assert_allclose(orca.qm_energy_gradient, orca.qm_positions)
+        np.testing.assert_allclose(orca.mm_esp[0], [.25, .25])
+
+        orca.qm_positions[0, 0] = .5
+
+        # The orbitals of the first step are the guess of the second one
+        np.testing.assert_allclose(orca.qm_energy, -2.)
+        np.testing.assert_allclose(orca.qm_energy_gradient, orca.qm_positions)
+        assert (tmp_path / "orca.guess.gbw").exists()
+    finally:
+        orca._worker.close()
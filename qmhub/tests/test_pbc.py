@@ -0,0 +1,41 @@
+"""
+Tests for the periodic boundary helpers.
+"""
+
+import numpy as np
+import pytest
+
+from qmhub.utils.pbc import get_min_image, get_cell_widths
+
+
+def truncated_octahedron(a):
+    cos = -1. / 3.
+    sin = np.sqrt(1. - cos**2)
+    cy = (cos - cos * cos) / sin
+    return a * np.array([
+        [1., cos, cos],
+        [0., sin, cy],
+        [0., 0., np.sqrt(1. - cos**2 - cy**2)],
+    ])
+
+
+@pytest.mark.parametrize("cell_basis", [np.diag([18., 19., 20.]), truncated_octahedron(30.)])
+def test_min_image(cell_basis):
+    rng = np.random.default_rng(0)
+    displacements = cell_basis @ rng.uniform(-2., 2., size=(3, 500))
+
+    images = get_min_image(displacements, cell_basis)
+
+    shifts = np.stack(np.meshgrid(*[np.arange(-3, 4)] * 3)).reshape(3, -1)
+    candidates = images[:, np.newaxis, :] + (cell_basis @ shifts)[:, :, np.newaxis]
+
+    np.testing.assert_allclose(np.linalg.norm(candidates, axis=0).min(axis=0), np.linalg.norm(images, axis=0))
+    shifts = np.linalg.solve(cell_basis, images - displacements)
+    np.testing.assert_allclose(shifts, np.around(shifts), atol=1e-9)
+
+
+def test_cell_widths():
+    np.testing.assert_array_equal(get_cell_widths(np.diag([18., 19., 20.])), [18., 19., 20.])
+
+    # Distance between opposite hexagonal faces of a truncated octahedron
+    np.testing.assert_allclose(get_cell_widths(truncated_octahedron(30.)), 30. * np.sqrt(2. / 3.) * np.ones(3))
@@ -0,0 +1,290 @@
+"""
+Tests for the PME summation, against the pure-NumPy Ewald summation.
+"""
+
+import json
+
+import numpy as np
+import pytest
+from scipy.special import erfc
+
+from qmhub.electools import ewald, pme
+from qmhub.electools.elec import Elec
+from qmhub.utils.darray import DependArray
+from qmhub.utils.dpme_numpy import DependNumpyPME
+from qmhub.utils.pbc import get_min_image
+
+
+def get_system(cell_basis, n_atoms=200, n_qm=4):
+    rng = np.random.default_rng(0)
+    positions = cell_basis @ rng.uniform(-.5, .5, size=(3, n_atoms))
+    positions[:, :n_qm] = rng.normal(scale=.8, size=(3, n_qm))
+    charges = rng.normal(size=n_atoms)
+
+    return get_min_image(positions, cell_basis), charges - charges.mean()
+
+
+def get_ewald(module, cell_basis, positions, charges, n_qm=4, **kwargs):
+    positions = DependArray(positions)
+    qm_positions = DependArray.from_darray(positions, np.s_[:, :n_qm])
+
+    return module.Ewald(qm_positions, positions, DependArray(charges), DependArray(cell_basis), np.arange(n_qm), **kwargs)
+
+
+# Truncated octahedron of 20 Angstrom between square faces, as a triclinic cell
+TRUNCATED_OCTAHEDRON = 20. * np.array([
+    [1., 1. / 3., -1. / 3.],
+    [0., 2. * np.sqrt(2.) / 3., np.sqrt(2.) / 3.],
+    [0., 0., np.sqrt(6.) / 3.],
+])
+
+
+@pytest.mark.parametrize("cell_basis", [
+    np.diag([16., 17., 18.]),
+    TRUNCATED_OCTAHEDRON,
+])
+def test_ewald(cell_basis):
+    positions, charges = get_system(cell_basis)
+
+    reference = get_ewald(ewald, cell_basis, positions, charges, tol=1e-12)
+    pme_ewald = get_ewald(pme, cell_basis, positions, charges, cutoff=7., tol=1e-10, order=8, grid_spacing=.5)
+
+    np.testing.assert_allclose(pme_ewald.qm_total_esp, reference.qm_total_esp, atol=1e-5)
+
+    qm_esp_charges = np.random.default_rng(1).normal(size=4)
+    np.testing.assert_allclose(
+        pme_ewald._get_total_espc_gradient(qm_esp_charges),
+        reference._get_total_espc_gradient(qm_esp_charges),
+        atol=1e-5,
+    )
+
+
+def get_dense_real_tensor(qm_positions, positions, cutoff, alpha, exclusion):
+    """The real-space tensor over all pairs, of shape (4, n_qm, n_atoms)."""
+
+    rij = positions[:, np.newaxis, :] - qm_positions[:, :, np.newaxis]
+    d = np.linalg.norm(rij, axis=0)
+    mask = (d < cutoff)
+    mask[:, exclusion] = False
+
+    d = np.where(mask, d, 1.)
+    prod = np.where(mask, erfc(alpha * d) / d, 0.)
+    prod2 = np.where(mask, prod / d**2 + 2 * alpha * np.exp(-alpha**2 * d**2) / np.sqrt(np.pi) / d**2, 0.)
+
+    return np.concatenate((prod[np.newaxis], prod2 * rij))
+
+
+@pytest.mark.parametrize("cell_basis", [
+    np.diag([16., 17., 18.]),
+    TRUNCATED_OCTAHEDRON,
+])
+def test_real_tensor(cell_basis):
+    cutoff, alpha = 6., .4
+    positions, charges = get_system(cell_basis, n_atoms=500)
+
+    # Atoms just within and just beyond the cutoff of a QM atom
+    rng = np.random.default_rng(1)
+    directions = rng.normal(size=(3, 20))
+    directions /= np.linalg.norm(directions, axis=0)
+    positions[:, 100:120] = positions[:, [0]] + directions * cutoff * (1. + np.repeat([-1e-9, 1e-9], 10))
+
+    # Atoms on the faces of the cell, and a QM atom close to one of them
+    positions[:, 120:126] = cell_basis @ np.array([
+        [.5, 0., 0.], [-.5, 0., 0.], [0., .5, 0.], [0., -.5, 0.], [0., 0., .5], [0., 0., -.5],
+    ]).T * (1. - 1e-9)
+    positions[:, 3] = cell_basis @ np.array([.49, .1, -.2])
+
+    exclusion = np.arange(4)
+    tensor = pme.EwaldRealTensor(
+        DependArray(positions[:, :4]), DependArray(positions), cutoff=cutoff, alpha=alpha, exclusion=exclusion,
+    )
+    dense = get_dense_real_tensor(positions[:, :4], positions, cutoff, alpha, exclusion)
+
+    np.testing.assert_allclose(tensor.tensor.toarray().reshape(4, 4, -1), dense, rtol=1e-12, atol=1e-15)
+    np.testing.assert_allclose(tensor.matvec(charges), dense @ charges, rtol=1e-12, atol=1e-12)
+
+    qm_charges = rng.normal(size=4)
+    np.testing.assert_allclose(tensor.rmatvec(qm_charges), np.einsum('i,kij->kj', qm_charges, dense[1:]), rtol=1e-12, atol=1e-12)
+
+
+def test_numpy_pme_splines():
+    rng = np.random.default_rng(0)
+    cell_basis = DependArray(np.diag([16., 17., 18.]))
+    recip_pme = DependNumpyPME(cell_basis, DependArray(np.array(.4)), 6, DependArray(np.array([20, 20, 24])), 1)
+
+    positions = DependArray(rng.uniform(-8., 8., size=(3, 100)))
+    qm_positions = DependArray.from_darray(positions, np.s_[:, :4])
+    charges = rng.normal(size=100)
+
+    def compute():
+        return recip_pme.compute_recip_esp(qm_positions, positions, charges)
+
+    # The splines of the DependArrays are cached, those of plain arrays are not
+    np.testing.assert_allclose(compute(), recip_pme.compute_recip_esp(np.array(qm_positions), np.array(positions), charges))
+    assert len(recip_pme._spline_cache) == 2
+
+    # Moving the atoms in place outdates the cached splines
+    positions[:] = positions + rng.normal(scale=.1, size=(3, 100))
+    np.testing.assert_allclose(compute(), recip_pme.compute_recip_esp(np.array(qm_positions), np.array(positions), charges))
+
+    # So does changing the lattice
+    cell_basis[:] = np.diag([16.5, 17., 18.])
+    np.testing.assert_allclose(compute(), recip_pme.compute_recip_esp(np.array(qm_positions), np.array(positions), charges))
+
+
+def test_numpy_pme_hysteresis():
+    rng = np.random.default_rng(0)
+    cell_basis = DependArray(np.diag([16., 17., 18.]))
+    nfft = DependArray(name="nfft", func=pme.Ewald._get_nfft, kwargs={'grid_spacing': .7}, dependencies=[cell_basis])
+    alpha = DependArray(np.array(.4))
+    recip_pme = DependNumpyPME(cell_basis, alpha, 6, nfft, 1)
+
+    positions = rng.uniform(-8., 8., size=(3, 100))
+    charges = rng.normal(size=100)
+
+    recip_pme.compute_recip_esp(positions[:, :4], positions, charges)
+    assert recip_pme.n_setups == 1
+    grid = recip_pme._nfft
+
+    # A box breathing by a few percent keeps the grid and only updates the lattice,
+    # although other grid dimensions are requested
+    requested = []
+    for scale in (1.02, .98, 1.03):
+        cell_basis[:] = np.diag([16., 17., 18.]) * scale
+        requested.append(np.asarray(nfft).tolist())
+
+        recip_esp = recip_pme.compute_recip_esp(positions[:, :4], positions, charges)
+        assert recip_pme.n_setups == 1
+        assert recip_pme._nfft == grid
+
+        reference = DependNumpyPME(DependArray(np.array(cell_basis)), alpha, 6, DependArray(np.array(grid)), 1)
+        np.testing.assert_allclose(recip_esp, reference.compute_recip_esp(positions[:, :4], positions, charges), rtol=1e-12, atol=1e-12)
+
+    assert any(n != grid for n in requested)
+
+    # A larger change sets the grid up again
+    cell_basis[:] = np.diag([16., 17., 18.]) * 1.2
+    recip_pme.compute_recip_esp(positions[:, :4], positions, charges)
+    assert recip_pme.n_setups == 2
+    assert recip_pme._nfft == np.asarray(nfft).tolist()
+
+
+def test_tuner_choice(monkeypatch):
+    """The fastest accurate candidate is kept, and the search stops at the first accurate one."""
+
+    # The error falls with the real-space tolerance and the grid spacing, the time rises with the order
+    def evaluate(*args, repeats=0, tol, cutoff, order, grid_spacing):
+        evaluated.append((tol, cutoff, order, grid_spacing))
+        error = 10 * tol + grid_spacing**order * 1e-3
+        return np.array([error]), (cutoff / 4 + order / grid_spacing**3 if repeats else None)
+
+    evaluated = []
+    tuner = pme.PMETuner(1e-4)
+    monkeypatch.setattr(tuner, "_evaluate", evaluate)
+
+    positions, charges = get_system(np.diag([30., 30., 30.]))
+    parameters = tuner._tune(positions[:, :4], positions, charges, np.diag([30., 30., 30.]), None)
+
+    # The reference is the most accurate candidate
+    assert evaluated[0] == (pytest.approx(1e-7), 12., 8, .6)
+
+    def error(p):
+        return abs(10 * p[0] + p[3]**p[2] * 1e-3 - (1e-6 + .6**8 * 1e-3))
+
+    accurate = [p for p in evaluated[1:] if error(p) <= 1e-4]
+    assert parameters == min(
+        ({'tol': p[0], 'cutoff': p[1], 'order': p[2], 'grid_spacing': p[3]} for p in accurate),
+        key=lambda p: p['cutoff'] / 4 + p['order'] / p['grid_spacing']**3,
+    )
+
+    # At most the finest grid of each real-space tolerance, and a bisection of the grid spacings
+    n_candidates = len(pme.PMETuner.cutoffs) * len(pme.PMETuner.orders) * len(pme.PMETuner.real_space_tols) * len(pme.PMETuner.grid_spacings)
+    assert len(set(evaluated)) < n_candidates / 3
+
+
+def test_tuner_file(tmp_path, monkeypatch):
+    cell_basis = np.diag([16., 17., 18.])
+    positions, charges = get_system(cell_basis)
+
+    tune_file = tmp_path / "pme.json"
+    tuner = pme.PMETuner(1e-3, tune_file, repeats=1)
+    monkeypatch.setattr(tuner, "cutoffs", (6., 8.))
+    monkeypatch.setattr(tuner, "orders", (4, 6))
+    parameters = tuner.get_parameters(positions[:, :4], positions, charges, cell_basis, np.arange(4))
+
+    assert set(parameters) == {'tol', 'cutoff', 'order', 'grid_spacing'}
+    assert tune_file.exists()
+
+    # A new tuner reads the parameters back instead of tuning again
+    tuner = pme.PMETuner(1e-3, tune_file)
+    monkeypatch.setattr(tuner, "_tune", lambda *args: pytest.fail("tuned again"))
+    assert tuner.get_parameters(positions[:, :4], positions, charges, cell_basis, np.arange(4)) == parameters
+
+    # The choice is accurate to the requested tolerance
+    reference = get_ewald(ewald, cell_basis, positions, charges, tol=1e-12)
+    pme_ewald = get_ewald(pme, cell_basis, positions, charges, **parameters)
+    np.testing.assert_allclose(pme_ewald.qm_total_esp, reference.qm_total_esp, atol=2e-3)
+
+    # Other boxes are tuned on their own
+    monkeypatch.setattr(tuner, "_tune", lambda *args: {'tol': 1e-4, 'cutoff': 6., 'order': 4, 'grid_spacing': 1.})
+    tuner.get_parameters(positions[:, :4], positions, charges, cell_basis * 1.5, np.arange(4))
+    assert len(json.loads(tune_file.read_text())) == 2
+
+
+@pytest.mark.parametrize("cell_basis", [
+    np.diag([16., 17., 18.]),
+    TRUNCATED_OCTAHEDRON,
+])
+def test_helpme(cell_basis):
+    """The lattice of helPME, with its first vector along x, is rotated back to the cell."""
+
+    dpme = pytest.importorskip("qmhub.utils.dpme")
+
+    rng = np.random.default_rng(0)
+    positions = cell_basis @ rng.uniform(-.5, .5, size=(3, 100))
+    charges = rng.normal(size=100)
+
+    args = (DependArray(cell_basis), DependArray(np.array(.4)), 6, DependArray(np.array([30, 30, 30])), 1)
+    helpme_esp = dpme.DependPME(*args).compute_recip_esp(positions[:, :4], positions, charges)
+    numpy_esp = DependNumpyPME(*args).compute_recip_esp(positions[:, :4], positions, charges)
+
+    np.testing.assert_allclose(helpme_esp, numpy_esp, atol=1e-8)
+
+
+def test_backend():
+    assert pme.Ewald._get_pme_class() is DependNumpyPME
+    assert pme.Ewald._get_pme_class("numpy") is DependNumpyPME
+
+    if pme.DependPME is None:
+        with pytest.raises(ImportError):
+            pme.Ewald._get_pme_class("helpme")
+    else:
+        assert pme.Ewald._get_pme_class("helpme") is pme.DependPME
+
+    with pytest.raises(ValueError, match="fftw"):
+        pme.Ewald._get_pme_class("fftw")
+
+
+def test_elec():
+    """The periodic model uses the PME with or without helPME, within its tolerance of the exact Ewald summation."""
+
+    cell_basis = np.diag([30., 30., 30.])
+    positions, charges = get_system(cell_basis, n_atoms=500)
+    positions = DependArray(positions)
+    qm_positions = DependArray.from_darray(positions, np.s_[:, :4])
+
+    elec = Elec(
+        qm_positions,
+        positions,
+        DependArray(np.zeros(4)),
+        DependArray(charges),
+        0,
+        DependArray(cell_basis),
+        switching_type="lrec",
+        cutoff=10.,
+        pbc=True,
+    )
+    reference = get_ewald(ewald, cell_basis, np.asarray(positions), charges, tol=1e-12)
+
+    assert isinstance(elec.full, pme.Ewald) and isinstance(elec.full.pme, DependNumpyPME)
+    np.testing.assert_allclose(elec.full.qm_total_esp, reference.qm_total_esp, atol=1e-4)
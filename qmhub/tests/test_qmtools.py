@@ -0,0 +1,123 @@
+"""
+Tests for the input generation of the file-based QM engines.
+"""
+
+import numpy as np
+import pytest
+
+from qmhub.utils.darray import DependArray
+from qmhub.units import ORCA_BOHR_TO_A, AMBER_HARTREE_TO_KCAL, AMBER_BOHR_TO_A
+from qmhub.qmtools.qmbase import format_columns
+from qmhub.qmtools.orca import ORCA
+from qmhub.qmtools.qchem import QChem
+from qmhub.qmtools.sqm import SQM
+
+
+@pytest.fixture
+def system():
+    rng = np.random.default_rng(0)
+    mm_positions = rng.normal(scale=10., size=(3, 50))
+    mm_positions[:, 0] = [0., -0., 1e-300]
+    mm_positions[:, 1] = [1e20, -1e-20, 123456789.]
+    mm_charges = rng.normal(size=50)
+
+    return {
+        'qm_positions': DependArray(rng.normal(size=(3, 3))),
+        'qm_elements': DependArray(np.array([8, 1, 1])),
+        'mm_positions': DependArray(mm_positions),
+        'mm_charges': DependArray(mm_charges),
+        'charge': 0,
+    }
+
+
+def test_format_columns():
+    x, y = np.array([1., -2.5, 1e-7]), np.array([3, 4, 5])
+    assert format_columns("a %21.14e %21.14e\n", x, y) == "".join(f"a {i:21.14e} {j:21.14e}\n" for i, j in zip(x, y))
+    assert format_columns("%21.14e\n", np.zeros(0)) == ""
+
+
+def test_orca_input(system, tmp_path):
+    ORCA(cwd=tmp_path, **system).gen_input()
+
+    x, y, z = system['mm_positions']
+    c = system['mm_charges']
+
+    pc = f"{len(c)}\n" + "".join(f"{c:21.14e} {x:21.14e} {y:21.14e} {z:21.14e}\n" for c, x, y, z in zip(c, x, y, z))
+    assert (tmp_path / "orca.pc").read_text() == pc
+
+    x, y, z = system['mm_positions'] / ORCA_BOHR_TO_A
+    vpot = f"{len(c)}\n" + "".join(f"{x:21.14e} {y:21.14e} {z:21.14e}\n" for x, y, z in zip(x, y, z))
+    assert (tmp_path / "orca.vpot.xyz").read_text() == vpot
+
+
+def test_qchem_input(system, tmp_path):
+    qchem = QChem(cwd=tmp_path, **system)
+    qchem.gen_input()
+
+    x, y, z = system['mm_positions']
+    c = system['mm_charges']
+
+    charges = "$external_charges\n" + "".join(f"{x:21.14e} {y:21.14e} {z:21.14e} {c:21.14e}\n" for x, y, z, c in zip(x, y, z, c)) + "$end\n"
+    assert (tmp_path / "qchem.inp").read_text().endswith(charges)
+
+
+def test_sqm_input(system, tmp_path):
+    SQM(cwd=tmp_path, **system).gen_input()
+
+    x, y, z = system['mm_positions']
+    c = system['mm_charges']
+
+    charges = "#EXCHARGES\n" + "".join(f"  1  H {x:21.14e} {y:21.14e} {z:21.14e} {c:21.14e}\n" for x, y, z, c in zip(x, y, z, c)) + "#END\n"
+    assert (tmp_path / "sqm.inp").read_text().endswith(charges)
+
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_sqm_output(system, tmp_path, cached):
+    sqm = SQM(cwd=tmp_path, **system)
+
+    rng = np.random.default_rng(1)
+    gradient = rng.normal(size=(3, 3))
+    mm_esp = rng.normal(size=(4, 50))
+
+    lines = ["", " QMMM: SCF Energy =      -12.34567890 KCal/mol", "", " Atomic Charges for Step 1 :", "  Atom    Element       Mulliken Charge"]
+    lines += [f"     {i + 1}      H       {.1 * i:.4f}" for i in range(3)]
+    lines += ["", "QMMM: Forces on QM atoms from SCF calculation"]
+    lines += [f"{'QMMM: ' + str(i + 1):18}" + "".join(f"{x:20.12f}" for x in g) for i, g in enumerate(gradient.T)]
+    lines += ["", "QMMM: Electrostatic potential and field on MM atoms from QM Atoms"]
+    lines += [f"{'QMMM: ' + str(i + 1):18}" + "".join(f"{x:20.12f}" for x in e) for i, e in enumerate(mm_esp.T)]
+    (tmp_path / "sqm.out").write_text("\n".join(lines + [""]))
+
+    if cached:
+        # Parse the output read once by the cache, as during a simulation
+        sqm.run_qm = lambda: None
+        get = lambda name: np.asarray(getattr(sqm, name))
+    else:
+        get = lambda name: getattr(sqm, "_get_" + name)()
+
+    assert get("qm_energy") == pytest.approx(-12.3456789 / AMBER_HARTREE_TO_KCAL)
+    np.testing.assert_allclose(get("qm_energy_gradient"), gradient / (AMBER_HARTREE_TO_KCAL / AMBER_BOHR_TO_A))
+    np.testing.assert_allclose(get("mulliken_charges"), [0., .1, .2])
+
+    scaling = np.array([[1.], [-1.], [-1.], [-1.]]) / np.array([[AMBER_HARTREE_TO_KCAL]] + [[AMBER_HARTREE_TO_KCAL / AMBER_BOHR_TO_A]] * 3)
+    np.testing.assert_allclose(get("mm_esp"), mm_esp * scaling)
+
+    if cached:
+        assert not (tmp_path / "sqm.out").exists()
+
+
+@pytest.mark.parametrize("section", ["qm_energy_gradient", "mm_esp"])
+def test_sqm_output_truncated(system, tmp_path, section):
+    sqm = SQM(cwd=tmp_path, **system)
+
+    lines = ["", " QMMM: SCF Energy =      -12.34567890 KCal/mol", "", "QMMM: Forces on QM atoms from SCF calculation"]
+    lines += [f"{'QMMM: ' + str(i + 1):18}" + "".join(f"{x:20.12f}" for x in g) for i, g in enumerate(np.ones((3, 3)))]
+    if section == "mm_esp":
+        lines += ["", "QMMM: Electrostatic potential and field on MM atoms from QM Atoms"]
+        lines += [f"{'QMMM: ' + str(i + 1):18}" + "".join(f"{x:20.12f}" for x in e) for i, e in enumerate(np.ones((50, 4)))]
+
+    # The output of a run stopped while writing the section
+    (tmp_path / "sqm.out").write_text("\n".join(lines[:-1] + [""]))
+
+    name = {"qm_energy_gradient": "gradient", "mm_esp": "mm_esp"}[section]
+    with pytest.raises(ValueError, match=f"'{name}'.*truncated"):
+        getattr(sqm, "_get_" + section)()
@@ -0,0 +1,109 @@
+"""
+Tests for the QM/MM energy gradient, against the formulas computing every intermediate in place.
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from qmhub.electools.result import Result
+from qmhub.utils.darray import DependArray
+from qmhub.utils.dsolver import DependSolver
+
+
+def get_energy_gradient_qm(t, t_grad, w, w_grad, wt, wt_solver, qm_esp, qm_total_esp, qm_grad, mm_esp, mm_charges):
+
+    qm_esp_charges = wt_solver.solve_T(w * mm_esp[0])
+    mm_usp_charges = wt_solver.solve(qm_esp[0])
+    qm_esp_charges_inv = wt_solver.solve(qm_esp_charges)
+    mm_usp_charges_inv = wt_solver.solve_T(mm_usp_charges)
+
+    return (
+        qm_grad +
+        w_grad @ (
+            (mm_usp_charges + mm_charges) * (qm_esp_charges @ t - mm_esp[0]) -
+            (qm_esp[0] - wt @ mm_usp_charges) @ t * qm_esp_charges_inv -
+            mm_usp_charges_inv @ t * (w * mm_esp[0] - qm_esp_charges @ wt)
+        ) +
+        (t_grad @ ((mm_usp_charges + mm_charges) * w) + qm_total_esp[1:]) * qm_esp_charges -
+        t_grad @ (qm_esp_charges_inv * w) * (qm_esp[0] - wt @ mm_usp_charges) -
+        t_grad @ ((w * mm_esp[0] - qm_esp_charges @ wt) * w) * mm_usp_charges_inv
+    )
+
+
+def get_energy_gradient_mm(t, t_grad, w, w_grad, wt, wt_solver, qm_esp, mm_esp, mm_charges):
+
+    qm_esp_charges = wt_solver.solve_T(w * mm_esp[0])
+    mm_usp_charges = wt_solver.solve(qm_esp[0])
+    qm_esp_charges_inv = wt_solver.solve(qm_esp_charges)
+    mm_usp_charges_inv = wt_solver.solve_T(mm_usp_charges)
+
+    return (
+        (mm_usp_charges + mm_charges) * (
+            (mm_esp[1:] - qm_esp_charges @ t_grad) * w +
+            (mm_esp[0] - qm_esp_charges @ t) * w_grad.sum(axis=1)
+        ) +
+        qm_esp_charges_inv * (
+            (qm_esp[0] - wt @ mm_usp_charges) @ t * w_grad.sum(axis=1) +
+            (qm_esp[0] - wt @ mm_usp_charges) @ t_grad * w
+        ) +
+        (w * mm_esp[0] - qm_esp_charges @ wt) * (
+            (mm_usp_charges_inv @ t) * w_grad.sum(axis=1) +
+            (mm_usp_charges_inv @ t_grad) * w
+        )
+    )
+
+
+@pytest.mark.parametrize("n_qm, n_mm", [(4, 30), (6, 3)])
+def test_energy_gradient(n_qm, n_mm):
+    rng = np.random.default_rng(0)
+
+    t = DependArray(rng.normal(size=(n_qm, n_mm)))
+    t_grad = DependArray(rng.normal(size=(3, n_qm, n_mm)))
+    w = DependArray(rng.uniform(size=n_mm))
+    w_grad = DependArray(rng.normal(size=(3, n_qm, n_mm)))
+    wt = DependArray(name="wt", func=(lambda x, y: x * y), dependencies=[t, w])
+    wt_solver = DependSolver(wt)
+    mm_charges = DependArray(rng.normal(size=n_mm))
+
+    elec = SimpleNamespace(
+        full=SimpleNamespace(qm_total_esp=DependArray(rng.normal(size=(4, n_qm))), _get_total_espc_gradient=None),
+        qm_residual_esp=DependArray(rng.normal(size=(4, n_qm))),
+        qmqm=None,
+    )
+
+    result = Result(
+        qm_energy=DependArray(np.array(0.)),
+        qm_energy_gradient=DependArray(rng.normal(size=(3, n_qm))),
+        mm_esp=DependArray(rng.normal(size=(4, n_mm))),
+        qm_charges=DependArray(np.zeros(n_qm)),
+        mm_charges=mm_charges,
+        near_field_mask=DependArray(np.ones(n_mm, dtype=bool)),
+        scaling_factor=w,
+        scaling_factor_gradient=w_grad,
+        qmmm_coulomb_tensor=t,
+        qmmm_coulomb_tensor_gradient=t_grad,
+        weighted_qmmm_coulomb_tensor=wt,
+        weighted_qmmm_coulomb_tensor_solver=wt_solver,
+        elec=elec,
+    )
+
+    for _ in range(2):
+        args = (np.asarray(t), np.asarray(t_grad), np.asarray(w), np.asarray(w_grad), np.asarray(wt), wt_solver, np.asarray(elec.qm_residual_esp))
+        mm_esp = np.asarray(result.mm_esp)
+
+        np.testing.assert_allclose(
+            result._energy_gradient_qm,
+            get_energy_gradient_qm(*args, np.asarray(elec.full.qm_total_esp), np.asarray(result._qm_energy_gradient), mm_esp, np.asarray(mm_charges)),
+            rtol=1e-10, atol=1e-10,
+        )
+        np.testing.assert_allclose(
+            result._energy_gradient_mm,
+            get_energy_gradient_mm(*args, mm_esp, np.asarray(mm_charges)),
+            rtol=1e-10, atol=1e-10,
+        )
+
+        # The shared intermediates follow a new step
+        t[:] = t + rng.normal(scale=.1, size=t.shape)
+        w[:] = rng.uniform(size=n_mm)
@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from qmhub.engine import Engine
+from qmhub.simulation import Simulation
+from qmhub.utils.darray import DependArray
+
+from .test_engine import sqm_stub, run_in_thread
+
+
+def get_group(positions, cwd):
+    rng = np.random.default_rng(0)
+
+    group = Engine(
+        positions,
+        DependArray(np.array([8, 1, 1])),
+        DependArray(rng.normal(size=(3, 10))),
+        DependArray(rng.normal(size=10)),
+        charge=0,
+    )
+    cwd.mkdir(exist_ok=True)
+    group.add_engine("sqm", name="sqm", cwd=cwd)
+    group.add_engine("dummy", name="dummy", cwd=cwd)
+
+    # Stands for the result of the model, which only passes the QM energy and gradient through here
+    return group, SimpleNamespace(energy=group.qm_energy, energy_gradient=group.qm_energy_gradient)
+
+
+def test_mts(tmp_path, sqm_stub):
+    positions = DependArray(np.random.default_rng(0).normal(size=(3, 3)))
+
+    simulation = Simulation("mts", nrespa=2)
+    for name in ["engine", "engine2"]:
+        group, result = get_group(positions, tmp_path / name)
+        simulation.add_engine(name, result, group=group)
+
+    # An outer step, where both engine groups run at the same time
+    simulation.step[()] = 3
+    assert run_in_thread(lambda: np.asarray(simulation.energy).item()) == pytest.approx(sqm_stub)
+    np.testing.assert_allclose(simulation.energy_gradient, np.asarray(simulation.engine.energy_gradient))
+
+    executor = simulation._executor
+    assert executor._max_workers == 4
+
+    # An inner step
+    simulation.step[()] = 4
+    positions[:] = positions + .1
+    assert run_in_thread(lambda: np.asarray(simulation.energy).item()) == 0.
+
+    simulation.close()
+    assert simulation._executor is None
+    with pytest.raises(RuntimeError):
+        executor.submit(print)
+
+
+def test_mts_shared_files(tmp_path, sqm_stub):
+    positions = DependArray(np.random.default_rng(0).normal(size=(3, 3)))
+
+    simulation = Simulation("mts", nrespa=2)
+    for name in ["engine", "engine2"]:
+        # The SQM engines of both groups in the same directory
+        group, result = get_group(positions, tmp_path / "qm")
+        simulation.add_engine(name, result, group=group)
+
+    simulation.step[()] = 3
+    with pytest.raises(ValueError, match="sqm.inp"):
+        np.asarray(simulation.energy)
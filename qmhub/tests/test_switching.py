@@ -0,0 +1,21 @@
+"""
+Tests for the switching functions.
+"""
+
+import numpy as np
+import pytest
+
+from qmhub.electools.switching import SWITCHING_FUNCTIONS
+
+
+@pytest.mark.parametrize("switching_type", sorted(SWITCHING_FUNCTIONS))
+def test_derivative(switching_type):
+    func = SWITCHING_FUNCTIONS[switching_type]
+    dij_min = np.linspace(1., 7.9, 200)
+    h = 1e-6
+
+    _, derivative = func(dij_min, cutoff=8., swdist=6.)
+    forward, _ = func(dij_min + h, cutoff=8., swdist=6.)
+    backward, _ = func(dij_min - h, cutoff=8., swdist=6.)
+
+    np.testing.assert_allclose(derivative, (forward - backward) / (2 * h), atol=1e-6)
@@ -0,0 +1,32 @@
+import numpy as np
+
+
+class Buffer(object):
+    def __init__(self, dtype=float, headroom=.25):
+        """
+        Memory reused by an array whose shape changes a little from step to step.
+
+        `get` returns a C-contiguous array at the start of a flat allocation, which is only
+        replaced, with `headroom` (relative) of extra capacity, when the requested shape does not
+        fit. The rest of the allocation is left unused. The returned array is overwritten by the
+        next call.
+
+        A `DependArray` whose function returns such an array keeps it as its value without a copy,
+        so the value seen by its callers changes in place at the next evaluation. Copy it to keep it
+        across steps.
+        """
+
+        self.dtype = dtype
+        self.headroom = headroom
+        self.n_allocations = 0
+
+        self._data = np.empty(0, dtype=dtype)
+
+    def get(self, shape):
+        size = int(np.prod(shape))
+
+        if size > len(self._data):
+            self._data = np.empty(int(size * (1. + self.headroom)), dtype=self.dtype)
+            self.n_allocations += 1
+
+        return self._data[:size].reshape(shape)
@@ -1,4 +1,5 @@
 import types
+import weakref
 
 import numpy as np
 from numpy.lib.user_array import container
@@ -6,7 +7,20 @@ from numpy.lib.user_array import container
 from .dobject import DependObject, cache_update, invalidate_cache
 
 
+def _inplace_method(ufunc):
+    def method(self, other):
+        self[...] = ufunc(self.array, np.asarray(other))
+        return self
+    return method
+
+
 class DependArray(DependObject, container):
+    """NumPy array node of the dependency graph.
+
+    The value of a node with a function is the array returned by the function, without a copy. A
+    function may write into memory it reuses from step to step (see `Buffer`): such a value is
+    always taken as changed, and arrays obtained from the node earlier share its new contents.
+    """
 
     def __init__(self, data=None, **kwargs):
         if data is not None:
@@ -14,16 +28,24 @@ class DependArray(DependObject, container):
         else:
             self.array = None
 
+        self._base = None
+        self._views = []
+
         super().__init__(**kwargs)
 
     @classmethod
     def from_darray(cls, darray, index):
+        if darray._func is not None:
+            # Taken again from the new value, and bumped like any node when it changes
+            return cls(name=darray._name, func=(lambda x: x[index]), dependencies=[darray])
+
         ret = cls(darray[index], name=darray._name)
 
-        if darray._func is not None:
-            ret.add_dependency(darray)
-        else:
-            ret._dependants = darray._dependants
+        # Share the memory but keep separate dependants, so that writing to one slice
+        # does not invalidate the dependants of a slice that does not overlap with it.
+        base = darray._base if darray._base is not None else darray
+        ret._base = weakref.proxy(base)
+        base._views.append(weakref.proxy(ret))
 
         return ret
 
@@ -34,8 +56,48 @@ class DependArray(DependObject, container):
     def __setitem__(self, index, value):
         if self._func is not None:
             raise NameError(f"Cannot set the value of <{self._name}> directly")
-        self.array[index] = np.asarray(value, self.dtype)
-        invalidate_cache(self)
+
+        value = np.asarray(value, self.dtype)
+
+        # `darray[index] += value` writes through the view returned by `__getitem__` first,
+        # so a value sharing memory with the array has to be taken as a change.
+        if not np.shares_memory(value, self.array) and np.array_equal(self.array[index], value):
+            return
+
+        self.array[index] = value
+        self._set_modified(index)
+
+    def _set_modified(self, index=Ellipsis):
+        """Bump the version of this array and of the overlapping views, and invalidate their dependants."""
+
+        # Trailing Ellipsis keeps integer indexing from returning a scalar copy
+        key = index if isinstance(index, tuple) else (index,)
+        if not any(k is Ellipsis for k in key):
+            key += (Ellipsis,)
+
+        region = self.array[key]
+        if not np.shares_memory(region, self.array):
+            # Advanced indexing returns a copy
+            region = self.array
+
+        base = self._base if self._base is not None else self
+
+        for darray in [base, *base._views]:
+            try:
+                if darray is self or np.shares_memory(region, darray.array):
+                    darray._version += 1
+                    invalidate_cache(darray)
+            except ReferenceError:
+                pass
+
+    def _evaluate(self):
+        array = np.ascontiguousarray(self._func(*self._dependencies, **self._kwargs))
+
+        # A function writing into a reused buffer returns a view of the memory of the previous value
+        changed = array is self.array or np.may_share_memory(array, self.array) or not np.array_equal(array, self.array)
+        self.array = array
+
+        return changed
 
     @cache_update
     def __bool__(self):
@@ -49,16 +111,6 @@ class DependArray(DependObject, container):
     def __reversed__(self):
         return reversed(self.array)
 
-    def update_cache(self):
-        if not self._cache_valid:
-            if self._func is None:
-                if self._dependencies:
-                    for dobject in self._dependencies:
-                        dobject.update_cache()
-            else:
-                self.array = np.ascontiguousarray(self._func(*self._dependencies, **self._kwargs))
-            self._cache_valid = True
-
     # Wrap methods from parent class
     for method_name in dir(container):
         if method_name not in ["_rc", "__array_wrap__", "__setattr__"]:
@@ -71,7 +123,32 @@ class DependArray(DependObject, container):
 
     __rtruediv__ = cache_update(container.__rdiv__)
 
-    __itruediv__ = cache_update(container.__idiv__)
+    # In-place operators go through `__setitem__` to keep track of changes
+    __iadd__ = _inplace_method(np.add)
+
+    __isub__ = _inplace_method(np.subtract)
+
+    __imul__ = _inplace_method(np.multiply)
+
+    __itruediv__ = _inplace_method(np.true_divide)
+
+    __ifloordiv__ = _inplace_method(np.floor_divide)
+
+    __imod__ = _inplace_method(np.remainder)
+
+    __ipow__ = _inplace_method(np.power)
+
+    __imatmul__ = _inplace_method(np.matmul)
+
+    __ilshift__ = _inplace_method(np.left_shift)
+
+    __irshift__ = _inplace_method(np.right_shift)
+
+    __iand__ = _inplace_method(np.bitwise_and)
+
+    __ixor__ = _inplace_method(np.bitwise_xor)
+
+    __ior__ = _inplace_method(np.bitwise_or)
 
     @cache_update
     def __floordiv__(self, other):
@@ -81,11 +158,6 @@ class DependArray(DependObject, container):
     def __rfloordiv__(self, other):
         return self._rc(np.floor_divide(np.asarray(other), self.array))
 
-    @cache_update
-    def __ifloordiv__(self, other):
-        np.floor_divide(self.array, other, self.array)
-        return self
-
     @cache_update
     def __matmul__(self, other):
         return self._rc(np.matmul(self.array, other))
@@ -94,11 +166,6 @@ class DependArray(DependObject, container):
     def __rmatmul__(self, other):
         return self._rc(np.matmul(other, self.array))
 
-    @cache_update
-    def __imatmul__(self, other):
-        np.matmul(self.array, other, self.array)
-        return self
-
     @cache_update
     def tobytes(self, order='C'):
         ""
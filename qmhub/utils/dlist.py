@@ -24,6 +24,7 @@ class DependList(DependObject, MutableSequence):
         if self._func is not None:
             raise NameError(f"Cannot set the value of <{self._name}> directly")
         self._data[index] = list(value)
+        self._version += 1
         invalidate_cache(self)
 
     @cache_update
@@ -42,7 +43,6 @@ class DependList(DependObject, MutableSequence):
     def __reversed__(self):
         return reversed(self._data)
 
-    def update_cache(self):
-        if not self._cache_valid:
-            self._data = list(self._func(*self._dependencies, **self._kwargs))
-            self._cache_valid = True
+    def _evaluate(self):
+        self._data = list(self._func(*self._dependencies, **self._kwargs))
+        return True
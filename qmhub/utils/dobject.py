@@ -1,5 +1,31 @@
 import functools
+import threading
 import weakref
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+# Bumped whenever an edge is added to the dependency graph, which outdates cached topological orders
+_graph_version = 0
+
+# Thread pool used to evaluate independent nodes concurrently (disabled if None)
+_executor = None
+
+# Whether the current thread is a pool thread, whose evaluations do not use the pool again
+_state = threading.local()
+
+
+def set_max_workers(max_workers=None):
+    """Evaluate independent nodes of the graph in a pool of `max_workers` threads (disabled if None or 0)."""
+
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown()
+
+    if max_workers:
+        _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="qmhub")
+    else:
+        _executor = None
 
 
 def cache_update(method):
@@ -11,18 +37,197 @@ def cache_update(method):
 
 
 def invalidate_cache(dobject):
+    """Force `dobject` to be recomputed and mark everything downstream of it as outdated.
+
+    The traversal stops at nodes that are already outdated, since their dependants are outdated too,
+    so every node is visited at most once.
+    """
+
+    dobject._dependency_versions = None
     if dobject._func is not None or dobject._dependencies:
         dobject._cache_valid = False
 
-    for item in dobject._dependants:
+    stack = [dobject]
+    while stack:
+        for item in stack.pop()._dependants:
+            try:
+                if item._cache_valid:
+                    item._cache_valid = False
+                    stack.append(item)
+            except ReferenceError:
+                pass
+
+
+def get_topological_order(dobject):
+    """Return `dobject` and its dependencies with every node after its dependencies.
+
+    The dependencies of lazy nodes are left out, as they are only evaluated by the function of the
+    lazy node. The order is cached on `dobject` until the shape of the graph changes.
+    """
+
+    if dobject._topological_order_version == _graph_version:
+        return dobject._topological_order
+
+    order = []
+    visited = set()
+    stack = [(dobject, False)]
+
+    while stack:
+        item, expanded = stack.pop()
+        if expanded:
+            order.append(item)
+        elif id(item) not in visited:
+            visited.add(id(item))
+            stack.append((item, True))
+            if not item._lazy:
+                stack.extend((d, False) for d in reversed(item._dependencies) if id(d) not in visited)
+
+    dobject._topological_order = order
+    dobject._topological_order_version = _graph_version
+
+    return order
+
+
+def update_caches(dobjects):
+    """Bring `dobjects` up to date, evaluating each outdated node they depend on exactly once."""
+
+    order = []
+    visited = set()
+    for dobject in dobjects:
+        if not dobject._cache_valid:
+            for item in get_topological_order(dobject):
+                if id(item) not in visited:
+                    visited.add(id(item))
+                    order.append(item)
+
+    if _executor is not None and not getattr(_state, 'in_pool', False):
+        _update_in_parallel(order, _executor)
+    else:
+        for item in order:
+            if not item._cache_valid:
+                _update_node(item)
+
+
+def update_caches_concurrently(dobjects, executor):
+    """Bring `dobjects` up to date, evaluating the outdated ones at the same time in `executor`.
+
+    The dependencies of `dobjects` are updated first in the calling thread, so that only the
+    functions of `dobjects` themselves run concurrently.
+    """
+
+    outdated = [item for item in dobjects if not item._cache_valid]
+    update_caches([d for item in outdated if not item._lazy for d in item._dependencies])
+
+    if executor is None or len(outdated) < 2:
+        for item in outdated:
+            update_caches([item])
+    else:
+        futures = [executor.submit(_update_node_in_pool, item) for item in outdated]
         try:
-            invalidate_cache(item)
-        except ReferenceError:
-            pass
+            for future in futures:
+                future.result()
+        finally:
+            wait(futures)
+
+
+def _update_in_parallel(order, executor):
+    """Evaluate the outdated nodes in `order` in `executor` as soon as their dependencies are done.
+
+    Lazy nodes pull their own dependencies, so they are evaluated in the calling thread while
+    nothing else is running.
+    """
+
+    outdated = [item for item in order if not item._cache_valid]
+    outdated_ids = set(id(item) for item in outdated)
+
+    n_waiting = {}
+    dependants = {id(item): [] for item in outdated}
+    for item in outdated:
+        dependencies = set(id(d) for d in item._dependencies if id(d) in outdated_ids)
+        n_waiting[id(item)] = len(dependencies)
+        for d in item._dependencies:
+            if id(d) in dependencies:
+                dependencies.remove(id(d))
+                dependants[id(d)].append(item)
+
+    ready = [item for item in outdated if n_waiting[id(item)] == 0]
+    running = {}
+
+    def _set_done(item):
+        for d in dependants[id(item)]:
+            n_waiting[id(d)] -= 1
+            if n_waiting[id(d)] == 0:
+                ready.append(d)
+
+    try:
+        while ready or running:
+            deferred = []
+            while ready:
+                item = ready.pop()
+                if not item._lazy:
+                    running[executor.submit(_update_node_in_pool, item)] = item
+                elif running:
+                    deferred.append(item)
+                else:
+                    _update_node(item)
+                    _set_done(item)
+            ready.extend(deferred)
+
+            if running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = running.pop(future)
+                    future.result()
+                    _set_done(item)
+    finally:
+        if running:
+            wait(running)
+
+
+def _update_node_in_pool(dobject):
+    _state.in_pool = True
+    try:
+        _update_node(dobject)
+    finally:
+        _state.in_pool = False
+
+
+def _update_node(dobject):
+    """Evaluate a single node whose (non-lazy) dependencies are already up to date.
+
+    The node is locked while it is evaluated, so that threads needing the same node wait for one
+    evaluation instead of repeating it. No other lock is held, so a function may wait for nodes
+    evaluated in other threads, as long as these do not need the node itself.
+    """
+
+    with dobject._lock:
+        if dobject._cache_valid:
+            return
+
+        if dobject._func is not None:
+            if dobject._lazy:
+                if dobject._evaluate():
+                    dobject._version += 1
+            else:
+                dependency_versions = [item._version for item in dobject._dependencies]
+                if dependency_versions != dobject._dependency_versions:
+                    if dobject._evaluate():
+                        dobject._version += 1
+                    dobject._dependency_versions = dependency_versions
+
+        dobject._cache_valid = True
 
 
 class DependObject(object):
-    def __init__(self, *, name=None, func=None, kwargs=None, dependencies=None, dependants=None):
+    def __init__(self, *, name=None, func=None, kwargs=None, dependencies=None, dependants=None, lazy=False):
+        """
+        A node of the dependency graph.
+
+        `_version` is bumped every time the value of the node really changes. An outdated node
+        whose dependencies still have the versions recorded at its last evaluation is marked as
+        valid again without calling `func`. Dependencies of a `lazy` node are not evaluated
+        beforehand, only when `func` uses them, so the node is always recomputed.
+        """
 
         kwargs = kwargs or {}
         dependencies = dependencies or []
@@ -35,16 +240,37 @@ class DependObject(object):
         self._dependencies = dependencies
         self._dependants = dependants
         self._cache_valid = cache_valid
+        self._lazy = lazy
+        self._version = 0
+        self._dependency_versions = None
+        self._topological_order = None
+        self._topological_order_version = None
+        self._lock = threading.RLock()
 
         for item in dependencies:
             item.add_dependant(self)
 
     def add_dependency(self, dependency):
+        global _graph_version
+
         self._dependencies.append(dependency)
         dependency.add_dependant(self)
+        _graph_version += 1
         invalidate_cache(self)
 
     def add_dependant(self, dependant):
+        global _graph_version
+
         proxy = weakref.proxy(dependant)
         if id(proxy) not in [id(p) for p in self._dependants]:
             self._dependants.append(proxy)
+            _graph_version += 1
+
+    def _evaluate(self):
+        """Recompute the value from `func` and return whether it changed."""
+
+        raise NotImplementedError()
+
+    def update_cache(self):
+        if not self._cache_valid:
+            update_caches([self])
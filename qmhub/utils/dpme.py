@@ -1,40 +1,128 @@
+import threading
 import weakref
 import numpy as np
 
 import qmhub.helpmelib as pme
-from .dobject import cache_update
+from .dobject import cache_update, update_caches
+from .pbc import is_orthorhombic
+from .dpme_numpy import get_nfft
 
 
 class DependPME(pme.PMEInstanceD):
-    def __init__(self, cell_basis, alpha, order, nfft, nproc):
+    def __init__(self, cell_basis, alpha, order, nfft, nproc, *, hysteresis=.1):
+        """
+        helPME instance kept up to date with the lattice.
+
+        The grids and FFT plans are only set up again when the grid parameters change; a change
+        of the lattice alone just updates the lattice vectors. The grid dimensions requested by
+        `nfft` are not followed while they stay within `hysteresis` (relative) of the current
+        ones, so that a box breathing around an FFT size does not trigger a setup every step.
+
+        helPME spreads and probes from the coordinates, so unlike `DependNumpyPME` the B-splines
+        are computed again on every `compute_recip_esp` call.
+        """
+
         super().__init__()
 
         self._name = "PME"
-        self._kwargs = {"alpha": alpha, "order": order, "nfft": nfft, "nproc": nproc}
-        self._dependencies = [cell_basis]
+        self._kwargs = {"alpha": alpha, "order": order, "nproc": nproc}
+        self._dependencies = [cell_basis, nfft]
         self._dependants = []
         self._cache_valid = False
+        self._lazy = False
+        self._version = 0
+        self._dependency_versions = None
+        self._topological_order = None
+        self._topological_order_version = None
+        self._lock = threading.RLock()
 
-    def _func(self, cell_basis, alpha, order, nfft, nproc):
-        super().setup(
-                1,
-                alpha.item(),
-                order,
-                *nfft.tolist(),
-                1.,
-                nproc,
-        )
+        self.hysteresis = hysteresis
+        self.n_setups = 0
+
+        self._setup_parameters = None
+        self._nfft = None
+
+        for item in self._dependencies:
+            item.add_dependant(self)
+
+    def _func(self, cell_basis, nfft, alpha, order, nproc):
+        nfft = self._get_nfft(nfft)
+
+        parameters = (alpha.item(), order, nfft, nproc)
+        if parameters != self._setup_parameters:
+            super().setup(
+                    1,
+                    alpha.item(),
+                    order,
+                    *nfft,
+                    1.,
+                    nproc,
+            )
+            self._setup_parameters = parameters
+            self.n_setups += 1
+
+        lengths, angles = self._get_lattice_parameters(cell_basis)
 
         super().set_lattice_vectors(
-            *np.diag(cell_basis).tolist(),
-            *[90., 90., 90.],
+            *lengths,
+            *angles,
             self.LatticeType.XAligned,
         )
 
+        # helPME puts the first lattice vector along x and the second in the xy plane
+        if is_orthorhombic(cell_basis):
+            self._rotation = None
+        else:
+            self._rotation = self._get_xaligned_basis(lengths, angles) @ np.linalg.inv(cell_basis)
+
+    @staticmethod
+    def _get_lattice_parameters(cell_basis):
+        """Return the lengths and the angles (alpha, beta, gamma, in degrees) of the lattice vectors, the columns of `cell_basis`."""
+
+        cell_basis = np.asarray(cell_basis)
+        lengths = np.linalg.norm(cell_basis, axis=0)
+
+        if is_orthorhombic(cell_basis):
+            return lengths.tolist(), [90., 90., 90.]
+
+        a, b, c = cell_basis.T / lengths[:, np.newaxis]
+        angles = np.degrees(np.arccos([b @ c, a @ c, a @ b]))
+
+        return lengths.tolist(), angles.tolist()
+
+    @staticmethod
+    def _get_xaligned_basis(lengths, angles):
+        """Return the lattice vectors (columns) with the first one along x and the second one in the xy plane."""
+
+        A, B, C = lengths
+        cos_alpha, cos_beta, cos_gamma = np.cos(np.radians(angles))
+        sin_gamma = np.sin(np.radians(angles[2]))
+
+        cx = cos_beta
+        cy = (cos_alpha - cos_beta * cos_gamma) / sin_gamma
+        cz = np.sqrt(1. - cx**2 - cy**2)
+
+        return np.array([
+            [A, B * cos_gamma, C * cx],
+            [0., B * sin_gamma, C * cy],
+            [0., 0., C * cz],
+        ])
+
+    def _get_nfft(self, nfft):
+        """Return the grid dimensions to use for the requested `nfft`."""
+
+        self._nfft = get_nfft(nfft, self._nfft, self.hysteresis)
+
+        return self._nfft
+
     @cache_update
     def compute_recip_esp(self, positions, grid_positions, grid_charges):
         recip_esp = np.zeros((len(positions.T), 4))
 
+        if self._rotation is not None:
+            positions = self._rotation @ positions
+            grid_positions = self._rotation @ grid_positions
+
         charges = np.ascontiguousarray(grid_charges)[:, np.newaxis]
         coord1 = np.ascontiguousarray(grid_positions.T)
         coord2 = np.ascontiguousarray(positions.T)
@@ -48,12 +136,18 @@ class DependPME(pme.PMEInstanceD):
             mat(recip_esp),
         )
 
+        if self._rotation is not None:
+            recip_esp[:, 1:] = recip_esp[:, 1:] @ self._rotation
+
         return np.ascontiguousarray(recip_esp.T)
 
     def add_dependant(self, dependant):
-        self._dependants.append(weakref.ref(dependant))
+        self._dependants.append(weakref.proxy(dependant))
+
+    def _evaluate(self):
+        self._func(*self._dependencies, **self._kwargs)
+        return True
 
     def update_cache(self):
         if not self._cache_valid:
-            self._func(*self._dependencies, **self._kwargs)
-            self._cache_valid = True
+            update_caches([self])
@@ -0,0 +1,225 @@
+import math
+import weakref
+import numpy as np
+from scipy import fft
+
+from .dobject import DependObject, cache_update
+
+
+# Spline weights (atoms times order**3) held at once when spreading charges or probing the grid
+BLOCK_SIZE = 2**20
+
+
+def get_nfft(nfft, current=None, hysteresis=0.):
+    """Return the grid dimensions to use for the requested `nfft`.
+
+    The `current` dimensions are kept while all of them stay within `hysteresis` (relative) of
+    the requested ones, so that a box breathing around an FFT size does not change the grid.
+    """
+
+    nfft = np.asarray(nfft).tolist()
+
+    if current is not None:
+        ratio = np.array(current) / np.array(nfft)
+        if np.all(np.abs(ratio - 1.) <= hysteresis):
+            return current
+
+    return nfft
+
+
+class DependNumpyPME(DependObject):
+    def __init__(self, cell_basis, alpha, order, nfft, nproc, *, hysteresis=.1):
+        """
+        Smooth PME in NumPy, with the same interface as the helPME-based `DependPME`.
+
+        A change of the lattice alone only updates the influence function. The B-spline moduli
+        are set up again when the grid changes, and the grid dimensions requested by `nfft` are
+        not followed while they stay within `hysteresis` (relative) of the current ones.
+
+        The B-spline weights and grid indices of a `DependArray` of positions are kept until the
+        positions, the lattice or the grid change, so that `compute_recip_esp` called for the QM
+        ESP (MM charges at QM positions) and then for its gradient (QM charges at all positions)
+        computes the splines of each set of positions once. The charges are spread and probed in
+        blocks of atoms, so that the memory used stays within a few times `BLOCK_SIZE`.
+        """
+
+        super().__init__(
+            name="PME",
+            func=self._setup,
+            kwargs={"alpha": alpha, "order": order},
+            dependencies=[cell_basis, nfft],
+        )
+
+        self._order = order
+        self._nproc = nproc
+
+        self.hysteresis = hysteresis
+        self.n_setups = 0
+
+        self._nfft = None
+        self._bspline_moduli = None
+        self._frac_basis = None
+        self._influence = None
+
+        # B-spline weights and grid indices of the positions seen since the last update
+        self._spline_cache = {}
+
+    @cache_update
+    def compute_recip_esp(self, positions, grid_positions, grid_charges):
+        """Return the reciprocal-space potential and field at `positions` due to `grid_charges`, of shape (4, n)."""
+
+        grid = self._spread(self._get_splines(grid_positions), np.asarray(grid_charges))
+
+        grid = fft.rfftn(grid.reshape(self._nfft), workers=self._nproc)
+        grid = fft.irfftn(grid * self._influence, s=self._nfft, workers=self._nproc)
+
+        recip_esp = self._probe(grid.ravel(), self._get_splines(positions))
+
+        # From the gradient along the grid axes to the Cartesian one
+        recip_esp[1:] = (np.array(self._nfft)[:, np.newaxis] * self._frac_basis).T @ recip_esp[1:]
+
+        return recip_esp
+
+    def _setup(self, cell_basis, nfft, alpha, order):
+        nfft = get_nfft(nfft, self._nfft, self.hysteresis)
+
+        if nfft != self._nfft:
+            self._nfft = nfft
+            self._bspline_moduli = self._get_bspline_moduli(order, nfft)
+            self.n_setups += 1
+
+        self._frac_basis = np.linalg.inv(cell_basis)
+        self._influence = self._get_influence_function(self._frac_basis, np.asarray(alpha).item(), nfft, self._bspline_moduli)
+
+    def _evaluate(self):
+        self._func(*self._dependencies, **self._kwargs)
+        self._spline_cache = {}
+        return True
+
+    def _spread(self, splines, charges):
+        """Return the flattened grid of the charges spread with their B-splines."""
+
+        index, theta, _ = splines
+        grid = np.zeros(np.prod(self._nfft))
+
+        for block in self._get_blocks(len(charges)):
+            weights = np.einsum('n,na,nb,nc->nabc', charges[block], theta[0, block], theta[1, block], theta[2, block])
+            grid += np.bincount(self._get_flat_index(index[:, block]).ravel(), weights=weights.ravel(), minlength=len(grid))
+
+        return grid
+
+    def _probe(self, grid, splines):
+        """Return the values of `grid` interpolated with the B-splines, and their derivatives along the grid axes, of shape (4, n)."""
+
+        index, theta, dtheta = splines
+        values = np.empty((4, index.shape[1]))
+
+        for block in self._get_blocks(index.shape[1]):
+            t = theta[:, block]
+            dt = dtheta[:, block]
+            v = grid[self._get_flat_index(index[:, block])]
+            values[0, block] = np.einsum('nabc,na,nb,nc->n', v, t[0], t[1], t[2], optimize=True)
+            values[1, block] = np.einsum('nabc,na,nb,nc->n', v, dt[0], t[1], t[2], optimize=True)
+            values[2, block] = np.einsum('nabc,na,nb,nc->n', v, t[0], dt[1], t[2], optimize=True)
+            values[3, block] = np.einsum('nabc,na,nb,nc->n', v, t[0], t[1], dt[2], optimize=True)
+
+        return values
+
+    def _get_blocks(self, n_atoms):
+        size = max(1, BLOCK_SIZE // self._order**3)
+
+        return [np.s_[start:(start + size)] for start in range(0, n_atoms, size)]
+
+    def _get_splines(self, positions):
+        """Return the grid indices, B-spline weights and their derivatives along each grid axis, of shape (3, n, order).
+
+        The splines of a `DependObject` are cached with its version, those of a plain array are not.
+        """
+
+        array = np.asarray(positions)
+
+        if isinstance(positions, DependObject):
+            key = id(positions)
+            if key in self._spline_cache:
+                ref, version, splines = self._spline_cache[key]
+                if ref() is positions and version == positions._version:
+                    return splines
+
+        nfft = np.array(self._nfft)[:, np.newaxis]
+
+        u = (self._frac_basis @ array) * nfft
+        base = np.floor(u)
+        theta, dtheta = self._get_bspline(u - base, self._order)
+
+        # theta[..., i] is the weight of the grid point base - order + 1 + i
+        index = (base.astype(int)[:, :, np.newaxis] + np.arange(1 - self._order, 1)) % nfft[:, :, np.newaxis]
+
+        splines = (index, theta, dtheta)
+
+        if isinstance(positions, DependObject):
+            self._spline_cache = {k: v for k, v in self._spline_cache.items() if v[0]() is not None}
+            self._spline_cache[id(positions)] = (weakref.ref(positions), positions._version, splines)
+
+        return splines
+
+    def _get_flat_index(self, index):
+        """Return the indices in the flattened grid of the order**3 points around each atom, of shape (n, order, order, order)."""
+
+        nx, ny, nz = self._nfft
+
+        return (index[0][:, :, np.newaxis, np.newaxis] * ny + index[1][:, np.newaxis, :, np.newaxis]) * nz + index[2][:, np.newaxis, np.newaxis, :]
+
+    @staticmethod
+    def _get_bspline(w, order):
+        """Return the cardinal B-spline values M(w + order - 1 - i) and their derivatives, with i along the last axis."""
+
+        theta = np.zeros((order,) + w.shape)
+        theta[0] = 1. - w
+        theta[1] = w
+
+        for k in range(3, order + 1):
+            if k == order:
+                dtheta = np.empty_like(theta)
+                dtheta[0] = -theta[0]
+                dtheta[1:] = theta[:-1] - theta[1:]
+            theta[k - 1] = w * theta[k - 2] / (k - 1)
+            for j in range(1, k - 1):
+                theta[k - j - 1] = ((w + j) * theta[k - j - 2] + (k - j - w) * theta[k - j - 1]) / (k - 1)
+            theta[0] = (1. - w) * theta[0] / (k - 1)
+
+        return np.moveaxis(theta, 0, -1), np.moveaxis(dtheta, 0, -1)
+
+    @staticmethod
+    def _get_bspline_moduli(order, nfft):
+        """Return the squared moduli of the Euler exponential splines on the half-complex FFT grid."""
+
+        theta, _ = DependNumpyPME._get_bspline(np.zeros(1), order)
+
+        bsp_mod = 1.
+        for axis, n in enumerate(nfft):
+            freq = (np.fft.rfftfreq(n) if axis == 2 else np.fft.fftfreq(n)) * n
+            moduli = np.abs(np.exp(2j * math.pi * np.outer(freq, np.arange(order - 1)) / n) @ theta[0, ::-1][1:])**2
+            tiny = moduli < 1e-7
+            moduli[tiny] = .5 * (np.roll(moduli, 1)[tiny] + np.roll(moduli, -1)[tiny])
+            bsp_mod = bsp_mod * moduli.reshape([-1 if i == axis else 1 for i in range(3)])
+
+        return bsp_mod
+
+    @staticmethod
+    def _get_influence_function(frac_basis, alpha, nfft, bspline_moduli):
+        """Return the reciprocal-space kernel of smooth PME on the half-complex FFT grid.
+
+        `frac_basis` is the inverse of the cell basis, whose rows are the reciprocal lattice vectors.
+        """
+
+        m = 0.
+        for axis, n in enumerate(nfft):
+            freq = np.fft.rfftfreq(n) if axis == 2 else np.fft.fftfreq(n)
+            m = m + np.multiply.outer(frac_basis[axis], freq * n).reshape([3] + [-1 if i == axis else 1 for i in range(3)])
+        m2 = (m**2).sum(axis=0)
+
+        m2.flat[0] = 1.
+        influence = np.exp(-math.pi**2 * m2 / alpha**2) / (m2 * bspline_moduli) * abs(np.linalg.det(frac_basis)) / math.pi
+        influence.flat[0] = 0.
+
+        return influence * np.prod(nfft)
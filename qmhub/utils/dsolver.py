@@ -0,0 +1,56 @@
+import numpy as np
+
+from .dobject import DependObject, cache_update
+
+
+class DependSolver(DependObject):
+    def __init__(self, matrix, *, rcond=1e-8, name=None):
+        """
+        Products with the pseudo-inverse of a matrix node, factored once per change of the matrix.
+
+        The transposed matrix is QR factorized and the small triangular factor is decomposed by
+        SVD, with singular values below `rcond` times the largest one dropped as in
+        `np.linalg.pinv`. The pseudo-inverse itself is never formed.
+        """
+
+        super().__init__(
+            name=name,
+            func=DependSolver._factorize,
+            kwargs={'rcond': rcond},
+            dependencies=[matrix],
+        )
+
+        self._factors = None
+
+    @cache_update
+    def solve(self, b):
+        """Return `pinv(matrix) @ b`."""
+
+        q, v, s_inv, ut = self._factors
+        x = (ut @ b).T * s_inv
+        return q @ (v @ x.T)
+
+    @cache_update
+    def solve_T(self, b):
+        """Return `b @ pinv(matrix)`."""
+
+        q, v, s_inv, ut = self._factors
+        return ((b @ q) @ v * s_inv) @ ut
+
+    def _evaluate(self):
+        self._factors = self._func(*self._dependencies, **self._kwargs)
+        return True
+
+    @staticmethod
+    def _factorize(matrix, rcond):
+        matrix = np.asarray(matrix)
+
+        # matrix = r.T @ q.T = (u @ s @ v.T) @ q.T, so pinv(matrix) = q @ v @ pinv(s) @ u.T
+        q, r = np.linalg.qr(matrix.T)
+        u, s, vt = np.linalg.svd(r.T, full_matrices=False)
+
+        s_inv = np.zeros_like(s)
+        large = s > rcond * s.max(initial=0.)
+        s_inv[large] = 1. / s[large]
+
+        return q, vt.T, s_inv, u.T
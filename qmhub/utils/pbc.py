@@ -0,0 +1,46 @@
+import itertools
+
+import numpy as np
+
+
+# Integer combinations of the lattice vectors to the 27 neighboring cells
+_NEIGHBOR_SHIFTS = np.array(list(itertools.product((-1, 0, 1), repeat=3)), dtype=float).T
+
+
+def is_orthorhombic(cell_basis):
+    cell_basis = np.asarray(cell_basis)
+    return np.all(cell_basis[~np.eye(3, dtype=bool)] == 0.)
+
+
+def get_cell_widths(cell_basis):
+    """Return the distances between opposite faces of the cell spanned by the columns of `cell_basis`."""
+
+    if is_orthorhombic(cell_basis):
+        return np.abs(np.diagonal(cell_basis))
+
+    return 1. / np.linalg.norm(np.linalg.inv(cell_basis), axis=1)
+
+
+def get_min_image(displacements, cell_basis):
+    """Return the shortest periodic images of `displacements` (3, ...) in the cell spanned by the columns of `cell_basis`.
+
+    Orthorhombic cells are handled exactly by rounding. For triclinic cells (e.g. a truncated
+    octahedron), displacements are first reduced in fractional coordinates, and the shortest
+    of the images in the 27 neighboring cells is then picked.
+    """
+
+    displacements = np.asarray(displacements, dtype=float)
+    cell_basis = np.asarray(cell_basis)
+
+    if is_orthorhombic(cell_basis):
+        box = np.diagonal(cell_basis).reshape((3,) + (1,) * (displacements.ndim - 1))
+        return displacements - np.around(displacements / box) * box
+
+    shape = displacements.shape
+    displacements = displacements.reshape(3, -1)
+    displacements = displacements - cell_basis @ np.around(np.linalg.solve(cell_basis, displacements))
+
+    images = displacements[:, np.newaxis, :] - (cell_basis @ _NEIGHBOR_SHIFTS)[:, :, np.newaxis]
+    shortest = np.argmin((images**2).sum(axis=0), axis=0)
+
+    return images[:, shortest, np.arange(displacements.shape[1])].reshape(shape)
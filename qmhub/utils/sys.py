@@ -1,5 +1,9 @@
 import os
+import queue
+import shlex
 import subprocess as sp
+import threading
+import weakref
 
 
 def run_cmdline(cmdline):
@@ -19,3 +23,87 @@ def get_nproc():
     else:
         nproc = 1
     return nproc
+
+
+class Worker(object):
+    """A long-lived QM process driven through its stdin and stdout.
+
+    Each request is a block of lines written to the worker; the worker replies with a
+    single line, ``done`` on success or ``error <message>`` on failure. A worker that exits
+    or does not reply within `timeout` seconds (no limit if None) raises a RuntimeError.
+    """
+
+    def __init__(self, cmdline, cwd=None, timeout=None):
+        self.cmdline = cmdline
+        self.cwd = cwd
+        self.timeout = timeout
+        self.proc = None
+
+    def start(self):
+        self.proc = sp.Popen(
+            args=shlex.split(self.cmdline),
+            cwd=self.cwd,
+            stdin=sp.PIPE,
+            stdout=sp.PIPE,
+            universal_newlines=True,
+            bufsize=1,
+        )
+        self._finalizer = weakref.finalize(self, Worker._stop, self.proc)
+
+        # Read by a thread, so that waiting for a reply can time out
+        self._replies = queue.Queue()
+        threading.Thread(target=Worker._read, args=(self.proc.stdout, self._replies), daemon=True).start()
+
+    def request(self, lines):
+        if self.proc is None:
+            self.start()
+        elif self.proc.poll() is not None:
+            self._raise_exited()
+
+        try:
+            self.proc.stdin.write("".join(lines))
+            self.proc.stdin.flush()
+        except BrokenPipeError:
+            self._raise_exited()
+
+        try:
+            reply = self._replies.get(timeout=self.timeout)
+        except queue.Empty:
+            self.proc.kill()
+            self.close()
+            raise RuntimeError(f"QM worker did not reply within {self.timeout} s.")
+
+        if reply is None:
+            self._raise_exited()
+        elif reply.strip() != "done":
+            raise RuntimeError(f"QM worker failed: {reply.strip() or 'empty reply'}")
+
+    def _raise_exited(self):
+        try:
+            returncode = self.proc.wait(timeout=10)
+        except sp.TimeoutExpired:
+            returncode = None
+        self.close()
+        raise RuntimeError(f"QM worker '{self.cmdline}' exited with return code {returncode}.")
+
+    def close(self):
+        if self.proc is not None:
+            self._finalizer()
+            self.proc = None
+
+    @staticmethod
+    def _read(stdout, replies):
+        for line in stdout:
+            replies.put(line)
+        replies.put(None)
+
+    @staticmethod
+    def _stop(proc):
+        if proc.poll() is None:
+            try:
+                proc.stdin.write("exit\n")
+                proc.stdin.close()
+                proc.wait(timeout=10)
+            except (OSError, sp.TimeoutExpired):
+                proc.kill()
+                proc.wait()